@@ -0,0 +1,450 @@
+import argparse
+import http.client
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# A request: method, path (with its query string) and JSON body
+Request = Tuple[str, str, Optional[Any]]
+
+# Vocabulary of the synthetic elements
+CATEGORIES: List[str] = [
+    "Combustibles > Combustibles fossiles > Gaz",
+    "Combustibles > Combustibles fossiles > Liquides",
+    "Combustibles > Biomasse",
+    "Electricité > Mix moyen",
+    "Transport de personnes > Routier > Voiture",
+    "Transport de marchandises > Ferroviaire",
+    "Achats de biens > Produits agro-alimentaires > Viandes",
+    "Traitement des déchets > Incinération",
+]
+LOCATIONS: List[str] = ["France continentale", "Europe", "Monde", "Guadeloupe", "Allemagne"]
+STATUSES: List[str] = ["Valide générique", "Valide spécifique", "Archivé"]
+UNITS: List[str] = ["kgCO2e/kWh", "kgCO2e/kg", "kgCO2e/passager.km", "kgCO2e/tonne.km", "kgCO2e/litre"]
+CONTRIBUTORS: List[str] = ["ADEME", "IEA", "Ecoinvent", "DEFRA"]
+NAMES: List[str] = ["Gaz naturel", "Fioul domestique", "Bois bûche", "Electricité", "Voiture diesel", "Train fret", "Boeuf", "Ordures ménagères"]
+ATTRIBUTES: List[str] = ["moyen", "réseau", "haute tension", "urbain", "granulés", "incinération avec valorisation"]
+POST_TYPES: List[str] = ["Combustion", "Amont", "Fabrication", "Transport"]
+
+# Settings of the application measuring the cold latency of the read routes: no response is
+# served from the response cache or from the export files
+COLD_CONFIG: Dict[str, Any] = {"CACHE_MAX_ENTRIES": 0, "EXPORT_CACHE_TTL": 0}
+
+
+def synthetic_release(rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Generate a synthetic Base Carbone release, with the Excel headers expected by the loaders.
+
+    Each element has an "Elément" line followed by a "Poste" line holding the same emissions.
+
+    Args:
+        rows (int): The number of rows, rounded down to an even number.
+        seed (int): Seed of the random generator, so that runs are reproducible.
+
+    Returns:
+        pd.DataFrame: The release.
+    """
+    from models import COLUMN_MAPPING
+
+    headers = {column: header for header, column in COLUMN_MAPPING.items()}
+    random = np.random.default_rng(seed)
+    elements = rows // 2
+
+    def pick(values: List[str]) -> np.ndarray:
+        return np.repeat(random.choice(values, elements), 2)
+
+    # One element in twenty emits a supplementary gas
+    emits = random.random(elements) < 0.05
+    gases = {name: np.repeat(random.gamma(2.0, 0.5, elements).round(4), 2) for name in ("co2f", "ch4f", "ch4b", "n2o", "co2b")}
+    columns = {
+        "type_ligne": np.tile(["Elément", "Poste"], elements),
+        "identifiant_element": np.repeat(np.arange(1, elements + 1, dtype=np.float64), 2),
+        "structure": "Elément",
+        "statut_element": pick(STATUSES),
+        "nom_base_francais": pick(NAMES),
+        "nom_attribut_francais": pick(ATTRIBUTES),
+        "code_categorie": pick(CATEGORIES),
+        "tags_francais": pick(ATTRIBUTES),
+        "unite_francais": pick(UNITS),
+        "contributeur": pick(CONTRIBUTORS),
+        "localisation_geo": pick(LOCATIONS),
+        "date_creation": pick(["Janvier 2020", "Juin 2021", "Octobre 2022", "Mars 2023"]),
+        "incertitude": np.repeat(random.integers(5, 50, elements).astype(np.float64), 2),
+        "type_poste": np.where(np.arange(2 * elements) % 2, np.repeat(random.choice(POST_TYPES, elements), 2), None),
+        "total_poste_non_decompose": sum(gases.values()).round(4),
+        **gases,
+        "code_gaz_supplementaire_1": np.repeat(np.where(emits, "SF6", None), 2),
+        "valeur_gaz_supplementaire_1": np.repeat(np.where(emits, random.gamma(2.0, 0.01, elements).round(6), np.nan), 2),
+    }
+    return pd.DataFrame({headers[name]: values for name, values in columns.items()})
+
+
+def percentiles(durations: List[float]) -> Dict[str, float]:
+    """
+    Summarize request durations.
+
+    Args:
+        durations (List[float]): The durations, in seconds.
+
+    Returns:
+        Dict[str, float]: The mean, p50, p90, p99 and max durations, in milliseconds.
+    """
+    if not durations:
+        return {}
+    milliseconds = np.array(durations) * 1000
+    summary = {"mean_ms": float(milliseconds.mean())}
+    for percentile in (50, 90, 99):
+        summary[f"p{percentile}_ms"] = float(np.percentile(milliseconds, percentile))
+    summary["max_ms"] = float(milliseconds.max())
+    return summary
+
+
+def test_client_sender(app: Any) -> Callable[[Request], int]:
+    """
+    Send requests in-process through the Flask test client, one client per thread.
+
+    Args:
+        app (Any): The Flask application.
+
+    Returns:
+        Callable[[Request], int]: Function sending a request and returning its status code.
+    """
+    local = threading.local()
+
+    def send(request: Request) -> int:
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        method, path, body = request
+        return local.client.open(path, method=method, json=body).status_code
+
+    return send
+
+
+def wsgi_server_sender(app: Any) -> Tuple[Callable[[Request], int], Callable[[], None]]:
+    """
+    Serve the application with a local threaded WSGI server and send requests over HTTP.
+
+    Args:
+        app (Any): The Flask application.
+
+    Returns:
+        Tuple[Callable[[Request], int], Callable[[], None]]: Function sending a request and returning
+            its status code, and function stopping the server.
+    """
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    local = threading.local()
+
+    def send(request: Request) -> int:
+        if not hasattr(local, "connection"):
+            local.connection = http.client.HTTPConnection("127.0.0.1", server.port)
+        method, path, body = request
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        local.connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = local.connection.getresponse()
+        response.read()
+        return response.status
+
+    return send, server.shutdown
+
+
+def run_route(send: Callable[[Request], int], requests: List[Request], concurrency: int) -> Dict[str, Any]:
+    """
+    Send requests concurrently and measure their latency and the throughput.
+
+    Args:
+        send (Callable[[Request], int]): Function sending a request and returning its status code.
+        requests (List[Request]): The requests to send.
+        concurrency (int): The number of concurrent clients.
+
+    Returns:
+        Dict[str, Any]: The number of requests and errors, the throughput and the latency percentiles.
+    """
+    def timed(request: Request) -> Tuple[float, int]:
+        start = time.perf_counter()
+        status = send(request)
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, requests))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(results),
+        "errors": sum(status >= 400 for _, status in results),
+        "requests_per_second": len(results) / elapsed if elapsed else 0.0,
+        **percentiles([duration for duration, _ in results]),
+    }
+
+
+def route_requests(count: int, elements: int, seed: int) -> Dict[str, Callable[[], List[Request]]]:
+    """
+    Build the requests sent to each route, read routes first so that writes do not skew them.
+
+    The IDs, cursors, filters and search terms vary across the requests of a route, so that they are not
+    all answered from the response cache after the first one. The requests are built lazily, so that the
+    write routes can target the elements created before them.
+
+    Args:
+        count (int): The number of requests per route.
+        elements (int): The number of seeded elements (pairs of rows).
+        seed (int): Seed of the random generator.
+
+    Returns:
+        Dict[str, Callable[[], List[Request]]]: The requests of each route, by route name.
+    """
+    from ecoact_api import session
+    from models import ElementData
+
+    random = np.random.default_rng(seed)
+    rows = 2 * elements
+    created: List[int] = []
+
+    def ids(size: int) -> List[int]:
+        return [int(value) for value in random.integers(1, rows + 1, size)]
+
+    def choices(values: List[str], size: int = count) -> List[str]:
+        return [str(value) for value in random.choice(values, size)]
+
+    def versions() -> List[int]:
+        from models import current_row_version
+
+        last = current_row_version(session)
+        session.remove()
+        return [int(value) for value in random.integers(0, last + 1, count)]
+
+    def new_element(number: int) -> Dict[str, Any]:
+        return {"identifiant_element": float(10 ** 9 + number), "type_ligne": "Elément", "co2f": 1.0, "code_categorie": CATEGORIES[0]}
+
+    def created_ids() -> List[int]:
+        created[:] = [element_id for (element_id,) in session.query(ElementData.id).filter(ElementData.identifiant_element >= 10 ** 9)]
+        session.remove()
+        return created
+
+    return {
+        "GET /elements": lambda: [("GET", f"/elements?limit=100&after_id={value}", None) for value in ids(count)],
+        "GET /elements filtered": lambda: [
+            ("GET", f"/elements?limit=100&localisation_geo={location}&code_categorie={category.split(' > ')[0]}&sort={sort}", None)
+            for location, category, sort in zip(choices(LOCATIONS), choices(CATEGORIES), choices(["-co2f", "co2f", "-total_poste_non_decompose", "nom_base_francais"]))
+        ],
+        "GET /elements by gas and date": lambda: [
+            ("GET", f"/elements?limit=100&gaz=SF6&date_creation_from={month}&after_id={after_id}", None)
+            for month, after_id in zip(choices(["Janvier 2020", "Juin 2021", "Octobre 2022"]), ids(count))
+        ],
+        "GET /elements/<id>": lambda: [("GET", f"/elements/{value}", None) for value in ids(count)],
+        "GET /elements/search": lambda: [
+            ("GET", f"/elements/search?q={name.lower()} {attribute}&limit=20", None)
+            for name, attribute in zip(choices(NAMES), choices(ATTRIBUTES))
+        ],
+        "GET /elements/aggregate": lambda: [
+            ("GET", f"/elements/aggregate?group_by={group_by}&type_ligne=Elément&localisation_geo={location}", None)
+            for group_by, location in zip(choices(["localisation_geo", "categorie_niveau_1", "contributeur,statut_element"]), choices(LOCATIONS))
+        ],
+        "GET /elements/export": lambda: [
+            ("GET", f"/elements/export?fields=code_categorie,{metric}&localisation_geo={location}", None)
+            for metric, location in zip(choices(["co2f", "ch4f", "n2o"]), choices(LOCATIONS))
+        ],
+        "GET /elements/changes": lambda: [("GET", f"/elements/changes?since={since}&limit=1000&fields=co2f", None) for since in versions()],
+        "POST /footprint": lambda: [
+            ("POST", "/footprint?details=false", {"ids": ids(10000), "quantities": random.random(10000).round(3).tolist()})
+            for _ in range(count)
+        ],
+        "POST /elements": lambda: [("POST", "/elements", new_element(number)) for number in range(count)],
+        "PUT /elements/<id>": lambda: [("PUT", f"/elements/{value}", {"co2f": 2.0}) for value in ids(count)],
+        "POST /elements/batch": lambda: [
+            ("POST", "/elements/batch", [new_element(count + 100 * number + offset) for offset in range(100)])
+            for number in range(count)
+        ],
+        "PATCH /elements/batch": lambda: [
+            ("PATCH", "/elements/batch", [{"id": value, "co2f": 3.0} for value in ids(100)]) for _ in range(count)
+        ],
+        "DELETE /elements/<id>": lambda: [("DELETE", f"/elements/{value}", None) for value in created_ids()[:count]],
+        "DELETE /elements/batch": lambda: [
+            ("DELETE", "/elements/batch", chunk.tolist()) for chunk in np.array_split(created_ids(), count) if len(chunk)
+        ],
+    }
+
+
+def benchmark_loader(rows: int, seed: int) -> Dict[str, Any]:
+    """
+    Measure the throughput of the loaders, leaving the table seeded with the synthetic release.
+
+    Args:
+        rows (int): The number of rows of the release.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        Dict[str, Any]: The duration and rows per second of a bulk load, of an incremental load of the same
+            release (nothing to write) and of an incremental load changing 2% of the rows.
+    """
+    from export_database import bulk_write_to_database, engine, incremental_write_to_database, migrate
+    from models import ElementData, ElementGas, element_rollup
+    from sqlalchemy import delete
+
+    migrate(engine)
+    with engine.begin() as connection:
+        connection.execute(delete(element_rollup))
+        connection.execute(delete(ElementGas.__table__))
+        connection.execute(delete(ElementData.__table__))
+
+    release = synthetic_release(rows, seed)
+    changed = release.copy()
+    random = np.random.default_rng(seed + 1)
+    changed.loc[random.choice(len(changed), len(changed) // 50, replace=False), "CO2f"] *= 1.1
+
+    results = {}
+    for name, load, frame in (
+        ("bulk", bulk_write_to_database, release),
+        ("incremental_unchanged", incremental_write_to_database, release),
+        ("incremental_2_percent", incremental_write_to_database, changed),
+    ):
+        start = time.perf_counter()
+        outcome = load(frame)
+        elapsed = time.perf_counter() - start
+        results[name] = {"rows": len(frame), "seconds": elapsed, "rows_per_second": len(frame) / elapsed if elapsed else 0.0}
+        if isinstance(outcome, dict):
+            results[name]["counts"] = outcome
+    # Restore the original release for the route benchmarks
+    incremental_write_to_database(release)
+    return results
+
+
+def git_commit() -> Optional[str]:
+    """
+    Read the commit of the benchmarked tree.
+
+    Returns:
+        Optional[str]: The commit hash, or None outside of a git checkout.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_read_route(
+    cold_send: Callable[[Request], int], warm_send: Callable[[Request], int], requests: List[Request], concurrency: int
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Measure a read route twice: through an application bypassing the response caches, then through the
+    application caching them, once its caches are primed with the same requests.
+
+    Args:
+        cold_send (Callable[[Request], int]): Function sending a request to the application without response caches.
+        warm_send (Callable[[Request], int]): Function sending a request to the application with response caches.
+        requests (List[Request]): The requests to send.
+        concurrency (int): The number of concurrent clients.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: The measures of run_route, under "cold" and "warm".
+    """
+    cold = run_route(cold_send, requests, concurrency)
+    run_route(warm_send, requests, concurrency)
+    return {"cold": cold, "warm": run_route(warm_send, requests, concurrency)}
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    """
+    Seed a database, benchmark the loaders and every route, and write the results as JSON.
+
+    The read routes are reported cold (response caches bypassed) and warm (response caches primed),
+    the write routes once.
+
+    Args:
+        arguments (Optional[List[str]]): The command line arguments, those of the process by default.
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the loaders and the API routes.")
+    parser.add_argument("--rows", type=int, default=10000, help="Number of synthetic rows (default 10000)")
+    parser.add_argument(
+        "--database-url",
+        help="Database to seed, whose element_data table is emptied first (a temporary SQLite database by default)",
+    )
+    parser.add_argument("--requests", type=int, default=200, help="Number of requests per route (default 200)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of concurrent clients (default 8)")
+    parser.add_argument("--server", action="store_true", help="Send the requests to a local WSGI server rather than the test client")
+    parser.add_argument("--routes", help="Comma-separated names of the routes to benchmark (all by default)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random generators")
+    parser.add_argument(
+        "--output",
+        default=os.path.join(tempfile.gettempdir(), "benchmark.json"),
+        help="Path of the JSON results (default benchmark.json in the temporary directory)",
+    )
+    options = parser.parse_args(arguments)
+
+    # The loaders and the API read the database to use from the environment
+    os.environ["DATABASE_URL"] = options.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark.db')}"
+    os.environ.setdefault("EXPORT_CACHE_DIR", tempfile.mkdtemp())
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+
+    loader = benchmark_loader(options.rows, options.seed)
+    print(json.dumps(loader, indent=2), file=sys.stderr)
+
+    from ecoact_api import create_app, get_engine
+
+    app = create_app()
+    # Its own export directory, so that it does not prune the files of the other application
+    cold_app = create_app({**COLD_CONFIG, "EXPORT_CACHE_DIR": tempfile.mkdtemp()})
+    if options.server:
+        send, stop_warm = wsgi_server_sender(app)
+        cold_send, stop_cold = wsgi_server_sender(cold_app)
+
+        def stop() -> None:
+            stop_warm()
+            stop_cold()
+    else:
+        send, cold_send, stop = test_client_sender(app), test_client_sender(cold_app), lambda: None
+    results: Dict[str, Any] = {}
+    # The requests of some routes are built from the table, through the session of the API
+    with app.app_context():
+        database = get_engine().dialect.name
+        routes = route_requests(options.requests, options.rows // 2, options.seed)
+        selected = [name.strip() for name in options.routes.split(",")] if options.routes else list(routes)
+        try:
+            for name in selected:
+                if name.startswith("GET "):
+                    results[name] = run_read_route(cold_send, send, routes[name](), options.concurrency)
+                else:
+                    results[name] = run_route(send, routes[name](), options.concurrency)
+                print(f"{name}: {json.dumps(results[name])}", file=sys.stderr)
+        finally:
+            stop()
+
+    report = {
+        "environment": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": database,
+            "rows": options.rows,
+            "requests_per_route": options.requests,
+            "concurrency": options.concurrency,
+            "client": "wsgi_server" if options.server else "test_client",
+            "started_at": started_at,
+        },
+        "loader": loader,
+        "routes": results,
+    }
+    with open(options.output, "w") as output:
+        json.dump(report, output, indent=2)
+    print(f"Results written to {options.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
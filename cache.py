@@ -0,0 +1,205 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Optional, Set
+
+
+class CacheEntry:
+    """
+    Serialized response stored in the cache.
+
+    Attributes:
+        body (bytes): The serialized payload.
+        mimetype (str): The mimetype of the payload.
+        headers (Dict[str, str]): Extra headers to send with the payload (e.g. pagination links).
+        etag (str): Strong entity tag of the payload.
+        version (int): Row version the payload was read at.
+        element_id (Optional[int]): ID of the element the payload describes, None for lists.
+        created_at (float): Monotonic time at which the entry was stored.
+    """
+
+    __slots__ = ("body", "mimetype", "headers", "etag", "version", "element_id", "created_at")
+
+    def __init__(self, body: bytes, mimetype: str, headers: Dict[str, str], version: int, element_id: Optional[int]) -> None:
+        self.body = body
+        self.mimetype = mimetype
+        self.headers = headers
+        # The tag is a digest of the payload so that every worker gives the same tag to the same content
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.version = version
+        self.element_id = element_id
+        self.created_at = time.monotonic()
+
+
+class ResponseCache:
+    """
+    Bounded, thread-safe LRU cache of serialized element payloads and list pages.
+
+    The cache follows the row version counter shared by all the processes
+    writing the table (see models.current_row_version), and is synced to it
+    before each lookup with the elements written since. List entries are only
+    served while the version they were read at is current, whereas element
+    entries are dropped individually when their element is written, so that a
+    write only invalidates the entries it can affect, whichever process made it.
+    Entries also expire after "ttl" seconds.
+
+    The version of the last write of an element is remembered so that a payload
+    read before it is not stored. Only the "max_entries" latest writes are kept,
+    payloads read before the older ones being refused altogether.
+
+    Attributes:
+        max_entries (int): Maximum number of entries kept.
+        max_bytes (int): Maximum total size of the cached payloads.
+        ttl (float): Number of seconds an entry is served for.
+        version (int): Row version the cache is synced to.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024, ttl: float = 60.0) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.version = 0
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._element_keys: Dict[int, Set[Hashable]] = {}
+        # Version of the last write of each element, oldest first
+        self._element_versions: "OrderedDict[int, int]" = OrderedDict()
+        self._floor_version = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[CacheEntry]:
+        """
+        Look up a fresh entry.
+
+        Args:
+            key (Hashable): The key of the entry.
+
+        Returns:
+            Optional[CacheEntry]: The entry, or None if it is missing, stale or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stale = entry.element_id is None and entry.version != self.version
+            if stale or time.monotonic() - entry.created_at > self.ttl:
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(
+        self,
+        key: Hashable,
+        body: bytes,
+        mimetype: str,
+        headers: Dict[str, str],
+        version: int,
+        element_id: Optional[int] = None,
+    ) -> CacheEntry:
+        """
+        Store a payload, unless a write happened since it was read from the database.
+
+        Args:
+            key (Hashable): The key of the entry.
+            body (bytes): The serialized payload.
+            mimetype (str): The mimetype of the payload.
+            headers (Dict[str, str]): Extra headers to send with the payload.
+            version (int): Row version the cache was synced to before querying the database.
+            element_id (Optional[int]): ID of the element the payload describes, None for lists.
+
+        Returns:
+            CacheEntry: The entry, which is returned but not stored if it may already be stale.
+        """
+        entry = CacheEntry(body, mimetype, headers, version, element_id)
+        with self._lock:
+            if element_id is None:
+                stale = version != self.version
+            else:
+                stale = version < self._floor_version or self._element_versions.get(element_id, -1) > version
+            if stale or len(body) > self.max_bytes:
+                return entry
+            self._discard(key)
+            self._entries[key] = entry
+            self._size += len(body)
+            if element_id is not None:
+                self._element_keys.setdefault(element_id, set()).add(key)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+        return entry
+
+    def sync(self, version: int, element_ids: Optional[Iterable[int]]) -> None:
+        """
+        Catch up with the writes committed up to a row version, by any process.
+
+        Args:
+            version (int): The current row version.
+            element_ids (Optional[Iterable[int]]): IDs of the elements written since the version the cache
+                is synced to, None if they were not read (e.g. too many of them): every entry is dropped.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            # The counter only grows, an older version was read before another request synced the cache
+            if version <= self.version:
+                return
+            if element_ids is None:
+                self._drop_all(version)
+            else:
+                for element_id in element_ids:
+                    self._element_versions[element_id] = version
+                    self._element_versions.move_to_end(element_id)
+                    for key in list(self._element_keys.get(element_id, ())):
+                        self._discard(key)
+                while len(self._element_versions) > self.max_entries:
+                    _, self._floor_version = self._element_versions.popitem(last=False)
+            self.version = version
+
+    def clear(self) -> None:
+        """
+        Drop every entry, e.g. after a failed write.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._drop_all(self.version)
+
+    def _drop_all(self, version: int) -> None:
+        """
+        Drop every entry, refusing the payloads read before a row version. The lock must be held.
+
+        Args:
+            version (int): The row version the payloads must have been read at to be stored.
+
+        Returns:
+            None
+        """
+        self._floor_version = version
+        self._entries.clear()
+        self._element_keys.clear()
+        self._element_versions.clear()
+        self._size = 0
+
+    def _discard(self, key: Hashable) -> None:
+        """
+        Remove an entry. The lock must be held.
+
+        Args:
+            key (Hashable): The key of the entry.
+
+        Returns:
+            None
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._size -= len(entry.body)
+        if entry.element_id is not None:
+            keys = self._element_keys.get(entry.element_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._element_keys[entry.element_id]
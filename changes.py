@@ -0,0 +1,47 @@
+import threading
+from typing import Optional
+
+
+class ChangeNotifier:
+    """
+    Thread-safe signal waking the long-polling change feed requests of the process when
+    the API commits a write.
+
+    Writes committed by other processes (the other workers, the loaders) do not signal it,
+    so waiting requests also poll the database at an interval.
+
+    Attributes:
+        generation (int): Number of writes signaled so far.
+    """
+
+    def __init__(self) -> None:
+        self.generation: int = 0
+        self._condition = threading.Condition()
+
+    def notify(self) -> None:
+        """
+        Signal a committed write, waking all the waiting requests.
+
+        Returns:
+            None
+        """
+        with self._condition:
+            self.generation += 1
+            self._condition.notify_all()
+
+    def wait(self, generation: int, timeout: Optional[float]) -> bool:
+        """
+        Wait until a write is signaled after a given generation, or the timeout expires.
+
+        Reading the generation before looking for changes, then waiting from it, ensures that
+        a write committed in between is not missed.
+
+        Args:
+            generation (int): The generation read before the last look for changes.
+            timeout (Optional[float]): Maximum number of seconds to wait, None to wait indefinitely.
+
+        Returns:
+            bool: True if a write was signaled, False if the timeout expired.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self.generation != generation, timeout)
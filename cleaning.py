@@ -0,0 +1,501 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from models import GAS_FIELDS, NATURAL_KEY, ROLLUP_METRICS
+from search import fold
+
+logger = logging.getLogger(__name__)
+
+UNIT_COLUMN: str = "unite_francais"
+# Published values of the emission factors: emissions, supplementary gases, unit and names. A reference
+# database must hold them as published, so the cleaning never makes them up
+REFERENCE_COLUMNS: Tuple[str, ...] = ROLLUP_METRICS + GAS_FIELDS + (
+    UNIT_COLUMN, "nom_base_francais", "nom_attribut_francais", "nom_frontiere_francais", "nom_poste_francais",
+)
+# Columns never dropped, imputed nor clipped: the natural key of the elements and the reference values
+PROTECTED_COLUMNS: Tuple[str, ...] = NATURAL_KEY + REFERENCE_COLUMNS
+# Number of rows sampled to estimate the quartiles of streamed input, smaller inputs get exact quartiles
+QUARTILE_SAMPLE_SIZE: int = 100000
+# Data-quality reports are kept in QUALITY_REPORT_DIR, keyed by the fingerprint of the data and the configuration
+QUALITY_REPORT_DIR: str = os.getenv("QUALITY_REPORT_DIR") or os.path.join(tempfile.gettempdir(), "ecoact-quality")
+
+UNIT_SPACES = re.compile(r"\s+")
+
+
+class CleaningConfig:
+    """
+    Settings of the cleaning stage, by default those of the exploration notebook, meant for analytical
+    copies of the data. The database loaders are given report_only settings unless asked otherwise.
+
+    Attributes:
+        missing_threshold (Optional[float]): Columns missing at least this share of their values are dropped,
+            None to keep them all.
+        impute (bool): Whether to fill the missing values, with the mean of numeric columns and the mode of the others.
+        iqr_factor (Optional[float]): Numeric values further than this many interquartile ranges from the
+            quartiles are clipped, None to keep them.
+        protected (Tuple[str, ...]): Columns left untouched.
+    """
+
+    def __init__(
+        self,
+        missing_threshold: Optional[float] = 0.5,
+        impute: bool = True,
+        iqr_factor: Optional[float] = 1.5,
+        protected: Sequence[str] = PROTECTED_COLUMNS,
+    ) -> None:
+        self.missing_threshold = missing_threshold
+        self.impute = impute
+        self.iqr_factor = iqr_factor
+        self.protected = tuple(protected)
+
+    @classmethod
+    def report_only(cls) -> "CleaningConfig":
+        """
+        Build settings changing no value, which only report the quality of the data.
+
+        Returns:
+            CleaningConfig: The settings.
+        """
+        return cls(missing_threshold=None, impute=False, iqr_factor=None)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Describe the settings, for the reports and their cache key.
+
+        Returns:
+            Dict[str, Any]: The settings.
+        """
+        return {
+            "missing_threshold": self.missing_threshold,
+            "impute": self.impute,
+            "iqr_factor": self.iqr_factor,
+            "protected": sorted(self.protected),
+        }
+
+
+def _row_hashes(frame: pd.DataFrame) -> bytes:
+    """
+    Hash each row of a DataFrame, in a single vectorized pass.
+
+    Args:
+        frame (pd.DataFrame): The rows.
+
+    Returns:
+        bytes: The 64-bit hashes of the rows, end to end.
+    """
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes()
+
+
+def fingerprint(frame: pd.DataFrame) -> str:
+    """
+    Fingerprint the content of a DataFrame, as ColumnStatistics does chunk by chunk.
+
+    Args:
+        frame (pd.DataFrame): The data.
+
+    Returns:
+        str: The hexadecimal digest of the columns and the rows.
+    """
+    digest = hashlib.blake2b(repr(list(frame.columns)).encode(), digest_size=16)
+    digest.update(_row_hashes(frame))
+    return digest.hexdigest()
+
+
+class ColumnStatistics:
+    """
+    Statistics of every column of a dataset, accumulated one chunk at a time so that
+    streamed input is never held in memory.
+
+    Each chunk is summarized in a few vectorized passes over all its columns. The
+    quartiles are computed on a uniform sample of the rows, exact as long as the
+    data has no more than "sample_size" rows.
+
+    Attributes:
+        sample_size (int): Maximum number of rows sampled for the quartiles.
+        rows (int): Number of rows seen.
+        columns (List[str]): Columns of the data, in order.
+        numeric (List[str]): Numeric columns, as typed in the first chunk.
+        integers (List[str]): Integer columns among the numeric ones.
+        missing (pd.Series): Number of missing values of each column.
+        sums (pd.Series): Sum of the known values of each numeric column.
+        value_counts (Dict[str, pd.Series]): Number of occurrences of each value of the other columns.
+        sample (pd.DataFrame): Sampled rows of the numeric columns.
+    """
+
+    def __init__(self, sample_size: int = QUARTILE_SAMPLE_SIZE, seed: int = 0) -> None:
+        self.sample_size = sample_size
+        self.rows = 0
+        self.columns: List[str] = []
+        self.numeric: List[str] = []
+        self.integers: List[str] = []
+        self.missing = pd.Series(dtype="int64")
+        self.sums = pd.Series(dtype="float64")
+        self.value_counts: Dict[str, pd.Series] = {}
+        self.sample = pd.DataFrame()
+        self._priorities = np.empty(0)
+        self._random = np.random.default_rng(seed)
+        self._digest = hashlib.blake2b(digest_size=16)
+
+    def update(self, frame: pd.DataFrame) -> None:
+        """
+        Add a chunk of the data to the statistics.
+
+        Args:
+            frame (pd.DataFrame): The chunk, with the columns of the first one.
+
+        Returns:
+            None
+        """
+        if not self.columns:
+            self.columns = list(frame.columns)
+            self.numeric = [column for column in self.columns if pd.api.types.is_numeric_dtype(frame[column])]
+            self.integers = [column for column in self.numeric if pd.api.types.is_integer_dtype(frame[column])]
+            self.sample = pd.DataFrame(columns=self.numeric, dtype="float64")
+            self._digest.update(repr(self.columns).encode())
+        self._digest.update(_row_hashes(frame))
+        self.rows += len(frame)
+        self.missing = self.missing.add(frame.isna().sum(), fill_value=0).astype("int64")
+
+        numeric = frame[self.numeric].astype("float64")
+        self.sums = self.sums.add(numeric.sum(), fill_value=0)
+        for column in self.columns:
+            if column not in self.numeric:
+                counts = frame[column].value_counts()
+                previous = self.value_counts.get(column)
+                self.value_counts[column] = counts if previous is None else previous.add(counts, fill_value=0)
+
+        # Keep the rows with the lowest random priorities: a uniform sample of all the rows seen
+        priorities = np.concatenate([self._priorities, self._random.random(len(numeric))])
+        sample = pd.concat([self.sample, numeric], ignore_index=True) if len(self.sample) else numeric.reset_index(drop=True)
+        if len(priorities) > self.sample_size:
+            kept = np.argpartition(priorities, self.sample_size)[:self.sample_size]
+            sample, priorities = sample.iloc[kept].reset_index(drop=True), priorities[kept]
+        self.sample, self._priorities = sample, priorities
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Fingerprint of the data seen, equal to fingerprint() of the whole data whatever its chunking.
+
+        Returns:
+            str: The hexadecimal digest.
+        """
+        return self._digest.hexdigest()
+
+    def missing_rates(self) -> pd.Series:
+        """
+        Compute the share of missing values of each column.
+
+        Returns:
+            pd.Series: The missing rate of each column.
+        """
+        return (self.missing / self.rows if self.rows else self.missing.astype("float64")).reindex(self.columns)
+
+    def means(self) -> pd.Series:
+        """
+        Compute the mean of each numeric column, NaN for columns without values.
+
+        Returns:
+            pd.Series: The mean of each numeric column.
+        """
+        known = self.rows - self.missing.reindex(self.numeric)
+        return (self.sums.reindex(self.numeric) / known.where(known > 0)).astype("float64")
+
+    def mode(self, column: str) -> Any:
+        """
+        Find the most frequent value of a non-numeric column, the lowest one on ties as pandas does.
+
+        Args:
+            column (str): The column.
+
+        Returns:
+            Any: The most frequent value, None if the column has no values.
+        """
+        counts = self.value_counts.get(column)
+        if counts is None or counts.empty:
+            return None
+        return min(counts.index[counts == counts.max()])
+
+    def plan(self, config: CleaningConfig) -> "CleaningPlan":
+        """
+        Derive the cleaning of the data from its statistics.
+
+        Args:
+            config (CleaningConfig): The settings of the cleaning.
+
+        Returns:
+            CleaningPlan: The cleaning.
+        """
+        rates = self.missing_rates()
+        eligible = [column for column in self.columns if column not in config.protected]
+        dropped = [
+            column for column in eligible
+            if config.missing_threshold is not None and rates[column] >= config.missing_threshold
+        ]
+        kept = [column for column in eligible if column not in dropped]
+        numeric = [column for column in kept if column in self.numeric]
+
+        fill_values: Dict[str, Any] = {}
+        if config.impute:
+            means = self.means()
+            for column in kept:
+                if column in self.numeric:
+                    value = means[column]
+                    if not np.isnan(value):
+                        fill_values[column] = int(round(value)) if column in self.integers else float(value)
+                else:
+                    value = self.mode(column)
+                    if value is not None:
+                        fill_values[column] = value
+
+        lower = upper = pd.Series(dtype="float64")
+        if config.iqr_factor is not None and numeric:
+            quartiles = self.sample[numeric].quantile([0.25, 0.75])
+            spread = config.iqr_factor * (quartiles.loc[0.75] - quartiles.loc[0.25])
+            lower, upper = quartiles.loc[0.25] - spread, quartiles.loc[0.75] + spread
+            # Integers outside of the rounded-in bounds are exactly those outside of the bounds
+            integers = [column for column in numeric if column in self.integers]
+            lower[integers], upper[integers] = np.ceil(lower[integers]), np.floor(upper[integers])
+            bounded = lower.notna() & upper.notna()
+            lower, upper = lower[bounded], upper[bounded]
+        return CleaningPlan(dropped, fill_values, lower, upper)
+
+
+class CleaningPlan:
+    """
+    Cleaning derived from the statistics of the data, applied to the data one chunk at a time:
+    the dropped columns lose their values, the missing values are filled and the outliers clipped.
+
+    The columns are kept, so that the cleaned data still fits the table.
+
+    Attributes:
+        dropped (List[str]): Columns whose values are dropped.
+        fill_values (Dict[str, Any]): Value filling the missing values of each imputed column.
+        lower (pd.Series): Lower bound of each clipped column.
+        upper (pd.Series): Upper bound of each clipped column.
+        imputed (pd.Series): Number of values filled so far in each imputed column.
+        clipped (pd.Series): Number of values clipped so far in each clipped column.
+    """
+
+    def __init__(self, dropped: List[str], fill_values: Dict[str, Any], lower: pd.Series, upper: pd.Series) -> None:
+        self.dropped = dropped
+        self.fill_values = fill_values
+        self.lower = lower
+        self.upper = upper
+        self.imputed = pd.Series(0, index=list(fill_values), dtype="int64")
+        self.clipped = pd.Series(0, index=lower.index, dtype="int64")
+
+    def apply(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """
+        Clean a chunk of the data, in one vectorized pass per step over all the columns.
+
+        Args:
+            frame (pd.DataFrame): The chunk.
+
+        Returns:
+            pd.DataFrame: A cleaned copy of the chunk.
+        """
+        frame = frame.copy()
+        for column in self.dropped:
+            # An empty column of the same dtype
+            frame[column] = frame[column].iloc[:0].reindex(frame.index)
+
+        filled = list(self.fill_values)
+        if filled:
+            self.imputed = self.imputed.add(frame[filled].isna().sum(), fill_value=0).astype("int64")
+            with pd.option_context("future.no_silent_downcasting", True):
+                frame[filled] = frame[filled].fillna(self.fill_values).infer_objects()
+
+        clipped = list(self.lower.index)
+        if clipped:
+            values = frame[clipped].astype("float64")
+            outside = values.lt(self.lower, axis=1) | values.gt(self.upper, axis=1)
+            self.clipped = self.clipped.add(outside.sum(), fill_value=0).astype("int64")
+            frame[clipped] = values.clip(self.lower, self.upper, axis=1).astype(frame[clipped].dtypes.to_dict())
+        return frame
+
+
+def unit_inconsistencies(statistics: ColumnStatistics) -> Dict[str, Dict[str, int]]:
+    """
+    Find the units written in several ways, e.g. "kgCO2e/kWh" and "kg CO2e/kwh".
+
+    Args:
+        statistics (ColumnStatistics): Statistics of data holding the UNIT_COLUMN.
+
+    Returns:
+        Dict[str, Dict[str, int]]: The number of rows of each spelling, for each unit with several spellings.
+    """
+    counts = statistics.value_counts.get(UNIT_COLUMN)
+    if counts is None or counts.empty:
+        return {}
+    normalized = counts.index.map(lambda unit: UNIT_SPACES.sub("", fold(str(unit))))
+    return {
+        unit: {str(spelling): int(count) for spelling, count in spellings.items()}
+        for unit, spellings in counts.groupby(normalized)
+        if len(spellings) > 1
+    }
+
+
+def build_report(statistics: ColumnStatistics, plan: CleaningPlan, config: CleaningConfig) -> Dict[str, Any]:
+    """
+    Build the data-quality report of cleaned data.
+
+    Args:
+        statistics (ColumnStatistics): Statistics of the data.
+        plan (CleaningPlan): The cleaning, once applied to all the data.
+        config (CleaningConfig): The settings of the cleaning.
+
+    Returns:
+        Dict[str, Any]: The report.
+    """
+    return {
+        "fingerprint": statistics.fingerprint,
+        "config": config.as_dict(),
+        "rows": statistics.rows,
+        "missing_rates": statistics.missing_rates().round(4).to_dict(),
+        "dropped_columns": plan.dropped,
+        "fill_values": plan.fill_values,
+        "imputed": plan.imputed.to_dict(),
+        "bounds": {column: [plan.lower[column], plan.upper[column]] for column in plan.lower.index},
+        "clipped": plan.clipped.to_dict(),
+        "units": {
+            "missing": int(statistics.missing.get(UNIT_COLUMN, 0)),
+            "inconsistent": unit_inconsistencies(statistics),
+        },
+    }
+
+
+def _report_path(data_fingerprint: str, config: CleaningConfig, cache_dir: str) -> str:
+    """
+    Locate the cached report of data cleaned with given settings.
+
+    Args:
+        data_fingerprint (str): The fingerprint of the data.
+        config (CleaningConfig): The settings of the cleaning.
+        cache_dir (str): The directory of the reports.
+
+    Returns:
+        str: The path of the report.
+    """
+    key = json.dumps([data_fingerprint, config.as_dict()])
+    return os.path.join(cache_dir, f"{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}.json")
+
+
+def _json_default(value: Any) -> Any:
+    """
+    Convert the values json does not know, numpy scalars and dates.
+
+    Args:
+        value (Any): The value.
+
+    Returns:
+        Any: A JSON serializable value.
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def load_report(data_fingerprint: str, config: CleaningConfig, cache_dir: str = QUALITY_REPORT_DIR) -> Optional[Dict[str, Any]]:
+    """
+    Read the cached report of data cleaned with given settings.
+
+    Args:
+        data_fingerprint (str): The fingerprint of the data.
+        config (CleaningConfig): The settings of the cleaning.
+        cache_dir (str): The directory of the reports.
+
+    Returns:
+        Optional[Dict[str, Any]]: The report, None if the data was not cleaned with these settings.
+    """
+    try:
+        with open(_report_path(data_fingerprint, config, cache_dir), encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def emit_report(
+    statistics: ColumnStatistics, plan: CleaningPlan, config: CleaningConfig, cache_dir: str = QUALITY_REPORT_DIR,
+) -> Dict[str, Any]:
+    """
+    Build the report of cleaned data, log its summary and cache it.
+
+    Args:
+        statistics (ColumnStatistics): Statistics of the data.
+        plan (CleaningPlan): The cleaning, once applied to all the data.
+        config (CleaningConfig): The settings of the cleaning.
+        cache_dir (str): The directory of the reports.
+
+    Returns:
+        Dict[str, Any]: The report.
+    """
+    report = build_report(statistics, plan, config)
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _report_path(statistics.fingerprint, config, cache_dir)
+    temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2, default=_json_default)
+    os.replace(temporary, path)
+    logger.info(
+        "Cleaned %d rows: %d columns dropped, %d values imputed, %d values clipped, %d inconsistent units (report in %s)",
+        statistics.rows, len(plan.dropped), int(plan.imputed.sum()), int(plan.clipped.sum()),
+        len(report["units"]["inconsistent"]), path,
+    )
+    return report
+
+
+def clean_frame(
+    frame: pd.DataFrame, config: Optional[CleaningConfig] = None, cache_dir: str = QUALITY_REPORT_DIR,
+) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Clean a DataFrame held in memory and emit its data-quality report.
+
+    Args:
+        frame (pd.DataFrame): The data.
+        config (Optional[CleaningConfig]): The settings of the cleaning, those of the notebook by default.
+        cache_dir (str): The directory of the reports.
+
+    Returns:
+        Tuple[pd.DataFrame, Dict[str, Any]]: The cleaned copy of the data and its report.
+    """
+    config = config or CleaningConfig()
+    statistics = ColumnStatistics()
+    statistics.update(frame)
+    plan = statistics.plan(config)
+    cleaned = plan.apply(frame)
+    return cleaned, emit_report(statistics, plan, config, cache_dir)
+
+
+def quality_report(
+    frame: pd.DataFrame, config: Optional[CleaningConfig] = None, cache_dir: str = QUALITY_REPORT_DIR,
+) -> Dict[str, Any]:
+    """
+    Return the data-quality report of a DataFrame, from the cache when the same data was
+    already cleaned with the same settings.
+
+    Args:
+        frame (pd.DataFrame): The data.
+        config (Optional[CleaningConfig]): The settings of the cleaning, those of the notebook by default.
+        cache_dir (str): The directory of the reports.
+
+    Returns:
+        Dict[str, Any]: The report.
+    """
+    config = config or CleaningConfig()
+    report = load_report(fingerprint(frame), config, cache_dir)
+    if report is None:
+        report = clean_frame(frame, config, cache_dir)[1]
+    return report
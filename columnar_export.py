@@ -0,0 +1,279 @@
+import argparse
+import datetime
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import BinaryIO, Callable, Dict, Hashable, Iterator, List, Optional, Sequence, Union
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import Column, Select, select
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+# Export formats: file extension and mimetype of each
+EXPORT_FORMATS: Dict[str, Dict[str, str]] = {
+    "parquet": {"extension": "parquet", "mimetype": "application/vnd.apache.parquet"},
+    "arrow": {"extension": "arrows", "mimetype": "application/vnd.apache.arrow.stream"},
+}
+DEFAULT_EXPORT_CHUNK_SIZE: int = 50000
+
+# Arrow type of the Python type of each column type, other columns are exported as strings
+ARROW_TYPES: Dict[type, pa.DataType] = {
+    int: pa.int64(),
+    float: pa.float64(),
+    str: pa.string(),
+    bool: pa.bool_(),
+    datetime.date: pa.date32(),
+    datetime.datetime: pa.timestamp("us"),
+}
+
+
+def arrow_schema(columns: Sequence[Column]) -> pa.Schema:
+    """
+    Build the Arrow schema of selected table columns.
+
+    Args:
+        columns (Sequence[Column]): The exported columns.
+
+    Returns:
+        pa.Schema: The schema, with one nullable field per column.
+    """
+    fields = []
+    for column in columns:
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            python_type = str
+        fields.append(pa.field(column.name, ARROW_TYPES.get(python_type, pa.string())))
+    return pa.schema(fields)
+
+
+def iter_record_batches(connection: Connection, statement: Select, schema: pa.Schema, chunk_size: int) -> Iterator[pa.RecordBatch]:
+    """
+    Read the rows of a statement in chunks from a server-side cursor and convert each chunk to a record batch.
+
+    Args:
+        connection (Connection): The connection to read from.
+        statement (Select): Statement selecting the columns of the schema, in order.
+        schema (pa.Schema): The schema of the batches.
+        chunk_size (int): The number of rows of each batch.
+
+    Yields:
+        pa.RecordBatch: The batches of rows.
+    """
+    result = connection.execute(statement.execution_options(yield_per=chunk_size))
+    for rows in result.partitions():
+        columns = list(zip(*rows))
+        arrays = [pa.array(values, type=field.type, from_pandas=False) for values, field in zip(columns, schema)]
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def export_elements(
+    bind: Union[Engine, Connection],
+    statement: Select,
+    destination: str,
+    export_format: str = "parquet",
+    chunk_size: int = DEFAULT_EXPORT_CHUNK_SIZE,
+) -> int:
+    """
+    Write the rows of a statement to a Parquet file or an Arrow IPC stream, one chunk at a time.
+
+    Args:
+        bind (Union[Engine, Connection]): The engine or connection to read from.
+        statement (Select): Statement selecting element columns, with its filters.
+        destination (str): The path of the file to write.
+        export_format (str): "parquet" or "arrow".
+        chunk_size (int): The number of rows read and written at a time.
+
+    Returns:
+        int: The number of exported rows.
+
+    Raises:
+        ValueError: If the format is unknown.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    schema = arrow_schema(statement.selected_columns)
+    if export_format == "parquet":
+        writer = pq.ParquetWriter(destination, schema)
+    else:
+        writer = pa.ipc.new_stream(destination, schema)
+
+    start = time.perf_counter()
+    exported = 0
+    connection = bind.connect() if isinstance(bind, Engine) else bind
+    try:
+        for batch in iter_record_batches(connection, statement, schema, chunk_size):
+            writer.write_batch(batch)
+            exported += batch.num_rows
+    finally:
+        writer.close()
+        if connection is not bind:
+            connection.close()
+    logger.info("Exported %d rows to %s in %.1f s", exported, destination, time.perf_counter() - start)
+    return exported
+
+
+class ExportCache:
+    """
+    On-disk cache of the latest export files, so that repeat downloads are served from the file
+    (sent with sendfile by the WSGI server) instead of being read from the table again.
+
+    File names include the row version shared by all the processes writing the table (see
+    models.current_row_version), so that a write of any worker or loader makes the previous files
+    unreachable, and so that every worker gives the same name, used as ETag, to the same export.
+    Files are deleted when a file of a newer version is built or once older than "ttl" seconds.
+
+    Attributes:
+        directory (str): The directory holding the files.
+        ttl (float): Number of seconds a file is served for.
+    """
+
+    def __init__(self, directory: str, ttl: float = 300.0) -> None:
+        self.directory = directory
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._build_locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: Hashable, version: int, extension: str) -> str:
+        """
+        Compute the path of the file of a key.
+
+        Args:
+            key (Hashable): The key of the export (format, projection and filters).
+            version (int): The row version the export is read at.
+            extension (str): The extension of the file.
+
+        Returns:
+            str: The path of the file.
+        """
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=12).hexdigest()
+        return os.path.join(self.directory, f"{version}-{digest}.{extension}")
+
+    def get(self, key: Hashable, version: int, extension: str, build: Callable[[str], None]) -> BinaryIO:
+        """
+        Open a fresh export file, building it if it is missing or expired.
+
+        Args:
+            key (Hashable): The key of the export (format, projection and filters).
+            version (int): The row version read before querying the table.
+            extension (str): The extension of the file.
+            build (Callable[[str], None]): Callable writing the export to the given path.
+
+        Returns:
+            BinaryIO: The file, opened for reading so that it can be sent even if it is pruned meanwhile.
+        """
+        path = self.path(key, version, extension)
+        with self._lock:
+            build_lock = self._build_locks[path]
+        # Concurrent requests for the same export wait for a single build
+        with build_lock:
+            if self._is_fresh(path):
+                file = open(path, "rb")
+            else:
+                temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+                try:
+                    build(temporary)
+                    # Opened before being published, so that the pruning of another request cannot delete it first
+                    file = open(temporary, "rb")
+                    os.replace(temporary, path)
+                finally:
+                    if os.path.exists(temporary):
+                        os.remove(temporary)
+                self._prune(version)
+        with self._lock:
+            self._build_locks.pop(path, None)
+        return file
+
+    def _is_fresh(self, path: str) -> bool:
+        """
+        Tell whether a file exists and has not expired.
+
+        Args:
+            path (str): The path of the file.
+
+        Returns:
+            bool: True if the file can be served.
+        """
+        try:
+            return time.time() - os.path.getmtime(path) <= self.ttl
+        except OSError:
+            return False
+
+    def _prune(self, version: int) -> None:
+        """
+        Delete the files of older row versions and the expired files. The files being built are left
+        to the request building them, and the files being sent remain readable until closed.
+
+        Args:
+            version (int): The current row version.
+
+        Returns:
+            None
+        """
+        for name in os.listdir(self.directory):
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(self.directory, name)
+            file_version = name.partition("-")[0]
+            outdated = file_version.isdigit() and int(file_version) < version
+            try:
+                if outdated or not self._is_fresh(path):
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    """
+    Export the element table from the command line.
+
+    Args:
+        arguments (Optional[List[str]]): The command line arguments, those of the process by default.
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description="Export the element table as Parquet or as an Arrow IPC stream.")
+    parser.add_argument("destination", help="Path of the file to write")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), help="Export format, guessed from the extension by default")
+    parser.add_argument("--fields", help="Comma-separated list of the columns to export (all by default)")
+    parser.add_argument(
+        "--filter", action="append", default=[], metavar="COLUMN=VALUE",
+        help="Only export the elements whose column equals the value (repeat a column to match any of several values)",
+    )
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_EXPORT_CHUNK_SIZE, help="Number of rows read at a time")
+    options = parser.parse_args(arguments)
+
+    from export_database import engine
+    from models import ELEMENT_FIELDS, LIVE_ELEMENTS
+
+    columns = ELEMENT_FIELDS
+    names = [name.strip() for name in options.fields.split(",")] if options.fields else list(columns)
+    filters: Dict[str, List[str]] = defaultdict(list)
+    for condition in options.filter:
+        name, separator, value = condition.partition("=")
+        if not separator:
+            parser.error(f"Invalid filter: {condition}")
+        filters[name].append(value)
+    unknown = (set(names) | set(filters)) - columns.keys()
+    if unknown:
+        parser.error(f"Unknown columns: {', '.join(sorted(unknown))}")
+
+    statement = select(*(columns[name] for name in names)).where(LIVE_ELEMENTS).order_by(columns["id"])
+    for name, values in filters.items():
+        statement = statement.where(columns[name].in_(values))
+    export_format = options.format or ("arrow" if options.destination.endswith((".arrow", ".arrows")) else "parquet")
+    export_elements(engine, statement, options.destination, export_format, options.chunk_size)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
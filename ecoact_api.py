@@ -1,95 +1,1219 @@
-from flask import Flask, jsonify, request, abort
-from sqlalchemy.orm import sessionmaker, Session as SessionType
-from sqlalchemy import create_engine
-from export_database import ElementData
+from flask import Blueprint, Flask, Response, current_app, jsonify, request, abort, send_file, stream_with_context, url_for
+from werkzeug.exceptions import BadRequest, Conflict
+from sqlalchemy.orm import scoped_session, selectinload, sessionmaker, Session as SessionType
+from sqlalchemy import (
+    create_engine, and_, any_, bindparam, cast, column, delete, exists, false, func, insert, literal, literal_column,
+    or_, select, text, update, values, Column, Float, Integer, Select,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError, StatementError
+from sqlalchemy.sql.elements import ColumnElement
+from models import (
+    CATEGORY_LEVELS, ELEMENT_FIELDS, GAS_FIELDS, LIVE_ELEMENTS, NATURAL_KEY, ROLLUP_DIMENSIONS, ROLLUP_METRICS,
+    SUPPLEMENTARY_GASES, ElementData, ElementGas, current_row_version, element_rollup, element_tombstone, next_row_version,
+    parse_month, refresh_rollups,
+)
+from cache import ResponseCache
+from changes import ChangeNotifier
+from columnar_export import EXPORT_FORMATS, ExportCache, export_elements
+from metrics import init_metrics, instrument_engine
+from footprint import BREAKDOWN, FACTOR_COLUMNS, SUPPLEMENTARY_GAS_COLUMNS, SnapshotCache, compute_footprint
+from search import SEARCH_COLUMNS, SearchIndexCache, fold
 from dotenv import load_dotenv
+import base64
+import binascii
+import click
+import datetime
+import functools
+import heapq
+import io
+import itertools
+import json
 import os
-from typing import List, Dict, Any, Optional
+import tempfile
+import threading
+import time
+import numpy as np
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
 
 # Load environment variables
 load_dotenv()
 DATABASE_USER: Optional[str] = os.getenv("DATABASE_USER")
 DATABASE_PASSWORD: Optional[str] = os.getenv("DATABASE_PASSWORD")
 HOST_NAME: Optional[str] = os.getenv("HOSTNAME")
-DATABASE_URL: str = f"postgresql://{DATABASE_USER}:{DATABASE_PASSWORD}@{HOST_NAME}:5432/ecoactdb"
-
-app = Flask(__name__)
-
-# Connection to database
-engine = create_engine(DATABASE_URL)
-Session = sessionmaker(bind=engine)
-session: SessionType = Session()
-
-
-@app.route('/elements', methods=['GET'])
-def get_elements() -> List[Dict[str, Any]]:
-    """
-    Retrieve all elements from the database.
-
-    Returns:
-        List[Dict[str, Any]]: A JSON list of all elements, where each element is represented as a dictionary.
-    """
-    elements = session.query(ElementData).all()
-    result = [
-    {
-        "id": element.id,
-        "type_ligne": element.type_ligne,
-        "identifiant_element": element.identifiant_element,
-        "structure": element.structure,
-        "statut_element": element.statut_element,
-        "nom_base_francais": element.nom_base_francais,
-        "nom_attribut_francais": element.nom_attribut_francais,
-        "nom_frontiere_francais": element.nom_frontiere_francais,
-        "code_categorie": element.code_categorie,
-        "tags_francais": element.tags_francais,
-        "unite_francais": element.unite_francais,
-        "contributeur": element.contributeur,
-        "programme": element.programme,
-        "url_programme": element.url_programme,
-        "source": element.source,
-        "localisation_geo": element.localisation_geo,
-        "sous_localisation_geo_francais": element.sous_localisation_geo_francais,
-        "date_creation": element.date_creation,
-        "date_modification": element.date_modification,
-        "periode_validite": element.periode_validite,
-        "incertitude": element.incertitude,
-        "reglementations": element.reglementations,
-        "transparence": element.transparence,
-        "qualite": element.qualite,
-        "qualite_ter": element.qualite_ter,
-        "qualite_gr": element.qualite_gr,
-        "qualite_tir": element.qualite_tir,
-        "qualite_c": element.qualite_c,
-        "qualite_p": element.qualite_p,
-        "qualite_m": element.qualite_m,
-        "commentaire_francais": element.commentaire_francais,
-        "type_poste": element.type_poste,
-        "nom_poste_francais": element.nom_poste_francais,
-        "total_poste_non_decompose": element.total_poste_non_decompose,
-        "co2f": element.co2f,
-        "ch4f": element.ch4f,
-        "ch4b": element.ch4b,
-        "n2o": element.n2o,
-        "code_gaz_supplementaire_1": element.code_gaz_supplementaire_1,
-        "valeur_gaz_supplementaire_1": element.valeur_gaz_supplementaire_1,
-        "code_gaz_supplementaire_2": element.code_gaz_supplementaire_2,
-        "valeur_gaz_supplementaire_2": element.valeur_gaz_supplementaire_2,
-        "code_gaz_supplementaire_3": element.code_gaz_supplementaire_3,
-        "valeur_gaz_supplementaire_3": element.valeur_gaz_supplementaire_3,
-        "code_gaz_supplementaire_4": element.code_gaz_supplementaire_4,
-        "valeur_gaz_supplementaire_4": element.valeur_gaz_supplementaire_4,
-        "code_gaz_supplementaire_5": element.code_gaz_supplementaire_5,
-        "valeur_gaz_supplementaire_5": element.valeur_gaz_supplementaire_5,
-        "autres_ges": element.autres_ges,
-        "co2b": element.co2b,
-    }
-    for element in elements
-    ]
+DATABASE_URL: str = os.getenv("DATABASE_URL") or f"postgresql://{DATABASE_USER}:{DATABASE_PASSWORD}@{HOST_NAME}:5432/ecoactdb"
+# Connection pool of each worker process: persistent connections, extra connections
+# opened under load, liveness check on checkout and maximum connection age in seconds
+DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# Key of the engine in the extensions of the application
+ENGINE_EXTENSION: str = "ecoact_engine"
+
+api = Blueprint("api", __name__)
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    """
+    Return the engine of the current application, creating it from the configuration on first use,
+    so that starting a worker neither connects to the database nor fails when it is down.
+
+    Returns:
+        Engine: The engine.
+    """
+    app = current_app._get_current_object()
+    engine = app.extensions.get(ENGINE_EXTENSION)
+    if engine is None:
+        with _engine_lock:
+            engine = app.extensions.get(ENGINE_EXTENSION)
+            if engine is None:
+                engine = create_engine(
+                    app.config["DATABASE_URL"],
+                    pool_size=app.config["DB_POOL_SIZE"],
+                    max_overflow=app.config["DB_MAX_OVERFLOW"],
+                    pool_timeout=app.config["DB_POOL_TIMEOUT"],
+                    pool_pre_ping=app.config["DB_POOL_PRE_PING"],
+                    pool_recycle=app.config["DB_POOL_RECYCLE"],
+                )
+                # Per-request SQL profiling and connection pool metrics
+                instrument_engine(engine)
+                app.extensions[ENGINE_EXTENSION] = engine
+    return engine
+
+
+class AppSession(SessionType):
+    """
+    Session bound to the engine of the current application.
+    """
+
+    def get_bind(self, mapper: Any = None, clause: Any = None, **kwargs: Any) -> Engine:
+        return get_engine()
+
+
+# One session per thread, i.e. per request, removed when the request ends
+session = scoped_session(sessionmaker(class_=AppSession))
+
+
+def remove_session(exception: Optional[BaseException] = None) -> None:
+    """
+    Close the session of the request, rolling back any transaction left open (e.g. by a failed request)
+    and returning its connection to the pool.
+
+    Args:
+        exception (Optional[BaseException]): The exception that ended the request, if any.
+
+    Returns:
+        None
+    """
+    session.remove()
+
+
+@api.app_errorhandler(IntegrityError)
+def handle_integrity_error(error: IntegrityError) -> Conflict:
+    """
+    Report a write that would duplicate the natural key of an element.
+
+    Args:
+        error (IntegrityError): The error raised by the database.
+
+    Returns:
+        Conflict: A 409 response.
+    """
+    session.rollback()
+    return Conflict(description="An element with this identifiant_element, type_ligne and type_poste already exists")
+
+
+@api.app_errorhandler(StatementError)
+def handle_statement_error(error: StatementError) -> BadRequest:
+    """
+    Report a value the column types cannot hold, e.g. an invalid date or an unknown statut_element.
+
+    Args:
+        error (StatementError): The error raised while binding the values of a statement.
+
+    Returns:
+        BadRequest: A 400 response.
+
+    Raises:
+        StatementError: If the error is not caused by an invalid value.
+    """
+    if not isinstance(error.orig, (ValueError, LookupError)):
+        raise error
+    session.rollback()
+    return BadRequest(description=str(error.orig))
+
+# Pagination and streaming settings
+DEFAULT_PAGE_SIZE: int = 1000
+MAX_PAGE_SIZE: int = 10000
+STREAM_BATCH_SIZE: int = 1000
+NDJSON_MIMETYPE: str = "application/x-ndjson"
+
+# Registry of the element columns, in release order, used to project and serialize rows.
+# The supplementary gases are correlated subqueries on element_gas.
+ELEMENT_COLUMNS: Dict[str, Column] = dict(ELEMENT_FIELDS)
+
+# Columns clients may write, and the columns identifying the elements of a batch update
+WRITABLE_COLUMNS: Tuple[str, ...] = tuple(name for name in ELEMENT_COLUMNS if name != "id")
+# Writable fields stored in element_data, the others being the supplementary gases
+COLUMN_FIELDS: Tuple[str, ...] = tuple(name for name in WRITABLE_COLUMNS if name not in GAS_FIELDS)
+BATCH_KEYS: Tuple[str, ...] = ("id", "identifiant_element")
+MAX_BATCH_SIZE: int = 100000
+
+# Query parameters filtering elements on exact values (repeat a parameter to match any of several values)
+EQUALITY_FILTERS: Tuple[str, ...] = (
+    "localisation_geo",
+    "sous_localisation_geo_francais",
+    "statut_element",
+    "type_ligne",
+    "type_poste",
+    "unite_francais",
+    "contributeur",
+)
+# Query parameters filtering elements on a value prefix
+PREFIX_FILTERS: Tuple[str, ...] = ("code_categorie",)
+# Columns filtered on an inclusive date range by "<column>_from" and "<column>_to" query parameters
+RANGE_FILTERS: Tuple[str, ...] = ("date_creation", "date_modification", "periode_validite")
+# Query parameter filtering elements on the code of one of their supplementary gases
+GAS_FILTER: str = "gaz"
+FILTER_PARAMETERS: Tuple[str, ...] = (
+    EQUALITY_FILTERS + PREFIX_FILTERS
+    + tuple(f"{name}_{bound}" for name in RANGE_FILTERS for bound in ("from", "to"))
+    + (GAS_FILTER,)
+)
+
+# Search settings
+DEFAULT_SEARCH_LIMIT: int = 20
+MAX_SEARCH_LIMIT: int = 1000
+SEARCH_INDEX_TTL: float = float(os.getenv("SEARCH_INDEX_TTL", "300"))
+
+# Aggregation settings
+AGGREGATE_FUNCTIONS: Tuple[str, ...] = ("sum", "mean", "min", "max", "count")
+CATEGORY_LEVEL_DIMENSIONS: Tuple[str, ...] = tuple(f"categorie_niveau_{level}" for level in range(1, CATEGORY_LEVELS + 1))
+AGGREGATE_DIMENSIONS: Tuple[str, ...] = ROLLUP_DIMENSIONS + CATEGORY_LEVEL_DIMENSIONS
+
+# Footprint settings
+MAX_FOOTPRINT_LINES: int = 10000000
+CSV_MIMETYPE: str = "text/csv"
+FACTOR_SNAPSHOT_TTL: float = float(os.getenv("FACTOR_SNAPSHOT_TTL", "300"))
+
+# Export settings: cached files are kept in EXPORT_CACHE_DIR and served for EXPORT_CACHE_TTL seconds
+EXPORT_CHUNK_SIZE: int = int(os.getenv("EXPORT_CHUNK_SIZE", "50000"))
+EXPORT_CACHE_DIR: str = os.getenv("EXPORT_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "ecoact-export")
+EXPORT_CACHE_TTL: float = float(os.getenv("EXPORT_CACHE_TTL", "300"))
+
+# Cache of the serialized read responses: number of entries, total size and seconds they are served for
+CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+CACHE_MAX_BYTES: int = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_TTL: float = float(os.getenv("CACHE_TTL", "60"))
+# Response headers stored along with the cached payloads
+CACHED_HEADERS: Tuple[str, ...] = ("Link", "X-Next-Cursor")
+
+# Change feed settings: a long-polling request waits at most MAX_CHANGES_WAIT seconds, looking for
+# the writes of other processes every CHANGES_POLL_INTERVAL seconds (the writes of the API wake it at once)
+MAX_CHANGES_WAIT: float = float(os.getenv("MAX_CHANGES_WAIT", "30"))
+CHANGES_POLL_INTERVAL: float = float(os.getenv("CHANGES_POLL_INTERVAL", "1"))
+
+# Key of the caches of the application in its extensions
+STATE_EXTENSION: str = "ecoact_state"
+
+
+class AppState:
+    """
+    Caches and database probes of an application, kept apart from those of the other applications
+    of the process, e.g. two applications built by create_app on different databases.
+
+    Attributes:
+        response_cache (ResponseCache): Cache of the serialized read responses.
+        search_index (SearchIndexCache): In-process search index, used without full-text index.
+        factor_snapshot (SnapshotCache): Emission factors of the footprint calculation.
+        export_cache (ExportCache): Export files served by /elements/export.
+        change_notifier (ChangeNotifier): Wakes the long-polling change feed requests.
+        fulltext_available (Optional[bool]): Whether the database hosts the full-text search index,
+            None until it is checked.
+        rollups_ready (bool): Whether element_rollup was checked to be populated.
+    """
+
+    def __init__(self, config: Mapping[str, Any]) -> None:
+        self.response_cache = ResponseCache(
+            max_entries=config["CACHE_MAX_ENTRIES"], max_bytes=config["CACHE_MAX_BYTES"], ttl=config["CACHE_TTL"],
+        )
+        self.search_index = SearchIndexCache(ttl=config["SEARCH_INDEX_TTL"])
+        self.factor_snapshot = SnapshotCache(ttl=config["FACTOR_SNAPSHOT_TTL"])
+        self.export_cache = ExportCache(directory=config["EXPORT_CACHE_DIR"], ttl=config["EXPORT_CACHE_TTL"])
+        self.change_notifier = ChangeNotifier()
+        self.fulltext_available: Optional[bool] = None
+        self.rollups_ready: bool = False
+
+
+def get_state() -> AppState:
+    """
+    Return the caches of the current application.
+
+    Returns:
+        AppState: The caches, created along with the application.
+    """
+    return current_app.extensions[STATE_EXTENSION]
+
+
+def _sync_response_cache(response_cache: ResponseCache) -> int:
+    """
+    Sync the response cache with the writes committed by any process since it was last synced.
+
+    Args:
+        response_cache (ResponseCache): The response cache of the application.
+
+    Returns:
+        int: The current row version, to store the responses read after it with.
+    """
+    version = current_row_version(session)
+    seen = response_cache.version
+    if version != seen:
+        # The cache holds nothing before its first sync; beyond max_entries written elements,
+        # dropping every entry is cheaper than reading them all
+        element_ids = None
+        if seen:
+            limit = response_cache.max_entries + 1
+            changes = _read_changes([seen, None], version, [ElementData.id], limit)
+            if len(changes) < limit:
+                element_ids = {change["id"] for change in changes}
+        response_cache.sync(version, element_ids)
+    return version
+
+
+def cached_response(view: Callable[..., Response]) -> Callable[..., Response]:
+    """
+    Serve a read endpoint from the response cache, with a strong ETag honouring If-None-Match.
+
+    The cache key is the request path and query string. The cache is synced with the shared row
+    version counter first, so that the writes of the other workers and of the loaders invalidate it
+    too. Streamed NDJSON responses are not cached, neither are error responses.
+
+    Args:
+        view (Callable[..., Response]): The view function, whose "id" keyword argument (if any)
+            is the element the response describes.
+
+    Returns:
+        Callable[..., Response]: The wrapped view function.
+    """
+    @functools.wraps(view)
+    def wrapper(*args: Any, **kwargs: Any) -> Response:
+        if _wants_ndjson():
+            return view(*args, **kwargs)
+
+        key = (request.path, tuple(sorted(request.args.items(multi=True))))
+        response_cache = get_state().response_cache
+        version = _sync_response_cache(response_cache)
+        entry = response_cache.get(key)
+        if entry is None:
+            response = view(*args, **kwargs)
+            if response.status_code != 200:
+                return response
+            headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+            entry = response_cache.put(key, response.get_data(), response.mimetype, headers, version, kwargs.get("id"))
+
+        response = Response(entry.body, mimetype=entry.mimetype, headers=entry.headers)
+        response.set_etag(entry.etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response.make_conditional(request)
+
+    return wrapper
+
+
+def _parse_fields() -> List[Column]:
+    """
+    Resolve the "fields" query parameter to the columns to select.
+
+    Returns:
+        List[Column]: The requested columns in table order, always including "id".
+            All columns are returned when "fields" is not given.
+
+    Raises:
+        400: If an unknown field is requested.
+    """
+    fields = request.args.get("fields")
+    if not fields:
+        return list(ELEMENT_COLUMNS.values())
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - ELEMENT_COLUMNS.keys()
+    if unknown:
+        abort(400, description=f"Unknown fields: {', '.join(sorted(unknown))}")
+    requested.add("id")
+    return [column for name, column in ELEMENT_COLUMNS.items() if name in requested]
+
+
+def _date_parameter(name: str) -> Optional[datetime.date]:
+    """
+    Parse a date query parameter, given as a month ("Octobre 2014") or an ISO date.
+
+    Args:
+        name (str): The name of the parameter.
+
+    Returns:
+        Optional[datetime.date]: The date, None if the parameter is not given.
+
+    Raises:
+        400: If the date is invalid.
+    """
+    value = request.args.get(name)
+    try:
+        return parse_month(value)
+    except ValueError:
+        abort(400, description=f"Invalid {name}: {value}")
+
+
+def _apply_filters(statement: Select, columns: Mapping[str, Column] = ELEMENT_COLUMNS) -> Select:
+    """
+    Restrict a statement to the elements matching the filter query parameters.
+
+    Args:
+        statement (Select): Statement selecting from the element table.
+        columns (Mapping[str, Column]): The filtered columns by name, those of the element table by default.
+
+    Returns:
+        Select: The statement with one condition per filter parameter given.
+
+    Raises:
+        400: If a date filter is invalid.
+    """
+    for name in EQUALITY_FILTERS:
+        values = request.args.getlist(name)
+        if values:
+            statement = statement.where(columns[name].in_(values))
+    for name in PREFIX_FILTERS:
+        prefixes = request.args.getlist(name)
+        if prefixes:
+            # The pattern is built here rather than in SQL so PostgreSQL sees a constant prefix it can match on the index
+            escaped = [prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") for prefix in prefixes]
+            statement = statement.where(or_(*(columns[name].like(f"{prefix}%", escape="\\") for prefix in escaped)))
+    for name in RANGE_FILTERS:
+        lower = _date_parameter(f"{name}_from")
+        if lower is not None:
+            statement = statement.where(columns[name] >= lower)
+        upper = _date_parameter(f"{name}_to")
+        if upper is not None:
+            statement = statement.where(columns[name] <= upper)
+    codes = request.args.getlist(GAS_FILTER)
+    if codes:
+        gas_table = ElementGas.__table__
+        statement = statement.where(exists().where(gas_table.c.element_id == columns["id"], gas_table.c.code.in_(codes)))
+    return statement
+
+
+def _parse_sort() -> List[Tuple[Column, bool]]:
+    """
+    Resolve the "sort" query parameter, e.g. "code_categorie,-total_poste_non_decompose".
+
+    Returns:
+        List[Tuple[Column, bool]]: The sort columns with True for descending order, empty if "sort" is not given.
+
+    Raises:
+        400: If an unknown field is given.
+    """
+    sort_keys: List[Tuple[Column, bool]] = []
+    for key in request.args.get("sort", "").split(","):
+        key = key.strip()
+        if not key:
+            continue
+        descending = key.startswith("-")
+        name = key.lstrip("+-")
+        if name not in ELEMENT_COLUMNS:
+            abort(400, description=f"Unknown sort field: {name}")
+        if name != "id":
+            sort_keys.append((ELEMENT_COLUMNS[name], descending))
+    return sort_keys
+
+
+def _encode_cursor(values: List[Any]) -> str:
+    """
+    Encode the sort values of the last element of a page as an opaque cursor.
+
+    Args:
+        values (List[Any]): The sort column values followed by the element ID.
 
+    Returns:
+        str: A URL-safe cursor.
+    """
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def _decode_cursor(cursor: str, size: int) -> List[Any]:
+    """
+    Decode a cursor produced by _encode_cursor.
+
+    Args:
+        cursor (str): The cursor given by the client.
+        size (int): The expected number of values (sort columns plus the ID).
+
+    Returns:
+        List[Any]: The sort column values followed by the element ID.
+
+    Raises:
+        400: If the cursor is malformed or does not match the requested sort.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError):
+        abort(400, description="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        abort(400, description="Invalid cursor")
+    return values
+
+
+def _after(column: Column, descending: bool, value: Any) -> ColumnElement:
+    """
+    Build the condition "column comes strictly after value" in the sort order, NULLs sorting last.
+
+    Args:
+        column (Column): The sort column.
+        descending (bool): Whether the column is sorted in descending order.
+        value (Any): The value of the column in the cursor.
+
+    Returns:
+        ColumnElement: The SQL condition.
+    """
+    if value is None:
+        return column.is_not(None) if descending else false()
+    return column < value if descending else or_(column > value, column.is_(None))
+
+
+def _keyset_condition(sort_keys: List[Tuple[Column, bool]], values: List[Any]) -> ColumnElement:
+    """
+    Build the keyset condition selecting the elements after a cursor, with the ID as final tie-breaker.
+
+    Args:
+        sort_keys (List[Tuple[Column, bool]]): The sort columns with their direction.
+        values (List[Any]): The cursor values, one per sort column followed by the ID.
+
+    Returns:
+        ColumnElement: The SQL condition.
+    """
+    keys = sort_keys + [(ELEMENT_COLUMNS["id"], False)]
+    conditions = []
+    for position, (column, descending) in enumerate(keys):
+        equal = [
+            previous.is_(None) if value is None else previous == value
+            for (previous, _), value in zip(keys[:position], values)
+        ]
+        conditions.append(and_(*equal, _after(column, descending, values[position])))
+    return or_(*conditions)
+
+
+def _wants_ndjson() -> bool:
+    """
+    Tell whether the client asked for a streamed NDJSON response.
+
+    Returns:
+        bool: True if "format=ndjson" is given or application/x-ndjson is the preferred Accept type.
+    """
+    if request.args.get("format") == "ndjson":
+        return True
+    return request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def _stream_ndjson(statement: Select) -> Iterator[str]:
+    """
+    Stream the rows of a statement as NDJSON, reading them from a server-side cursor.
+
+    Args:
+        statement (Select): Statement selecting element columns.
+
+    Yields:
+        str: Batches of newline-delimited JSON elements.
+    """
+    result = session.execute(statement.execution_options(yield_per=STREAM_BATCH_SIZE))
+    for rows in result.partitions():
+        yield "".join(current_app.json.dumps(row._asdict()) + "\n" for row in rows)
+
+
+@api.route('/elements', methods=['GET'])
+@cached_response
+def get_elements() -> Response:
+    """
+    Retrieve elements from the database, filtered, sorted and paginated with a keyset cursor.
+
+    Query parameters:
+        localisation_geo, sous_localisation_geo_francais, statut_element, type_ligne, type_poste,
+        unite_francais, contributeur (str): Only return elements with this value. Repeat the
+            parameter to accept several values.
+        code_categorie (str): Only return elements whose category starts with this prefix.
+        date_creation_from, date_creation_to, date_modification_from, date_modification_to,
+        periode_validite_from, periode_validite_to (str): Only return elements whose date is within
+            these inclusive bounds, given as months ("Octobre 2014") or ISO dates.
+        gaz (str): Only return elements emitting this supplementary gas, e.g. "SF6". Repeat the
+            parameter to accept several gases.
+        sort (str): Comma-separated list of fields to sort by, prefixed with "-" for descending
+            order. Elements are sorted by ID by default and the ID always breaks ties.
+            Sort fields are always returned.
+        after_id (int): Without "sort", only return elements whose ID is greater than this cursor (default 0).
+        cursor (str): With "sort", the cursor of the page to return, as given by the previous page.
+        limit (int): Maximum number of elements to return (default 1000, at most 10000 for JSON pages).
+        fields (str): Comma-separated list of the fields to return ("id" is always included).
+        format (str): "ndjson" to stream the elements as application/x-ndjson instead of a JSON page.
+            The same mode is selected by an "Accept: application/x-ndjson" header. Streams are not
+            limited unless "limit" is given.
+
+    Returns:
+        Response: A JSON list of elements, where each element is represented as a dictionary.
+            When more elements may follow, the "Link" header holds the URL of the next page
+            and "X-Next-Cursor" the value to pass as "after_id" (or as "cursor" when sorting).
+
+    Raises:
+        400: If "limit", "fields", "sort", "cursor" or a date filter is invalid.
+    """
+    limit: Optional[int] = request.args.get("limit", type=int)
+    if limit is not None and limit <= 0:
+        abort(400, description="Invalid limit")
+
+    sort_keys = _parse_sort()
+    columns = _parse_fields()
+    columns += [column for column, _ in sort_keys if column not in columns]
+    statement = _apply_filters(select(*columns)).where(LIVE_ELEMENTS)
+    statement = statement.order_by(
+        *(column.desc().nulls_first() if descending else column.asc().nulls_last() for column, descending in sort_keys),
+        ElementData.id,
+    )
+
+    if sort_keys:
+        cursor = request.args.get("cursor")
+        if cursor:
+            statement = statement.where(_keyset_condition(sort_keys, _decode_cursor(cursor, len(sort_keys) + 1)))
+    else:
+        statement = statement.where(ElementData.id > request.args.get("after_id", default=0, type=int))
+
+    if _wants_ndjson():
+        if limit is not None:
+            statement = statement.limit(limit)
+        return Response(stream_with_context(_stream_ndjson(statement)), mimetype=NDJSON_MIMETYPE)
+
+    limit = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    rows = session.execute(statement.limit(limit)).all()
+    response = jsonify([row._asdict() for row in rows])
+
+    # A full page means there may be more elements after the last one
+    if len(rows) == limit:
+        last = rows[-1]
+        if sort_keys:
+            cursor_parameter = "cursor"
+            next_cursor = _encode_cursor([getattr(last, column.name) for column, _ in sort_keys] + [last.id])
+        else:
+            cursor_parameter, next_cursor = "after_id", last.id
+        next_url = url_for(".get_elements", _external=True, **{**request.args.to_dict(flat=False), cursor_parameter: next_cursor, "limit": limit})
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return response
+
+
+def _after_position(version_column: Column, id_column: Column, position: List[Optional[int]], until: int) -> ColumnElement:
+    """
+    Build the condition selecting the rows of a change feed table after a position, up to a version.
+
+    Args:
+        version_column (Column): The row version column of the table.
+        id_column (Column): The element ID column of the table.
+        position (List[Optional[int]]): The version and element ID of the last change read, the ID
+            being None once all the changes of the version were read.
+        until (int): The last version to select.
+
+    Returns:
+        ColumnElement: The SQL condition.
+    """
+    version, element_id = position
+    if element_id is None:
+        return and_(version_column > version, version_column <= until)
+    return and_(
+        version_column.between(version, until),
+        or_(version_column > version, id_column > element_id),
+    )
+
+
+def _read_changes(position: List[Optional[int]], until: int, columns: List[Column], limit: int) -> List[Dict[str, Any]]:
+    """
+    Read the changes after a position of the feed, in (version, id) order.
+
+    Written elements are read from element_data, where the elements soft-deleted by the incremental
+    loader are deletions, and the elements deleted by the API from their tombstones.
+
+    Args:
+        position (List[Optional[int]]): The version and element ID of the last change read.
+        until (int): The last version to read.
+        columns (List[Column]): The element columns to return for the written elements.
+        limit (int): Maximum number of changes to read.
+
+    Returns:
+        List[Dict[str, Any]]: The changes, each holding the "version" and "id" of the element, its
+            "op" ("upsert" or "delete") and, for upserts, the "element".
+    """
+    statement = (
+        select(ElementData.row_version.label("_version"), ElementData.deleted_at.label("_deleted_at"), *columns)
+        .where(_after_position(ElementData.row_version, ElementData.id, position, until))
+        .order_by(ElementData.row_version, ElementData.id)
+        .limit(limit)
+    )
+    written = []
+    for row in session.execute(statement):
+        element = row._asdict()
+        version = element.pop("_version")
+        if element.pop("_deleted_at") is None:
+            written.append({"version": version, "id": element["id"], "op": "upsert", "element": element})
+        else:
+            written.append({"version": version, "id": element["id"], "op": "delete"})
+
+    tombstone = element_tombstone.c
+    statement = (
+        select(tombstone.row_version, tombstone.element_id)
+        .where(_after_position(tombstone.row_version, tombstone.element_id, position, until))
+        .order_by(tombstone.row_version, tombstone.element_id)
+        .limit(limit)
+    )
+    deleted = [{"version": version, "id": element_id, "op": "delete"} for version, element_id in session.execute(statement)]
+
+    changes = heapq.merge(written, deleted, key=lambda change: (change["version"], change["id"]))
+    return list(itertools.islice(changes, limit))
+
+
+@api.route('/elements/changes', methods=['GET'])
+def get_changes() -> Response:
+    """
+    Retrieve the elements written or deleted since a version, for clients keeping a synchronized copy.
+
+    Every write gives the elements it creates, updates or deletes a new row version, versions
+    increasing in commit order. A client starts from since=0, applies the changes in order and
+    follows "cursor" until "has_more" is false; the last cursor is then the starting point of
+    its next synchronization.
+
+    Query parameters:
+        since (int): Only return the changes of versions greater than this one (default 0).
+        cursor (str): The position to resume from, as given by the previous response (replaces "since").
+        limit (int): Maximum number of changes to return (default 1000, at most 10000).
+        fields (str): Comma-separated list of the element fields to return ("id" is always included).
+        wait (float): Number of seconds to wait for a change when there is none yet (long polling,
+            default 0, at most MAX_CHANGES_WAIT).
+
+    Returns:
+        Response: A JSON object holding the "changes" in version order, each with the "version"
+            and "id" of the element, its "op" ("upsert" or "delete") and, for upserts, the
+            "element"; the last "version" included in the response; the "cursor" to resume from
+            and whether more changes are already available ("has_more"). When they are, the "Link"
+            header holds the URL of the next page and "X-Next-Cursor" its cursor.
+
+    Raises:
+        400: If "since", "limit", "wait", "cursor" or "fields" is invalid.
+    """
+    cursor = request.args.get("cursor")
+    if cursor:
+        position = _decode_cursor(cursor, 2)
+        if not isinstance(position[0], int) or not (position[1] is None or isinstance(position[1], int)):
+            abort(400, description="Invalid cursor")
+    else:
+        since = request.args.get("since", default=0, type=int)
+        if since < 0:
+            abort(400, description="Invalid since")
+        position = [since, None]
+    limit = request.args.get("limit", default=DEFAULT_PAGE_SIZE, type=int)
+    if limit <= 0:
+        abort(400, description="Invalid limit")
+    limit = min(limit, MAX_PAGE_SIZE)
+    wait = request.args.get("wait", default=0.0, type=float)
+    if not 0 <= wait < float("inf"):
+        abort(400, description="Invalid wait")
+    columns = _parse_fields()
+
+    change_notifier = get_state().change_notifier
+    deadline = time.monotonic() + min(wait, MAX_CHANGES_WAIT)
+    while True:
+        generation = change_notifier.generation
+        until = current_row_version(session)
+        changes = _read_changes(position, until, columns, limit + 1) if until > position[0] or position[1] is not None else []
+        remaining = deadline - time.monotonic()
+        if changes or remaining <= 0:
+            break
+        # Give the connection back to the pool while waiting
+        session.close()
+        change_notifier.wait(generation, min(remaining, CHANGES_POLL_INTERVAL))
+
+    has_more = len(changes) > limit
+    if has_more:
+        changes = changes[:limit]
+        last = changes[-1]
+        version, next_position = last["version"], [last["version"], last["id"]]
+    else:
+        version, next_position = until, [until, None]
+    next_cursor = _encode_cursor(next_position)
+    response = jsonify({"changes": changes, "version": version, "cursor": next_cursor, "has_more": has_more})
+    if has_more:
+        next_url = url_for(".get_changes", _external=True, **{**request.args.to_dict(flat=False), "cursor": next_cursor, "limit": limit})
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+
+def _has_fulltext_index() -> bool:
+    """
+    Tell whether the database hosts the full-text search index created by models.create_search_index.
+
+    Returns:
+        bool: True if searches can be run in PostgreSQL.
+    """
+    state = get_state()
+    if state.fulltext_available is None:
+        state.fulltext_available = get_engine().dialect.name == "postgresql" and session.execute(
+            text("SELECT to_regclass('ix_element_data_search_vector') IS NOT NULL")
+        ).scalar()
+    return state.fulltext_available
+
+
+def _search_values(element: ElementData) -> Dict[str, Optional[str]]:
+    """
+    Read the searched columns of an element, to keep the in-process index up to date after a write.
+
+    Args:
+        element (ElementData): The element being written.
+
+    Returns:
+        Dict[str, Optional[str]]: The values of the searched columns.
+    """
+    return {name: getattr(element, name) for name in SEARCH_COLUMNS}
+
+
+def _search_text_rows() -> Iterator[Tuple]:
+    """
+    Read the searched columns of every element to build the in-process index.
+
+    Yields:
+        Tuple: The ID of an element followed by its searched columns.
+    """
+    statement = select(ElementData.id, *(ELEMENT_COLUMNS[name] for name in SEARCH_COLUMNS)).where(LIVE_ELEMENTS)
+    with get_engine().connect() as connection:
+        yield from connection.execute(statement.execution_options(yield_per=STREAM_BATCH_SIZE))
+
+
+def _search_database(query: str, columns: List[Column], limit: int, fuzzy: bool) -> List[Dict[str, Any]]:
+    """
+    Rank the elements matching a query with the PostgreSQL full-text index, then with
+    the trigram index when nothing matches and typos are tolerated.
+
+    Args:
+        query (str): The free-text query.
+        columns (List[Column]): The columns to return.
+        limit (int): Maximum number of elements to return.
+        fuzzy (bool): Whether to fall back to trigram similarity.
+
+    Returns:
+        List[Dict[str, Any]]: The matching elements with their "score", best first.
+    """
+    search_vector = literal_column("element_data.search_vector")
+    tsquery = func.websearch_to_tsquery("french_unaccent", query)
+    score = func.ts_rank_cd(search_vector, tsquery)
+    statement = _apply_filters(select(*columns, score.label("score"))).where(LIVE_ELEMENTS, search_vector.op("@@")(tsquery))
+    rows = session.execute(statement.order_by(score.desc(), ElementData.id).limit(limit)).all()
+    if rows or not fuzzy:
+        return [row._asdict() for row in rows]
+
+    search_text = func.element_data_search_text(*(ELEMENT_COLUMNS[name] for name in SEARCH_COLUMNS))
+    folded_query = fold(query)
+    score = func.word_similarity(folded_query, search_text)
+    statement = _apply_filters(select(*columns, score.label("score"))).where(
+        LIVE_ELEMENTS, literal(folded_query).op("<%")(search_text)
+    )
+    rows = session.execute(statement.order_by(score.desc(), ElementData.id).limit(limit)).all()
+    return [row._asdict() for row in rows]
+
+
+def _search_in_process(query: str, columns: List[Column], limit: int, fuzzy: bool) -> List[Dict[str, Any]]:
+    """
+    Rank the elements matching a query with the in-process inverted index.
+
+    Args:
+        query (str): The free-text query.
+        columns (List[Column]): The columns to return.
+        limit (int): Maximum number of elements to return.
+        fuzzy (bool): Whether misspelled query tokens may match close tokens.
+
+    Returns:
+        List[Dict[str, Any]]: The matching elements with their "score", best first.
+    """
+    ranked = get_state().search_index.search(_search_text_rows, query, fuzzy=fuzzy)
+    results: List[Dict[str, Any]] = []
+    # Fetch the ranked elements by batches until enough of them pass the filters
+    for offset in range(0, len(ranked), limit):
+        batch = dict(ranked[offset:offset + limit])
+        rows = session.execute(_apply_filters(select(*columns)).where(LIVE_ELEMENTS, ElementData.id.in_(batch))).all()
+        found = sorted((row._asdict() for row in rows), key=lambda row: (-batch[row["id"]], row["id"]))
+        for row in found:
+            row["score"] = batch[row["id"]]
+        results.extend(found[:limit - len(results)])
+        if len(results) == limit:
+            break
+    return results
+
+
+@api.route('/elements/export', methods=['GET'])
+def export_elements_file() -> Response:
+    """
+    Download the elements as a Parquet file or an Arrow IPC stream.
+
+    The file is written from a server-side cursor one chunk at a time, then kept on disk until the
+    next write of any process so that repeat downloads are sent straight from the file, with the
+    same ETag whichever worker serves them.
+
+    Query parameters:
+        format (str): "parquet" (default) or "arrow".
+        fields (str): Comma-separated list of the columns to export ("id" is always included).
+        The filters of GET /elements are also accepted.
+
+    Returns:
+        Response: The file, with a strong ETag honouring If-None-Match.
+
+    Raises:
+        400: If the format, "fields" or a filter is invalid.
+    """
+    export_format = request.args.get("format", "parquet")
+    if export_format not in EXPORT_FORMATS:
+        abort(400, description=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    statement = _apply_filters(select(*_parse_fields())).where(LIVE_ELEMENTS).order_by(ElementData.id)
+
+    key = tuple(sorted(request.args.items(multi=True)))
+    state = get_state()
+    version = current_row_version(session)
+    extension = EXPORT_FORMATS[export_format]["extension"]
+    file = state.export_cache.get(
+        key,
+        version,
+        extension,
+        lambda destination: export_elements(session.connection(), statement, destination, export_format, EXPORT_CHUNK_SIZE),
+    )
+    return send_file(
+        file,
+        mimetype=EXPORT_FORMATS[export_format]["mimetype"],
+        as_attachment=True,
+        download_name=f"elements.{extension}",
+        etag=os.path.basename(file.name).split(".")[0],
+        max_age=0,
+    )
+
+
+@api.route('/elements/search', methods=['GET'])
+@cached_response
+def search_elements() -> Response:
+    """
+    Search elements by free text in their names and tags.
+
+    Query parameters:
+        q (str): The free-text query, e.g. "électricité France mix".
+        limit (int): Maximum number of elements to return (default 20, at most 1000).
+        fuzzy (int): 0 to disable typo-tolerant matching (enabled by default).
+        fields (str): Comma-separated list of the fields to return ("id" is always included).
+        The filters of GET /elements are also accepted.
+
+    Returns:
+        Response: A JSON list of the matching elements, best first, each with its relevance "score".
+
+    Raises:
+        400: If "q", "limit" or "fields" is invalid.
+    """
+    query = request.args.get("q", "").strip()
+    if not query:
+        abort(400, description="Missing query")
+    limit = request.args.get("limit", default=DEFAULT_SEARCH_LIMIT, type=int)
+    if limit <= 0:
+        abort(400, description="Invalid limit")
+    limit = min(limit, MAX_SEARCH_LIMIT)
+    fuzzy = request.args.get("fuzzy", default=1, type=int) != 0
+
+    search = _search_database if _has_fulltext_index() else _search_in_process
+    return jsonify(search(query, _parse_fields(), limit, fuzzy))
+
+
+def _rollup_columns() -> List[Column]:
+    """
+    List the element columns the rollups are grouped by.
+
+    Returns:
+        List[Column]: The columns, in ROLLUP_DIMENSIONS order.
+    """
+    return [ELEMENT_COLUMNS[name] for name in ROLLUP_DIMENSIONS]
+
+
+def _rollup_key(element: Any) -> Tuple:
+    """
+    Read the rollup dimensions of an element, to refresh its rollup row after a write.
+
+    Args:
+        element (Any): An ElementData instance or a mapping of column values.
+
+    Returns:
+        Tuple: The dimension values, in ROLLUP_DIMENSIONS order.
+    """
+    if isinstance(element, Mapping):
+        return tuple(element.get(name) for name in ROLLUP_DIMENSIONS)
+    return tuple(getattr(element, name) for name in ROLLUP_DIMENSIONS)
+
+
+def _rollup_keys_of(ids: Iterable[int]) -> Set[Tuple]:
+    """
+    Read the rollup dimensions of elements from the database.
+
+    Args:
+        ids (Iterable[int]): The IDs of the elements.
+
+    Returns:
+        Set[Tuple]: The distinct dimension values of the elements.
+    """
+    statement = select(*_rollup_columns()).where(ElementData.id.in_(list(ids))).distinct()
+    return {tuple(row) for row in session.execute(statement)}
+
+
+def _ensure_rollups() -> None:
+    """
+    Compute the rollups on first use when the table was filled without them, e.g. before they existed.
+
+    Returns:
+        None
+    """
+    state = get_state()
+    if state.rollups_ready:
+        return
+    if not session.execute(select(exists(element_rollup.select()))).scalar() and session.execute(
+        select(exists(ElementData.__table__.select()))
+    ).scalar():
+        refresh_rollups(session)
+        session.commit()
+    state.rollups_ready = True
+
+
+def _parse_metrics() -> List[Tuple[str, Optional[str]]]:
+    """
+    Resolve the "metrics" query parameter, e.g. "sum:co2f,mean:n2o,count".
+
+    Returns:
+        List[Tuple[str, Optional[str]]]: The aggregate function and column of each metric, the column
+            being None for the row count. Defaults to the sum of total_poste_non_decompose and the row count.
+
+    Raises:
+        400: If a metric is invalid.
+    """
+    metrics: List[Tuple[str, Optional[str]]] = []
+    for metric in request.args.get("metrics", "sum:total_poste_non_decompose,count").split(","):
+        function, _, name = metric.strip().partition(":")
+        if function == "count" and not name:
+            metrics.append((function, None))
+        elif function in AGGREGATE_FUNCTIONS and name in ROLLUP_METRICS:
+            metrics.append((function, name))
+        else:
+            abort(400, description=f"Invalid metric: {metric}")
+    return metrics
+
+
+def _rollup_aggregate(function: str, name: Optional[str]) -> ColumnElement:
+    """
+    Build the expression of a metric over the rollup rows.
+
+    Args:
+        function (str): The aggregate function ("sum", "mean", "min", "max" or "count").
+        name (Optional[str]): The aggregated column, None for the row count.
+
+    Returns:
+        ColumnElement: The SQL expression.
+    """
+    rollup = element_rollup.c
+    if name is None:
+        return func.sum(rollup.nombre)
+    if function == "sum":
+        return func.sum(rollup[f"{name}_somme"])
+    if function == "mean":
+        return cast(func.sum(rollup[f"{name}_somme"]), Float) / func.nullif(func.sum(rollup[f"{name}_nombre"]), 0)
+    if function == "count":
+        return func.sum(rollup[f"{name}_nombre"])
+    return getattr(func, function)(rollup[f"{name}_{function}"])
+
+
+def _direct_aggregate(function: str, name: Optional[str]) -> ColumnElement:
+    """
+    Build the expression of a metric over the element rows.
+
+    Args:
+        function (str): The aggregate function ("sum", "mean", "min", "max" or "count").
+        name (Optional[str]): The aggregated column, None for the row count.
+
+    Returns:
+        ColumnElement: The SQL expression.
+    """
+    if name is None:
+        return func.count()
+    column = ELEMENT_COLUMNS[name]
+    return {"sum": func.sum, "mean": func.avg, "min": func.min, "max": func.max, "count": func.count}[function](column)
+
+
+@api.route('/elements/aggregate', methods=['GET'])
+@cached_response
+def aggregate_elements() -> Response:
+    """
+    Aggregate the emission factors, computed in SQL.
+
+    Queries grouped and filtered only by rollup dimensions are answered from the element_rollup table,
+    which the writes keep up to date, instead of scanning the elements.
+
+    Query parameters:
+        group_by (str): Comma-separated dimensions among code_categorie, categorie_niveau_1 to
+            categorie_niveau_4 (the category truncated to its first levels), localisation_geo, type_poste,
+            contributeur, statut_element and type_ligne. Without it a single total row is returned.
+        metrics (str): Comma-separated "<function>:<column>" metrics, the function being sum, mean, min,
+            max or count and the column one of total_poste_non_decompose, co2f, ch4f, ch4b, n2o, co2b and
+            autres_ges, or "count" for the number of elements (default "sum:total_poste_non_decompose,count").
+        The filters of GET /elements are also accepted. Beware that "Elément" and "Poste" lines
+        (type_ligne) hold the same emissions, so totals should filter on one of them.
+
+    Returns:
+        Response: A JSON list with one object per group, holding the dimensions and the metrics
+            (named "<function>_<column>", or "count").
+
+    Raises:
+        400: If a dimension or a metric is invalid.
+    """
+    group_by = [name.strip() for name in request.args.get("group_by", "").split(",") if name.strip()]
+    unknown = set(group_by) - set(AGGREGATE_DIMENSIONS)
+    if unknown:
+        abort(400, description=f"Unknown dimensions: {', '.join(sorted(unknown))}")
+    metrics = _parse_metrics()
+
+    filters = {name for name in FILTER_PARAMETERS if name in request.args}
+    if filters <= set(ROLLUP_DIMENSIONS):
+        _ensure_rollups()
+        dimensions = [element_rollup.c[name] for name in group_by]
+        aggregates = [_rollup_aggregate(function, name) for function, name in metrics]
+        statement = _apply_filters(select(*dimensions), element_rollup.c)
+    elif not set(group_by) & set(CATEGORY_LEVEL_DIMENSIONS):
+        dimensions = [ELEMENT_COLUMNS[name] for name in group_by]
+        aggregates = [_direct_aggregate(function, name) for function, name in metrics]
+        statement = _apply_filters(select(*dimensions)).where(LIVE_ELEMENTS)
+    else:
+        abort(400, description="Category levels can only be combined with filters on rollup dimensions")
+
+    labels = [f"{function}_{name}" if name else "count" for function, name in metrics]
+    statement = statement.add_columns(*(aggregate.label(label) for aggregate, label in zip(aggregates, labels)))
+    statement = statement.group_by(*dimensions).order_by(*dimensions)
+    return jsonify([row._asdict() for row in session.execute(statement)])
+
+
+def _factor_rows() -> List[Tuple]:
+    """
+    Read the columns of the factor snapshot from the table.
+
+    Returns:
+        List[Tuple]: The rows expected by footprint.FactorSnapshot.from_rows.
+    """
+    names = ("id", "identifiant_element", "type_ligne") + FACTOR_COLUMNS + SUPPLEMENTARY_GAS_COLUMNS
+    return session.execute(select(*(ELEMENT_COLUMNS[name] for name in names)).where(LIVE_ELEMENTS)).all()
+
+
+def _read_footprint_lines() -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Read the activity lines of a footprint request, as JSON or CSV.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: The element ID, the identifiant_element and the quantity
+            of each line, the missing keys being NaN.
+
+    Raises:
+        400: If the body is invalid.
+    """
+    try:
+        if request.mimetype == CSV_MIMETYPE:
+            stream = io.StringIO(request.get_data(as_text=True))
+            header = [name.strip() for name in stream.readline().split(",")]
+            table = np.loadtxt(stream, delimiter=",", dtype=np.float64, ndmin=2)
+            columns = {name: table[:, position] for position, name in enumerate(header) if table.size}
+            count = len(table)
+        else:
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                abort(400, description="Body must be a JSON object or CSV")
+            if "lines" in data:
+                lines = data["lines"]
+                if not isinstance(lines, list) or not all(isinstance(line, dict) for line in lines):
+                    abort(400, description="lines must be a list of objects")
+                columns = {
+                    name: np.array([line.get(name) for line in lines], dtype=np.float64)
+                    for name in ("id", "identifiant_element", "quantity")
+                }
+            else:
+                columns = {
+                    name: np.array(data[key], dtype=np.float64)
+                    for name, key in (("id", "ids"), ("identifiant_element", "identifiants"), ("quantity", "quantities"))
+                    if key in data
+                }
+            count = max((len(values) for values in columns.values()), default=0)
+    except (TypeError, ValueError) as error:
+        abort(400, description=f"Invalid activity lines: {error}")
+
+    if count > MAX_FOOTPRINT_LINES:
+        abort(400, description=f"At most {MAX_FOOTPRINT_LINES} lines are accepted")
+    missing = np.full(count, np.nan)
+    ids = columns.get("id", missing)
+    identifiants = columns.get("identifiant_element", missing)
+    quantities = columns.get("quantity", missing)
+    if any(values.ndim != 1 or len(values) != count for values in (ids, identifiants, quantities)):
+        abort(400, description="Every line needs a quantity, and an id or an identifiant_element")
+    if np.isnan(quantities).any() or (np.isnan(ids) & np.isnan(identifiants)).any():
+        abort(400, description="Every line needs a quantity, and an id or an identifiant_element")
+    return ids, identifiants, quantities
+
+
+@api.route('/footprint', methods=['POST'])
+def calculate_footprint() -> Response:
+    """
+    Compute the emissions of activity lines, i.e. quantities multiplied by the emission factors of elements.
+
+    The factors are served from an in-memory snapshot of the table, so that a million lines are computed
+    in a fraction of a second.
+
+    The body is one of:
+        - a CSV file (Content-Type: text/csv) with a header naming its columns, "quantity" and either
+          "id" or "identifiant_element",
+        - a JSON object holding "quantities" and either "ids" or "identifiants", lists of the same length,
+        - a JSON object holding "lines", a list of {"id" or "identifiant_element", "quantity"} objects.
+    A line referencing an identifiant_element uses the "Elément" line of that element.
+
+    Query parameters:
+        details (bool): Whether to return the emissions of each line (default true).
+
+    Returns:
+        Response: A JSON object holding the number of lines ("count"), the emissions summed over
+            the lines ("totals"), the indexes of the lines whose element is unknown ("unknown") and,
+            unless disabled, the emissions of each line ("lines", one list per gas). The emissions are
+            broken down into total_poste_non_decompose (CO2e), co2f, ch4f, ch4b, n2o, co2b, autres_ges
+            and gaz_supplementaires (the sum of the supplementary gases).
+
+    Raises:
+        400: If the body is invalid.
+    """
+    ids, identifiants, quantities = _read_footprint_lines()
+    snapshot = get_state().factor_snapshot.get(_factor_rows)
+    by_id = ~np.isnan(ids)
+    rows = np.where(
+        by_id,
+        snapshot.rows_of_ids(np.where(by_id, ids, -1)),
+        snapshot.rows_of_identifiants(identifiants),
+    )
+    footprint = compute_footprint(snapshot, rows, quantities)
+
+    result: Dict[str, Any] = {
+        "count": len(rows),
+        "totals": dict(zip(BREAKDOWN, footprint.totals.tolist())),
+        "unknown": footprint.unknown.tolist(),
+    }
+    if request.args.get("details", "true").lower() not in ("0", "false", "no"):
+        result["lines"] = dict(zip(BREAKDOWN, footprint.lines.T.tolist()))
     return jsonify(result)
 
 
-@app.route('/elements/<int:id>', methods=['GET'])
+@api.route('/elements/<int:id>', methods=['GET'])
+@cached_response
 def get_element_by_id(id: int) -> Dict[str, Any]:
     """
     Retrieve a specific element by its ID.
@@ -97,72 +1221,24 @@ def get_element_by_id(id: int) -> Dict[str, Any]:
     Args:
         id (int): The ID of the element.
 
+    Query parameters:
+        fields (str): Comma-separated list of the fields to return ("id" is always included).
+
     Returns:
         Dict[str, Any]: A JSON representation of the requested element.
 
     Raises:
+        400: If "fields" is invalid.
         404: If the element is not found in the database.
     """
-    element = session.query(ElementData).get(id)
-    if not element:
+    row = session.execute(select(*_parse_fields()).where(ElementData.id == id, LIVE_ELEMENTS)).first()
+    if not row:
         abort(404, description="Element not found")
-    result = {
-    "id": element.id,
-    "type_ligne": element.type_ligne,
-    "identifiant_element": element.identifiant_element,
-    "structure": element.structure,
-    "statut_element": element.statut_element,
-    "nom_base_francais": element.nom_base_francais,
-    "nom_attribut_francais": element.nom_attribut_francais,
-    "nom_frontiere_francais": element.nom_frontiere_francais,
-    "code_categorie": element.code_categorie,
-    "tags_francais": element.tags_francais,
-    "unite_francais": element.unite_francais,
-    "contributeur": element.contributeur,
-    "programme": element.programme,
-    "url_programme": element.url_programme,
-    "source": element.source,
-    "localisation_geo": element.localisation_geo,
-    "sous_localisation_geo_francais": element.sous_localisation_geo_francais,
-    "date_creation": element.date_creation,
-    "date_modification": element.date_modification,
-    "periode_validite": element.periode_validite,
-    "incertitude": element.incertitude,
-    "reglementations": element.reglementations,
-    "transparence": element.transparence,
-    "qualite": element.qualite,
-    "qualite_ter": element.qualite_ter,
-    "qualite_gr": element.qualite_gr,
-    "qualite_tir": element.qualite_tir,
-    "qualite_c": element.qualite_c,
-    "qualite_p": element.qualite_p,
-    "qualite_m": element.qualite_m,
-    "commentaire_francais": element.commentaire_francais,
-    "type_poste": element.type_poste,
-    "nom_poste_francais": element.nom_poste_francais,
-    "total_poste_non_decompose": element.total_poste_non_decompose,
-    "co2f": element.co2f,
-    "ch4f": element.ch4f,
-    "ch4b": element.ch4b,
-    "n2o": element.n2o,
-    "code_gaz_supplementaire_1": element.code_gaz_supplementaire_1,
-    "valeur_gaz_supplementaire_1": element.valeur_gaz_supplementaire_1,
-    "code_gaz_supplementaire_2": element.code_gaz_supplementaire_2,
-    "valeur_gaz_supplementaire_2": element.valeur_gaz_supplementaire_2,
-    "code_gaz_supplementaire_3": element.code_gaz_supplementaire_3,
-    "valeur_gaz_supplementaire_3": element.valeur_gaz_supplementaire_3,
-    "code_gaz_supplementaire_4": element.code_gaz_supplementaire_4,
-    "valeur_gaz_supplementaire_4": element.valeur_gaz_supplementaire_4,
-    "code_gaz_supplementaire_5": element.code_gaz_supplementaire_5,
-    "valeur_gaz_supplementaire_5": element.valeur_gaz_supplementaire_5,
-    "autres_ges": element.autres_ges,
-    "co2b": element.co2b,
-    }
 
-    return jsonify(result)
+    return jsonify(row._asdict())
 
 
-@app.route('/elements', methods=['POST'])
+@api.route('/elements', methods=['POST'])
 def create_element() -> (Dict[str, int], int):
     """
     Create a new element in the database.
@@ -172,6 +1248,7 @@ def create_element() -> (Dict[str, int], int):
 
     Raises:
         400: If the input data is invalid or missing.
+        409: If an element with the same identifiant_element, type_ligne and type_poste exists.
     """
     data: Dict[str, Any] = request.json  # Input JSON data from the request
     if not data:
@@ -231,13 +1308,21 @@ def create_element() -> (Dict[str, int], int):
     )
 
     # Add the new element to the database
+    element.row_version = next_row_version(session)
     session.add(element)
+    session.flush()
+    search_values = _search_values(element)
+    refresh_rollups(session, [_rollup_key(element)])
     session.commit()
+    state = get_state()
+    state.change_notifier.notify()
+    state.search_index.update(element.id, search_values)
+    state.factor_snapshot.invalidate()
 
     # Return the ID of the created element and a 201 HTTP status code
     return jsonify({"id": element.id}), 201
 
-@app.route('/elements/<int:id>', methods=['PUT'])
+@api.route('/elements/<int:id>', methods=['PUT'])
 def update_element(id: int) -> Dict[str, str]:
     """
     Update an existing element by its ID.
@@ -250,75 +1335,82 @@ def update_element(id: int) -> Dict[str, str]:
 
     Raises:
         404: If the element is not found in the database.
+        409: If an element with the same identifiant_element, type_ligne and type_poste exists.
     """
-    data: Dict[str, Any] = request.json
-    element = session.query(ElementData).get(id)
-    if not element:
-        abort(404, description="Element not found")
-    from typing import Dict, Any
-
     data: Dict[str, Any] = request.json  # Input data from the request
-    element = session.query(ElementData).get(id)  # Fetch the element by ID
+    element = session.query(ElementData).filter(ElementData.id == id, LIVE_ELEMENTS).first()  # Fetch the element by ID
 
     if not element:
         abort(404, description="Element not found")
+    previous_rollup_key = _rollup_key(element)
+    # Lock the version counter before writing the element, see next_row_version
+    element.row_version = next_row_version(session)
 
-    # Update fields dynamically from the input data
-    element.type_ligne = data.get("type_ligne", element.type_ligne)
-    element.identifiant_element = data.get("identifiant_element", element.identifiant_element)
-    element.structure = data.get("structure", element.structure)
-    element.statut_element = data.get("statut_element", element.statut_element)
-    element.nom_base_francais = data.get("nom_base_francais", element.nom_base_francais)
-    element.nom_attribut_francais = data.get("nom_attribut_francais", element.nom_attribut_francais)
-    element.nom_frontiere_francais = data.get("nom_frontiere_francais", element.nom_frontiere_francais)
-    element.code_categorie = data.get("code_categorie", element.code_categorie)
-    element.tags_francais = data.get("tags_francais", element.tags_francais)
-    element.unite_francais = data.get("unite_francais", element.unite_francais)
-    element.contributeur = data.get("contributeur", element.contributeur)
-    element.programme = data.get("programme", element.programme)
-    element.url_programme = data.get("url_programme", element.url_programme)
-    element.source = data.get("source", element.source)
-    element.localisation_geo = data.get("localisation_geo", element.localisation_geo)
-    element.sous_localisation_geo_francais = data.get("sous_localisation_geo_francais", element.sous_localisation_geo_francais)
-    element.date_creation = data.get("date_creation", element.date_creation)
-    element.date_modification = data.get("date_modification", element.date_modification)
-    element.periode_validite = data.get("periode_validite", element.periode_validite)
-    element.incertitude = data.get("incertitude", element.incertitude)
-    element.reglementations = data.get("reglementations", element.reglementations)
-    element.transparence = data.get("transparence", element.transparence)
-    element.qualite = data.get("qualite", element.qualite)
-    element.qualite_ter = data.get("qualite_ter", element.qualite_ter)
-    element.qualite_gr = data.get("qualite_gr", element.qualite_gr)
-    element.qualite_tir = data.get("qualite_tir", element.qualite_tir)
-    element.qualite_c = data.get("qualite_c", element.qualite_c)
-    element.qualite_p = data.get("qualite_p", element.qualite_p)
-    element.qualite_m = data.get("qualite_m", element.qualite_m)
-    element.commentaire_francais = data.get("commentaire_francais", element.commentaire_francais)
-    element.type_poste = data.get("type_poste", element.type_poste)
-    element.nom_poste_francais = data.get("nom_poste_francais", element.nom_poste_francais)
-    element.total_poste_non_decompose = data.get("total_poste_non_decompose", element.total_poste_non_decompose)
-    element.co2f = data.get("co2f", element.co2f)
-    element.ch4f = data.get("ch4f", element.ch4f)
-    element.ch4b = data.get("ch4b", element.ch4b)
-    element.n2o = data.get("n2o", element.n2o)
-    element.code_gaz_supplementaire_1 = data.get("code_gaz_supplementaire_1", element.code_gaz_supplementaire_1)
-    element.valeur_gaz_supplementaire_1 = data.get("valeur_gaz_supplementaire_1", element.valeur_gaz_supplementaire_1)
-    element.code_gaz_supplementaire_2 = data.get("code_gaz_supplementaire_2", element.code_gaz_supplementaire_2)
-    element.valeur_gaz_supplementaire_2 = data.get("valeur_gaz_supplementaire_2", element.valeur_gaz_supplementaire_2)
-    element.code_gaz_supplementaire_3 = data.get("code_gaz_supplementaire_3", element.code_gaz_supplementaire_3)
-    element.valeur_gaz_supplementaire_3 = data.get("valeur_gaz_supplementaire_3", element.valeur_gaz_supplementaire_3)
-    element.code_gaz_supplementaire_4 = data.get("code_gaz_supplementaire_4", element.code_gaz_supplementaire_4)
-    element.valeur_gaz_supplementaire_4 = data.get("valeur_gaz_supplementaire_4", element.valeur_gaz_supplementaire_4)
-    element.code_gaz_supplementaire_5 = data.get("code_gaz_supplementaire_5", element.code_gaz_supplementaire_5)
-    element.valeur_gaz_supplementaire_5 = data.get("valeur_gaz_supplementaire_5", element.valeur_gaz_supplementaire_5)
-    element.autres_ges = data.get("autres_ges", element.autres_ges)
-    element.co2b = data.get("co2b", element.co2b)
+    # Update fields dynamically from the input data, flushed at once: reading the gas
+    # attributes loads the gases, which would otherwise flush the fields assigned before
+    with session.no_autoflush:
+        element.type_ligne = data.get("type_ligne", element.type_ligne)
+        element.identifiant_element = data.get("identifiant_element", element.identifiant_element)
+        element.structure = data.get("structure", element.structure)
+        element.statut_element = data.get("statut_element", element.statut_element)
+        element.nom_base_francais = data.get("nom_base_francais", element.nom_base_francais)
+        element.nom_attribut_francais = data.get("nom_attribut_francais", element.nom_attribut_francais)
+        element.nom_frontiere_francais = data.get("nom_frontiere_francais", element.nom_frontiere_francais)
+        element.code_categorie = data.get("code_categorie", element.code_categorie)
+        element.tags_francais = data.get("tags_francais", element.tags_francais)
+        element.unite_francais = data.get("unite_francais", element.unite_francais)
+        element.contributeur = data.get("contributeur", element.contributeur)
+        element.programme = data.get("programme", element.programme)
+        element.url_programme = data.get("url_programme", element.url_programme)
+        element.source = data.get("source", element.source)
+        element.localisation_geo = data.get("localisation_geo", element.localisation_geo)
+        element.sous_localisation_geo_francais = data.get("sous_localisation_geo_francais", element.sous_localisation_geo_francais)
+        element.date_creation = data.get("date_creation", element.date_creation)
+        element.date_modification = data.get("date_modification", element.date_modification)
+        element.periode_validite = data.get("periode_validite", element.periode_validite)
+        element.incertitude = data.get("incertitude", element.incertitude)
+        element.reglementations = data.get("reglementations", element.reglementations)
+        element.transparence = data.get("transparence", element.transparence)
+        element.qualite = data.get("qualite", element.qualite)
+        element.qualite_ter = data.get("qualite_ter", element.qualite_ter)
+        element.qualite_gr = data.get("qualite_gr", element.qualite_gr)
+        element.qualite_tir = data.get("qualite_tir", element.qualite_tir)
+        element.qualite_c = data.get("qualite_c", element.qualite_c)
+        element.qualite_p = data.get("qualite_p", element.qualite_p)
+        element.qualite_m = data.get("qualite_m", element.qualite_m)
+        element.commentaire_francais = data.get("commentaire_francais", element.commentaire_francais)
+        element.type_poste = data.get("type_poste", element.type_poste)
+        element.nom_poste_francais = data.get("nom_poste_francais", element.nom_poste_francais)
+        element.total_poste_non_decompose = data.get("total_poste_non_decompose", element.total_poste_non_decompose)
+        element.co2f = data.get("co2f", element.co2f)
+        element.ch4f = data.get("ch4f", element.ch4f)
+        element.ch4b = data.get("ch4b", element.ch4b)
+        element.n2o = data.get("n2o", element.n2o)
+        element.code_gaz_supplementaire_1 = data.get("code_gaz_supplementaire_1", element.code_gaz_supplementaire_1)
+        element.valeur_gaz_supplementaire_1 = data.get("valeur_gaz_supplementaire_1", element.valeur_gaz_supplementaire_1)
+        element.code_gaz_supplementaire_2 = data.get("code_gaz_supplementaire_2", element.code_gaz_supplementaire_2)
+        element.valeur_gaz_supplementaire_2 = data.get("valeur_gaz_supplementaire_2", element.valeur_gaz_supplementaire_2)
+        element.code_gaz_supplementaire_3 = data.get("code_gaz_supplementaire_3", element.code_gaz_supplementaire_3)
+        element.valeur_gaz_supplementaire_3 = data.get("valeur_gaz_supplementaire_3", element.valeur_gaz_supplementaire_3)
+        element.code_gaz_supplementaire_4 = data.get("code_gaz_supplementaire_4", element.code_gaz_supplementaire_4)
+        element.valeur_gaz_supplementaire_4 = data.get("valeur_gaz_supplementaire_4", element.valeur_gaz_supplementaire_4)
+        element.code_gaz_supplementaire_5 = data.get("code_gaz_supplementaire_5", element.code_gaz_supplementaire_5)
+        element.valeur_gaz_supplementaire_5 = data.get("valeur_gaz_supplementaire_5", element.valeur_gaz_supplementaire_5)
+        element.autres_ges = data.get("autres_ges", element.autres_ges)
+        element.co2b = data.get("co2b", element.co2b)
 
+    search_values = _search_values(element)
+    session.flush()
+    refresh_rollups(session, [previous_rollup_key, _rollup_key(element)])
     session.commit()
+    state = get_state()
+    state.change_notifier.notify()
+    state.search_index.update(id, search_values)
+    state.factor_snapshot.invalidate()
     return jsonify({"message": "Element updated"})
 
 
-@app.route('/elements/<int:id>', methods=['DELETE'])
+@api.route('/elements/<int:id>', methods=['DELETE'])
 def delete_element(id: int) -> Dict[str, str]:
     """
     Delete an element from the database by id.
@@ -332,13 +1424,487 @@ def delete_element(id: int) -> Dict[str, str]:
     Raises:
         404: If the element is not found in the database.
     """
-    element = session.query(ElementData).get(id)
+    element = session.query(ElementData).filter(ElementData.id == id, LIVE_ELEMENTS).first()
     if not element:
         abort(404, description="Element not found")
+    rollup_key = _rollup_key(element)
+    version = next_row_version(session)
     session.delete(element)
+    session.execute(insert(element_tombstone).values(element_id=id, row_version=version))
+    session.flush()
+    refresh_rollups(session, [rollup_key])
     session.commit()
+    state = get_state()
+    state.change_notifier.notify()
+    state.search_index.remove(id)
+    state.factor_snapshot.invalidate()
     return jsonify({"message": "Element deleted"})
 
 
+def _read_batch_items() -> List[Any]:
+    """
+    Read the items of a batch request, given as a JSON array or as NDJSON (one item per line).
+
+    Returns:
+        List[Any]: The items of the batch.
+
+    Raises:
+        400: If the body is not a JSON array or valid NDJSON, or holds more than MAX_BATCH_SIZE items.
+    """
+    if request.mimetype == NDJSON_MIMETYPE:
+        try:
+            items = [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+        except ValueError:
+            abort(400, description="Invalid NDJSON")
+    else:
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            abort(400, description="Invalid input, expected a JSON array")
+    if len(items) > MAX_BATCH_SIZE:
+        abort(400, description=f"Too many items, at most {MAX_BATCH_SIZE} are accepted")
+    return items
+
+
+def _invalid_fields(item: Dict[str, Any], allowed: Iterable[str]) -> List[str]:
+    """
+    List the fields of a batch item that cannot be written.
+
+    Args:
+        item (Dict[str, Any]): The batch item.
+        allowed (Iterable[str]): The fields the item may hold.
+
+    Returns:
+        List[str]: The unknown fields, sorted.
+    """
+    return sorted(item.keys() - set(allowed))
+
+
+def _update_statement(
+    key: str, fields: Tuple[str, ...], rows: List[Dict[str, Any]], row_version: int,
+) -> Tuple[Any, Optional[List[Dict[str, Any]]]]:
+    """
+    Build a set-based update of elements matched on a key column.
+
+    On PostgreSQL all the rows are sent in a single "UPDATE ... FROM (VALUES ...)" statement.
+    Other backends get a batched executemany of the same update.
+
+    Args:
+        key (str): The column matching the rows to the elements ("id" or "identifiant_element").
+        fields (Tuple[str, ...]): The updated columns, the same for all the rows.
+        rows (List[Dict[str, Any]]): The key value (under "key") and the new values of each row.
+        row_version (int): The row version of the updated elements.
+
+    Returns:
+        Tuple[Any, Optional[List[Dict[str, Any]]]]: The statement and its executemany parameters (None for
+            the VALUES statement, which embeds the rows).
+    """
+    key_column = ELEMENT_COLUMNS[key]
+    if get_engine().dialect.name == "postgresql":
+        batch = values(
+            column("key", key_column.type),
+            *(column(field, ELEMENT_COLUMNS[field].type) for field in fields),
+            name="batch",
+        ).data([(row["key"], *(row[field] for field in fields)) for row in rows])
+        # The casts type the columns of the VALUES list even when its first row holds NULLs
+        statement = (
+            update(ElementData.__table__)
+            .where(key_column == batch.c.key, LIVE_ELEMENTS)
+            .values({**{field: cast(batch.c[field], ELEMENT_COLUMNS[field].type) for field in fields}, "row_version": row_version})
+        )
+        return statement, None
+
+    statement = (
+        update(ElementData.__table__)
+        .where(key_column == bindparam("key"), LIVE_ELEMENTS)
+        .values({**{field: bindparam(f"new_{field}") for field in fields}, "row_version": row_version})
+    )
+    parameters = [{"key": row["key"], **{f"new_{field}": row[field] for field in fields}} for row in rows]
+    return statement, parameters
+
+
+def _gas_rows(element_id: int, values: Mapping[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Build the element_gas rows of the supplementary gases given in the fields of a new element.
+
+    Args:
+        element_id (int): The ID of the element.
+        values (Mapping[str, Any]): The fields of the element.
+
+    Returns:
+        List[Dict[str, Any]]: One row per gas having a code or a value.
+    """
+    rows = []
+    for position in range(1, SUPPLEMENTARY_GASES + 1):
+        code = values.get(f"code_gaz_supplementaire_{position}")
+        valeur = values.get(f"valeur_gaz_supplementaire_{position}")
+        if code is not None or valeur is not None:
+            rows.append({"element_id": element_id, "position": position, "code": code, "valeur": valeur})
+    return rows
+
+
+def _update_gases(rows: List[Dict[str, Any]], matches: Dict[Any, List[int]], fields: List[str], row_version: int) -> None:
+    """
+    Apply the supplementary gas fields of batch updates through the ORM attributes, which add,
+    change and remove the element_gas rows.
+
+    Args:
+        rows (List[Dict[str, Any]]): The key value (under "key") and the new values of each row.
+        matches (Dict[Any, List[int]]): The IDs of the elements matched by each key value.
+        fields (List[str]): The updated gas fields.
+        row_version (int): The row version of the updated elements.
+
+    Returns:
+        None
+    """
+    ids = {element_id for row in rows for element_id in matches[row["key"]]}
+    statement = select(ElementData).where(ElementData.id.in_(ids)).options(selectinload(ElementData.gases))
+    elements = {element.id: element for element in session.scalars(statement)}
+    for row in rows:
+        for element_id in matches[row["key"]]:
+            for field in fields:
+                setattr(elements[element_id], field, row[field])
+            elements[element_id].row_version = row_version
+    session.flush()
+
+
+def _natural_key(row: Mapping[str, Any]) -> Tuple:
+    """
+    Build the natural key of an element as the unique index compares it, NULL line and post types being equal.
+
+    Args:
+        row (Mapping[str, Any]): The values of the element.
+
+    Returns:
+        Tuple: The identifiant_element, type_ligne and type_poste of the element.
+    """
+    return (row["identifiant_element"], row["type_ligne"] or "", row["type_poste"] or "")
+
+
+def _taken_natural_keys(rows: List[Dict[str, Any]]) -> Set[Tuple]:
+    """
+    Find the natural keys of new elements that are already used, including by soft-deleted elements.
+
+    Args:
+        rows (List[Dict[str, Any]]): The values of the new elements.
+
+    Returns:
+        Set[Tuple]: The natural keys of the existing elements sharing an identifiant_element with the rows.
+    """
+    identifiants = {row["identifiant_element"] for row in rows if row["identifiant_element"] is not None}
+    if not identifiants:
+        return set()
+    statement = select(*(ELEMENT_COLUMNS[name] for name in NATURAL_KEY)).where(
+        ElementData.identifiant_element.in_(identifiants)
+    )
+    return {_natural_key(row._mapping) for row in session.execute(statement)}
+
+
+class BatchChanges:
+    """
+    Search index updates of a batch operation, applied once its transaction is committed so that
+    a search running in between cannot index the previous values again. The response cache
+    follows the row versions written by the batch, see cached_response.
+
+    Attributes:
+        search_values (Dict[int, Optional[Dict[str, Optional[str]]]]): Searched values of the created
+            elements, None for the deleted elements.
+        reindex (bool): Whether searched fields were updated, the search index being rebuilt.
+    """
+
+    def __init__(self) -> None:
+        self.search_values: Dict[int, Optional[Dict[str, Optional[str]]]] = {}
+        self.reindex: bool = False
+
+    def apply(self) -> None:
+        """
+        Update the search index after the commit.
+
+        Returns:
+            None
+        """
+        state = get_state()
+        if self.reindex:
+            state.search_index.invalidate()
+        for element_id, searched in self.search_values.items():
+            if searched is None:
+                state.search_index.remove(element_id)
+            else:
+                state.search_index.update(element_id, searched)
+
+
+def _batch_create(items: List[Any], changes: BatchChanges) -> List[Dict[str, Any]]:
+    """
+    Insert the valid items of a batch with a single multi-row "INSERT ... RETURNING id".
+
+    Items whose natural key (identifiant_element, type_ligne and type_poste) is already used are rejected.
+
+    Args:
+        items (List[Any]): The elements to create.
+        changes (BatchChanges): Collects the cache invalidations of the batch.
+
+    Returns:
+        List[Dict[str, Any]]: The result of each item, with its status and the ID of the created element.
+    """
+    results: List[Dict[str, Any]] = []
+    rows: List[Dict[str, Any]] = []
+    positions: List[int] = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item:
+            results.append({"index": index, "status": 400, "error": "Invalid input"})
+            continue
+        invalid = _invalid_fields(item, WRITABLE_COLUMNS)
+        if invalid:
+            results.append({"index": index, "status": 400, "error": f"Unknown fields: {', '.join(invalid)}"})
+            continue
+        rows.append({name: item.get(name) for name in WRITABLE_COLUMNS})
+        positions.append(len(results))
+        results.append({"index": index, "status": 201})
+
+    taken = _taken_natural_keys(rows)
+    accepted = []
+    for position, row in zip(positions, rows):
+        if row["identifiant_element"] is not None:
+            key = _natural_key(row)
+            if key in taken:
+                results[position].update(status=409, error="An element with this natural key already exists")
+                continue
+            taken.add(key)
+        accepted.append((position, row))
+    positions = [position for position, _ in accepted]
+    rows = [row for _, row in accepted]
+
+    if rows:
+        version = next_row_version(session)
+        statement = insert(ElementData.__table__).returning(ElementData.id, sort_by_parameter_order=True)
+        parameters = [{**{name: row[name] for name in COLUMN_FIELDS}, "row_version": version} for row in rows]
+        ids = session.scalars(statement, parameters).all()
+        gases = [gas for element_id, row in zip(ids, rows) for gas in _gas_rows(element_id, row)]
+        if gases:
+            session.execute(insert(ElementGas.__table__), gases)
+        for position, element_id, row in zip(positions, ids, rows):
+            results[position]["id"] = element_id
+            changes.search_values[element_id] = {name: row[name] for name in SEARCH_COLUMNS}
+        refresh_rollups(session, {_rollup_key(row) for row in rows})
+    return results
+
+
+def _batch_update(items: List[Any], changes: BatchChanges) -> List[Dict[str, Any]]:
+    """
+    Apply the valid partial updates of a batch, grouped by key and updated columns into set-based updates.
+    Supplementary gases are updated through the ORM, as they are rows of element_gas.
+
+    Args:
+        items (List[Any]): The updates, each holding "id" or "identifiant_element" and the fields to change.
+        changes (BatchChanges): Collects the cache invalidations of the batch.
+
+    Returns:
+        List[Dict[str, Any]]: The result of each item, with its status and the IDs of the updated elements.
+    """
+    results: List[Dict[str, Any]] = []
+    groups: Dict[Tuple[str, Tuple[str, ...]], List[Tuple[int, Dict[str, Any]]]] = {}
+    for index, item in enumerate(items):
+        key = next((name for name in BATCH_KEYS if isinstance(item, dict) and item.get(name) is not None), None)
+        if key is None:
+            results.append({"index": index, "status": 400, "error": "Missing id or identifiant_element"})
+            continue
+        invalid = _invalid_fields(item, WRITABLE_COLUMNS + ("id",))
+        fields = tuple(name for name in WRITABLE_COLUMNS if name in item and name != key)
+        if invalid or not fields:
+            error = f"Unknown fields: {', '.join(invalid)}" if invalid else "No field to update"
+            results.append({"index": index, "status": 400, "error": error})
+            continue
+        groups.setdefault((key, fields), []).append((len(results), {"key": item[key], **{field: item[field] for field in fields}}))
+        results.append({"index": index, "status": 200})
+
+    search_fields = set(SEARCH_COLUMNS)
+    rollup_fields = set(ROLLUP_DIMENSIONS + ROLLUP_METRICS)
+    rollup_ids: Set[int] = set()
+    rollup_keys: Set[Tuple] = set()
+    version: Optional[int] = None
+    for (key, fields), group in groups.items():
+        key_column = ELEMENT_COLUMNS[key]
+        matches: Dict[Any, List[int]] = {}
+        for element_id, key_value in session.execute(
+            select(ElementData.id, key_column).where(key_column.in_({row["key"] for _, row in group}), LIVE_ELEMENTS)
+        ):
+            matches.setdefault(key_value, []).append(element_id)
+
+        rows = []
+        for position, row in group:
+            if row["key"] in matches:
+                results[position]["ids"] = matches[row["key"]]
+                rows.append(row)
+            else:
+                results[position].update(status=404, error="Element not found")
+        if not rows:
+            continue
+        if version is None:
+            version = next_row_version(session)
+        group_ids = {element_id for row in rows for element_id in matches[row["key"]]}
+        if rollup_fields.intersection(fields):
+            rollup_keys.update(_rollup_keys_of(group_ids))
+            rollup_ids.update(group_ids)
+        column_fields = tuple(field for field in fields if field not in GAS_FIELDS)
+        if column_fields:
+            statement, parameters = _update_statement(key, column_fields, rows, version)
+            session.execute(statement, parameters)
+        if len(column_fields) < len(fields):
+            _update_gases(rows, matches, [field for field in fields if field in GAS_FIELDS], version)
+        if search_fields.intersection(fields):
+            changes.reindex = True
+
+    if rollup_ids:
+        refresh_rollups(session, rollup_keys | _rollup_keys_of(rollup_ids))
+    return results
+
+
+def _batch_delete(items: List[Any], changes: BatchChanges) -> List[Dict[str, Any]]:
+    """
+    Delete the elements of a batch with a single "DELETE ... WHERE id = ANY(...)", leaving a tombstone
+    of each deleted element for the change feed.
+
+    Args:
+        items (List[Any]): The IDs of the elements to delete, as integers or as objects holding "id".
+        changes (BatchChanges): Collects the cache invalidations of the batch.
+
+    Returns:
+        List[Dict[str, Any]]: The result of each item, with its status.
+    """
+    results: List[Dict[str, Any]] = []
+    ids: List[int] = []
+    for index, item in enumerate(items):
+        element_id = item.get("id") if isinstance(item, dict) else item
+        if not isinstance(element_id, int) or isinstance(element_id, bool):
+            results.append({"index": index, "status": 400, "error": "Invalid id"})
+            continue
+        ids.append(element_id)
+        results.append({"index": index, "status": 200, "id": element_id})
+
+    if get_engine().dialect.name == "postgresql":
+        id_condition = ElementData.id == any_(bindparam("ids", ids, type_=ARRAY(Integer)))
+    else:
+        id_condition = ElementData.id.in_(ids)
+    deleted: Set[int] = set()
+    if ids:
+        version = next_row_version(session)
+        gas_table = ElementGas.__table__
+        session.execute(delete(gas_table).where(gas_table.c.element_id.in_(select(ElementData.id).where(id_condition, LIVE_ELEMENTS))))
+        statement = delete(ElementData.__table__).where(id_condition, LIVE_ELEMENTS).returning(ElementData.id, *_rollup_columns())
+        rows = session.execute(statement).all()
+        deleted = {row[0] for row in rows}
+        if deleted:
+            session.execute(insert(element_tombstone), [{"element_id": element_id, "row_version": version} for element_id in sorted(deleted)])
+        refresh_rollups(session, {tuple(row[1:]) for row in rows})
+    for result in results:
+        if result["status"] != 200:
+            continue
+        if result["id"] in deleted:
+            changes.search_values[result["id"]] = None
+        else:
+            result.update(status=404, error="Element not found")
+    return results
+
+
+# Batch operation of each HTTP method of /elements/batch
+BATCH_OPERATIONS: Dict[str, Callable[[List[Any], BatchChanges], List[Dict[str, Any]]]] = {
+    "POST": _batch_create,
+    "PATCH": _batch_update,
+    "DELETE": _batch_delete,
+}
+
+
+@api.route('/elements/batch', methods=['POST', 'PATCH', 'DELETE'])
+def batch_elements() -> Response:
+    """
+    Create (POST), partially update (PATCH) or delete (DELETE) many elements in a single transaction.
+
+    The body is a JSON array, or NDJSON with one item per line (Content-Type: application/x-ndjson):
+        POST: the elements to create, with the same fields as POST /elements.
+        PATCH: the fields to change, each item holding the "id" or the "identifiant_element"
+            of the elements to update.
+        DELETE: the IDs of the elements to delete, as integers or as objects holding "id".
+
+    Invalid items and items matching no element are reported and skipped, the others are applied.
+
+    Returns:
+        Response: A JSON object whose "results" list holds, for each item in order, its "index",
+            its HTTP-like "status" (200, 201, 400, 404 or 409), the "id" or "ids" of the affected
+            elements and an "error" message for failed items.
+
+    Raises:
+        400: If the body is not a JSON array or valid NDJSON.
+    """
+    items = _read_batch_items()
+    changes = BatchChanges()
+    state = get_state()
+    try:
+        results = BATCH_OPERATIONS[request.method](items, changes)
+        session.commit()
+    except Exception:
+        session.rollback()
+        state.search_index.invalidate()
+        state.response_cache.clear()
+        state.factor_snapshot.invalidate()
+        raise
+    changes.apply()
+    state.change_notifier.notify()
+    state.factor_snapshot.invalidate()
+    return jsonify({"results": results})
+
+
+@click.command("migrate")
+def migrate_command() -> None:
+    """
+    Create or upgrade the database schema, before the first load and after each upgrade of the API.
+
+    Returns:
+        None
+    """
+    # The loaders, and pandas, are only imported by this command
+    from export_database import migrate
+
+    migrate(get_engine())
+    click.echo("Database schema up to date")
+
+
+def create_app(config: Optional[Mapping[str, Any]] = None) -> Flask:
+    """
+    Create the API application. The database is only reached by the first request, and the schema
+    is created by the migrate command (flask --app wsgi migrate), never when the application starts.
+
+    Args:
+        config (Optional[Mapping[str, Any]]): Settings overriding those read from the environment,
+            e.g. DATABASE_URL.
+
+    Returns:
+        Flask: The application.
+    """
+    app = Flask(__name__)
+    app.config.update(
+        DATABASE_URL=DATABASE_URL,
+        DB_POOL_SIZE=DB_POOL_SIZE,
+        DB_MAX_OVERFLOW=DB_MAX_OVERFLOW,
+        DB_POOL_TIMEOUT=DB_POOL_TIMEOUT,
+        DB_POOL_PRE_PING=DB_POOL_PRE_PING,
+        DB_POOL_RECYCLE=DB_POOL_RECYCLE,
+        CACHE_MAX_ENTRIES=CACHE_MAX_ENTRIES,
+        CACHE_MAX_BYTES=CACHE_MAX_BYTES,
+        CACHE_TTL=CACHE_TTL,
+        SEARCH_INDEX_TTL=SEARCH_INDEX_TTL,
+        FACTOR_SNAPSHOT_TTL=FACTOR_SNAPSHOT_TTL,
+        EXPORT_CACHE_DIR=EXPORT_CACHE_DIR,
+        EXPORT_CACHE_TTL=EXPORT_CACHE_TTL,
+    )
+    if config:
+        app.config.update(config)
+    app.extensions[STATE_EXTENSION] = AppState(app.config)
+    app.register_blueprint(api)
+    app.teardown_appcontext(remove_session)
+    # Prometheus metrics served at /metrics
+    init_metrics(app)
+    app.cli.add_command(migrate_command)
+    return app
+
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
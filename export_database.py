@@ -1,153 +1,667 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, Text
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import (
+    create_engine, and_, delete, func, insert, inspect, literal, literal_column, select, text, update,
+    BigInteger, Enum, Float, Integer, MetaData, Table,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateIndex
 from sqlalchemy.orm import sessionmaker, Session as SessionType
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
+from cleaning import CleaningConfig, CleaningPlan, ColumnStatistics, clean_frame, emit_report
+from models import (
+    COLUMN_MAPPING, ELEMENT_FIELDS, GAS_FIELDS, NATURAL_KEY, NATURAL_KEY_ELEMENTS, ROLLUP_DIMENSIONS, SUPPLEMENTARY_GASES,
+    Base, ElementData, ElementGas, MonthDate, add_missing_columns, backfill_row_versions, create_indexes,
+    create_search_index, element_tombstone, natural_key_index, next_row_version, parse_month, refresh_rollups,
+)
+import io
+import logging
 import os
-from typing import Optional
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 DATABASE_USER: Optional[str] = os.getenv("DATABASE_USER")
 DATABASE_PASSWORD: Optional[str] = os.getenv("DATABASE_PASSWORD")
 HOST_NAME: Optional[str] = os.getenv("HOSTNAME")
-DATABASE_URL: str = f"postgresql://{DATABASE_USER}:{DATABASE_PASSWORD}@{HOST_NAME}:5432/ecoactdb"
-
-# Define the ORM mapping
-Base = declarative_base()
-
-class ElementData(Base):
-    """
-    Class SQLAlchemy ORM model for the ecoact elemenent data table.
-
-    Attributes:
-        id (Integer): Primary key, auto-incremented.
-        All other fields match the columns provided.
-    """
-
-    __tablename__: str = 'element_data'
-
-    id: int = Column(Integer, primary_key=True, autoincrement=True)
-    type_ligne: Optional[str] = Column(String)
-    identifiant_element: Optional[float] = Column(Float)
-    structure: Optional[str] = Column(String)
-    statut_element: Optional[str] = Column(String)
-    nom_base_francais: Optional[str] = Column(String)
-    nom_attribut_francais: Optional[str] = Column(String)
-    nom_frontiere_francais: Optional[str] = Column(String)
-    code_categorie: Optional[str] = Column(String)
-    tags_francais: Optional[str] = Column(String)
-    unite_francais: Optional[str] = Column(String)
-    contributeur: Optional[str] = Column(String)
-    programme: Optional[str] = Column(String)
-    url_programme: Optional[str] = Column(Text)
-    source: Optional[str] = Column(String)
-    localisation_geo: Optional[str] = Column(String)
-    sous_localisation_geo_francais: Optional[str] = Column(String)
-    date_creation: Optional[str] = Column(String)
-    date_modification: Optional[str] = Column(String)
-    periode_validite: Optional[str] = Column(String)
-    incertitude: Optional[str] = Column(String)
-    reglementations: Optional[str] = Column(String)
-    transparence: Optional[str] = Column(String)
-    qualite: Optional[str] = Column(String)
-    qualite_ter: Optional[str] = Column(String)
-    qualite_gr: Optional[str] = Column(String)
-    qualite_tir: Optional[str] = Column(String)
-    qualite_c: Optional[str] = Column(String)
-    qualite_p: Optional[str] = Column(String)
-    qualite_m: Optional[str] = Column(String)
-    commentaire_francais: Optional[str] = Column(String)
-    type_poste: Optional[str] = Column(String)
-    nom_poste_francais: Optional[str] = Column(String)
-    total_poste_non_decompose: Optional[float] = Column(Float)
-    co2f: Optional[float] = Column(Float)
-    ch4f: Optional[float] = Column(Float)
-    ch4b: Optional[float] = Column(Float)
-    n2o: Optional[float] = Column(Float)
-    code_gaz_supplementaire_1: Optional[str] = Column(String)
-    valeur_gaz_supplementaire_1: Optional[float] = Column(Float)
-    code_gaz_supplementaire_2: Optional[str] = Column(String)
-    valeur_gaz_supplementaire_2: Optional[float] = Column(Float)
-    code_gaz_supplementaire_3: Optional[str] = Column(String)
-    valeur_gaz_supplementaire_3: Optional[float] = Column(Float)
-    code_gaz_supplementaire_4: Optional[str] = Column(String)
-    valeur_gaz_supplementaire_4: Optional[float] = Column(Float)
-    code_gaz_supplementaire_5: Optional[str] = Column(String)
-    valeur_gaz_supplementaire_5: Optional[float] = Column(Float)
-    autres_ges: Optional[float] = Column(Float)
-    co2b: Optional[float] = Column(Float)
+DATABASE_URL: str = os.getenv("DATABASE_URL") or f"postgresql://{DATABASE_USER}:{DATABASE_PASSWORD}@{HOST_NAME}:5432/ecoactdb"
+
+
+def _convert_types(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts the values of a DataFrame to the types of the element_data columns, one vectorized pass per column:
+    months become dates, identifiants and quality scores nullable integers, and the enum columns are checked.
+
+    Args:
+        frame (pandas.DataFrame): DataFrame mapped to the element_data columns.
+
+    Returns:
+        pandas.DataFrame: A converted copy of the DataFrame.
+
+    Raises:
+        ValueError: If a date, an identifiant or a quality score is invalid, or an enum column holds an unknown value.
+    """
+    frame = frame.copy()
+    for column in ElementData.__table__.columns:
+        if column.name not in frame:
+            continue
+        values = frame[column.name]
+        if isinstance(column.type, MonthDate):
+            # Each distinct label is parsed once
+            frame[column.name] = values.map({label: parse_month(label) for label in values.dropna().unique()})
+        elif isinstance(column.type, Integer):
+            numbers = pd.to_numeric(values, errors="coerce")
+            # Blank cells are missing values, any other value that is not a number is an error
+            invalid = numbers.isna() & values.notna() & (values.astype(str).str.strip() != "")
+            if invalid.any():
+                raise ValueError(
+                    f"Invalid {column.name} values: {', '.join(sorted(map(str, values[invalid].unique())))}"
+                )
+            frame[column.name] = numbers.round().astype("Int64")
+        elif isinstance(column.type, Enum):
+            unknown = set(values.dropna().unique()) - set(column.type.enums)
+            if unknown:
+                raise ValueError(f"Unknown {column.name} values: {', '.join(sorted(map(str, unknown)))}")
+    return frame
+
+
+def _records(frame: pd.DataFrame) -> List[Dict]:
+    """
+    Converts the rows of a DataFrame to statement parameters, nulls becoming None.
+
+    Args:
+        frame (pandas.DataFrame): The rows.
+
+    Returns:
+        List[Dict]: One dictionary per row.
+    """
+    return frame.astype(object).where(frame.notna(), None).to_dict("records")
+
+
+def _gas_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Unpivots the supplementary gases of the rows of a DataFrame into one row per gas, as stored in element_gas.
+
+    Args:
+        frame (pandas.DataFrame): DataFrame holding the GAS_FIELDS columns.
+
+    Returns:
+        pandas.DataFrame: The "row" (index label of the row in the DataFrame), "position", "code" and "valeur"
+            of each gas having a code or a value.
+    """
+    parts = []
+    for position in range(1, SUPPLEMENTARY_GASES + 1):
+        gases = pd.DataFrame({
+            "row": frame.index,
+            "position": position,
+            "code": frame[f"code_gaz_supplementaire_{position}"].to_numpy(),
+            "valeur": pd.to_numeric(frame[f"valeur_gaz_supplementaire_{position}"], errors="coerce").to_numpy(),
+        })
+        parts.append(gases[gases["code"].notna() | gases["valeur"].notna()])
+    return pd.concat(parts, ignore_index=True)
+
+
+def _insert_gases(connection, frame: pd.DataFrame, ids: Iterable[int]) -> None:
+    """
+    Inserts the supplementary gases of rows written to element_data.
+
+    Args:
+        connection (sqlalchemy.engine.Connection): Connection with an open transaction.
+        frame (pandas.DataFrame): The written rows, holding the GAS_FIELDS columns.
+        ids (Iterable[int]): The ID of each row, in order.
+
+    Returns:
+        None
+    """
+    gases = _gas_frame(frame)
+    if gases.empty:
+        return
+    element_ids = pd.Series(list(ids), index=frame.index)
+    gases.insert(0, "element_id", element_ids.loc[gases.pop("row")].to_numpy())
+    connection.execute(insert(ElementGas.__table__), _records(gases))
+
+
+def _legacy_rename_statements(connection, legacy_name: str) -> List[str]:
+    """
+    Lists the statements renaming element_data out of the way of its new version, dropping its indexes
+    and, on PostgreSQL, renaming its primary key and sequence, whose names the new table reuses.
+
+    Args:
+        connection (sqlalchemy.engine.Connection): Connection with an open transaction.
+        legacy_name (str): The new name of the table.
+
+    Returns:
+        List[str]: The statements.
+
+    Raises:
+        NotImplementedError: If the database is neither PostgreSQL nor SQLite.
+    """
+    table_name = ElementData.__tablename__
+    parameters = {"table": table_name}
+    if connection.dialect.name == "postgresql":
+        indexes = connection.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = :table AND indexname NOT IN "
+            "(SELECT conname FROM pg_constraint WHERE conrelid = CAST(:table AS regclass))"
+        ), parameters).scalars().all()
+        primary_key = connection.execute(text(
+            "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:table AS regclass) AND contype = 'p'"
+        ), parameters).scalar()
+        sequence = connection.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), parameters).scalar()
+        statements = [f"DROP INDEX {index}" for index in indexes]
+        statements.append(f"ALTER TABLE {table_name} RENAME CONSTRAINT {primary_key} TO {legacy_name}_pkey")
+        if sequence:
+            statements.append(f"ALTER SEQUENCE {sequence} RENAME TO {legacy_name}_id_seq")
+    elif connection.dialect.name == "sqlite":
+        indexes = connection.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table AND sql IS NOT NULL"
+        ), parameters).scalars().all()
+        statements = [f"DROP INDEX {index}" for index in indexes]
+    else:
+        raise NotImplementedError(f"Schema migrations are not supported on {connection.dialect.name}")
+    statements.append(f"ALTER TABLE {table_name} RENAME TO {legacy_name}")
+    return statements
+
+
+def migrate_schema(bind: Engine, chunk_size: int = 10000) -> bool:
+    """
+    Migrates an element_data table created before the supplementary gases moved to element_gas and
+    the dates, identifiants, quality scores and categorical columns got their own types.
+
+    The table is rebuilt in a single transaction: it is renamed, created again with the current schema
+    and its rows are copied over in chunks, converted as the loaders convert the release and keeping
+    their IDs. Of rows sharing a natural key, which the unique index rejects, the one with the lowest
+    ID is kept. Content hashes are reset, so the next incremental load rewrites each row once.
+
+    Args:
+        bind (sqlalchemy.engine.Engine): Engine of the target database.
+        chunk_size (int): Number of rows copied at a time.
+
+    Returns:
+        bool: True if the table was migrated, False if it already had the current schema.
+
+    Raises:
+        ValueError: If a row holds a value the new types cannot hold, e.g. an unknown status,
+            in which case the table is left unchanged.
+    """
+    inspector = inspect(bind)
+    if not inspector.has_table(ElementData.__tablename__):
+        return False
+    existing = {column["name"] for column in inspector.get_columns(ElementData.__tablename__)}
+    if not existing.intersection(GAS_FIELDS):
+        return False
+
+    table = ElementData.__table__
+    legacy_name = f"{ElementData.__tablename__}_legacy"
+    start = time.perf_counter()
+    with bind.begin() as connection:
+        for statement in _legacy_rename_statements(connection, legacy_name):
+            connection.execute(text(statement))
+        Base.metadata.create_all(connection)
+        legacy = Table(legacy_name, MetaData(), autoload_with=connection)
+
+        first_ids = (
+            select(func.min(legacy.c.id))
+            .where(legacy.c.identifiant_element.is_not(None))
+            .group_by(
+                func.round(legacy.c.identifiant_element),
+                func.coalesce(legacy.c.type_ligne, literal_column("''")),
+                func.coalesce(legacy.c.type_poste, literal_column("''")),
+            )
+        )
+        duplicates = connection.execute(
+            delete(legacy).where(legacy.c.identifiant_element.is_not(None), legacy.c.id.not_in(first_ids.scalar_subquery()))
+        ).rowcount
+        if duplicates:
+            logger.warning("Deleted %d rows duplicating a natural key before migrating %s", duplicates, table.name)
+
+        names = [column.name for column in table.columns if column.name in legacy.c and column.name != "content_hash"]
+        names += [name for name in GAS_FIELDS if name in legacy.c]
+        result = connection.execute(
+            select(*(legacy.c[name] for name in names)).order_by(legacy.c.id).execution_options(yield_per=chunk_size)
+        )
+        copied = 0
+        for rows in result.partitions():
+            chunk = pd.DataFrame(rows, columns=names).reindex(columns=names + [name for name in GAS_FIELDS if name not in names])
+            chunk = _convert_types(chunk)
+            connection.execute(insert(table), _records(chunk.drop(columns=list(GAS_FIELDS))))
+            _insert_gases(connection, chunk, chunk["id"])
+            copied += len(chunk)
+
+        if connection.dialect.name == "postgresql":
+            connection.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), coalesce(max(id), 1), max(id) IS NOT NULL) FROM {table.name}"
+            ))
+        connection.execute(text(f"DROP TABLE {legacy_name}"))
+    logger.info("Migrated %d rows of %s in %.2fs", copied, table.name, time.perf_counter() - start)
+    return True
 
 # Create a database connection
 engine = create_engine(DATABASE_URL)
-Base.metadata.create_all(engine)
+
+
+def migrate(bind: Engine = engine) -> None:
+    """
+    Creates or upgrades the database schema: rebuilds a legacy element_data table, then creates the
+    missing tables, columns and indexes and the search index, and versions the rows written before
+    the change feed. Run by the migrate command of the API, before the first load.
+
+    Args:
+        bind (sqlalchemy.engine.Engine): Engine of the target database.
+
+    Returns:
+        None
+    """
+    migrate_schema(bind)
+    Base.metadata.create_all(bind)
+    add_missing_columns(bind)
+    create_indexes(bind)
+    create_search_index(bind)
+    backfill_row_versions(bind)
+
 
 # Create a session
 Session = sessionmaker(bind=engine)
 session: SessionType = Session()
 
+
 # Write data to the database
-def write_to_database(df: pd.DataFrame) -> None:
+def write_to_database(df: pd.DataFrame, cleaning: Optional[CleaningConfig] = None) -> None:
     """
     Writes data from a DataFrame to the database.
 
     Args:
         df (pandas.DataFrame): DataFrame containing the data to be written to the database.
+        cleaning (Optional[CleaningConfig]): Settings of the cleaning applied to the data before it is written,
+            None to write it as is, CleaningConfig.report_only() to only report its quality.
 
     Returns:
         None
     """
-    for _, row in df.iterrows():
-        element = ElementData(
-            type_ligne=row.get("Type Ligne"),
-            identifiant_element=row.get("Identifiant de l'élément"),
-            structure=row.get("Structure"),
-            statut_element=row.get("Statut de l'élément"),
-            nom_base_francais=row.get("Nom base français"),
-            nom_attribut_francais=row.get("Nom attribut français"),
-            nom_frontiere_francais=row.get("Nom frontière français"),
-            code_categorie=row.get("Code de la catégorie"),
-            tags_francais=row.get("Tags français"),
-            unite_francais=row.get("Unité français"),
-            contributeur=row.get("Contributeur"),
-            programme=row.get("Programme"),
-            url_programme=row.get("Url du programme"),
-            source=row.get("Source"),
-            localisation_geo=row.get("Localisation géographique"),
-            sous_localisation_geo_francais=row.get("Sous-localisation géographique français"),
-            date_creation=row.get("Date de création"),
-            date_modification=row.get("Date de modification"),
-            periode_validite=row.get("Période de validité"),
-            incertitude=row.get("Incertitude"),
-            reglementations=row.get("Réglementations"),
-            transparence=row.get("Transparence"),
-            qualite=row.get("Qualité"),
-            qualite_ter=row.get("Qualité TeR"),
-            qualite_gr=row.get("Qualité GR"),
-            qualite_tir=row.get("Qualité TiR"),
-            qualite_c=row.get("Qualité C"),
-            qualite_p=row.get("Qualité P"),
-            qualite_m=row.get("Qualité M"),
-            commentaire_francais=row.get("Commentaire français"),
-            type_poste=row.get("Type poste"),
-            nom_poste_francais=row.get("Nom poste français"),
-            total_poste_non_decompose=row.get("Total poste non décomposé"),
-            co2f=row.get("CO2f"),
-            ch4f=row.get("CH4f"),
-            ch4b=row.get("CH4b"),
-            n2o=row.get("N2O"),
-            code_gaz_supplementaire_1=row.get("Code gaz supplémentaire 1"),
-            valeur_gaz_supplementaire_1=row.get("Valeur gaz supplémentaire 1"),
-            code_gaz_supplementaire_2=row.get("Code gaz supplémentaire 2"),
-            valeur_gaz_supplementaire_2=row.get("Valeur gaz supplémentaire 2"),
-            code_gaz_supplementaire_3=row.get("Code gaz supplémentaire 3"),
-            valeur_gaz_supplementaire_3=row.get("Valeur gaz supplémentaire 3"),
-            code_gaz_supplementaire_4=row.get("Code gaz supplémentaire 4"),
-            valeur_gaz_supplementaire_4=row.get("Valeur gaz supplémentaire 4"),
-            code_gaz_supplementaire_5=row.get("Code gaz supplémentaire 5"),
-            valeur_gaz_supplementaire_5=row.get("Valeur gaz supplémentaire 5"),
-            autres_ges=row.get("Autres GES"),
-            co2b=row.get("CO2b"),
-        )
-        session.add(element)
+    frame = _to_table_frame(df)
+    if cleaning is not None:
+        frame = clean_frame(frame, cleaning)[0]
+    version = next_row_version(session)
+    for record in _records(frame):
+        session.add(ElementData(**record, row_version=version))
+    session.flush()
+    refresh_rollups(session)
     session.commit()
+
+
+def _to_table_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Maps the Excel headers of a DataFrame to the element fields and converts their values to the column types,
+    in vectorized steps.
+
+    Args:
+        df (pandas.DataFrame): DataFrame using the Base Carbone Excel headers.
+
+    Returns:
+        pandas.DataFrame: DataFrame with exactly the COLUMN_MAPPING fields (missing headers become nulls).
+
+    Raises:
+        ValueError: If a date, an identifiant or a quality score is invalid, or an enum column holds an unknown value.
+    """
+    return _convert_types(df.rename(columns=COLUMN_MAPPING).reindex(columns=list(COLUMN_MAPPING.values())))
+
+
+def _content_hashes(frame: pd.DataFrame) -> pd.Series:
+    """
+    Hashes the content of each row in a single vectorized pass.
+
+    Numeric fields are hashed as numbers and the others as strings, so that a row hashes the
+    same whichever dtypes pandas inferred when reading the file.
+
+    Args:
+        frame (pandas.DataFrame): DataFrame mapped to the element fields.
+
+    Returns:
+        pandas.Series: The signed 64-bit hash of each row.
+    """
+    normalized = pd.DataFrame({
+        name: (
+            pd.to_numeric(values, errors="coerce").astype("float64")
+            if isinstance(ELEMENT_FIELDS[name].type, (Float, Integer)) else values.astype("string")
+        )
+        for name, values in frame[list(COLUMN_MAPPING.values())].items()
+    })
+    hashes = pd.util.hash_pandas_object(normalized, index=False).to_numpy()
+    return pd.Series(hashes.view(np.int64), index=frame.index)
+
+
+def _natural_key_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Extracts the natural key of each row as the unique index compares it, NULL line and post types being empty strings.
+
+    Args:
+        frame (pandas.DataFrame): DataFrame holding the NATURAL_KEY columns.
+
+    Returns:
+        pandas.DataFrame: The NATURAL_KEY columns, with the same index.
+    """
+    keys = {"identifiant_element": pd.to_numeric(frame["identifiant_element"], errors="coerce")}
+    for name in NATURAL_KEY[1:]:
+        keys[name] = frame[name].astype(object).where(frame[name].notna(), "")
+    return pd.DataFrame(keys, index=frame.index)
+
+
+def _copy_chunk(connection, chunk: pd.DataFrame) -> None:
+    """
+    Streams a chunk into element_data with PostgreSQL COPY, and inserts its supplementary gases.
+
+    Args:
+        connection (sqlalchemy.engine.Connection): Connection with an open transaction.
+        chunk (pandas.DataFrame): Chunk of rows already mapped to the element fields.
+
+    Returns:
+        None
+    """
+    # The IDs are drawn from the sequence beforehand so that the gases can reference their rows
+    ids = connection.execute(
+        text(f"SELECT nextval(pg_get_serial_sequence('{ElementData.__tablename__}', 'id')) FROM generate_series(1, :count)"),
+        {"count": len(chunk)},
+    ).scalars().all()
+    elements = chunk.drop(columns=list(GAS_FIELDS))
+    elements.insert(0, "id", ids)
+    buffer = io.StringIO()
+    # Empty unquoted CSV fields are read back as NULL by COPY
+    elements.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    columns = ", ".join(elements.columns)
+    with connection.connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {ElementData.__tablename__} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+    _insert_gases(connection, chunk, ids)
+
+
+def _insert_chunk(connection, chunk: pd.DataFrame) -> None:
+    """
+    Inserts a chunk into element_data with a single batched executemany, and its supplementary gases.
+
+    Args:
+        connection (sqlalchemy.engine.Connection): Connection with an open transaction.
+        chunk (pandas.DataFrame): Chunk of rows already mapped to the element fields.
+
+    Returns:
+        None
+    """
+    statement = insert(ElementData.__table__).returning(ElementData.id, sort_by_parameter_order=True)
+    ids = connection.scalars(statement, _records(chunk.drop(columns=list(GAS_FIELDS)))).all()
+    _insert_gases(connection, chunk, ids)
+
+
+def collect_statistics(chunks: Iterable[pd.DataFrame]) -> ColumnStatistics:
+    """
+    Collects the column statistics of a stream of DataFrame chunks, as mapped to the element fields,
+    from which their cleaning is planned.
+
+    Args:
+        chunks (Iterable[pandas.DataFrame]): The chunks, using the Base Carbone Excel headers.
+
+    Returns:
+        ColumnStatistics: The statistics of all the chunks.
+    """
+    statistics = ColumnStatistics()
+    for chunk in chunks:
+        statistics.update(_to_table_frame(chunk))
+    return statistics
+
+
+def bulk_write_chunks(chunks: Iterable[pd.DataFrame], bind: Engine = engine, cleaning: Optional[CleaningPlan] = None) -> int:
+    """
+    Writes a stream of DataFrame chunks to the database in bulk, bypassing the ORM.
+
+    Each chunk is written with COPY on PostgreSQL and with a batched executemany on other
+    backends, and committed with its own row version, so that only one chunk is held in memory at a time. The rollups
+    are recomputed once all the chunks are written. Loading rows already in the table fails
+    on the natural key index, see incremental_write_to_database.
+
+    Args:
+        chunks (Iterable[pandas.DataFrame]): The chunks, using the Base Carbone Excel headers.
+        bind (sqlalchemy.engine.Engine): Engine of the target database.
+        cleaning (Optional[CleaningPlan]): Cleaning applied to each chunk before it is written, planned from
+            the statistics of all the chunks (see collect_statistics), None to write them as is.
+
+    Returns:
+        int: Number of rows written.
+    """
+    write_chunk = _copy_chunk if bind.dialect.name == "postgresql" else _insert_chunk
+
+    written = 0
+    start = time.perf_counter()
+    with bind.connect() as connection:
+        for chunk in chunks:
+            frame = _to_table_frame(chunk)
+            if cleaning is not None:
+                frame = cleaning.apply(frame)
+            frame["content_hash"] = _content_hashes(frame)
+            with connection.begin():
+                frame["row_version"] = next_row_version(connection)
+                write_chunk(connection, frame)
+            written += len(frame)
+            logger.debug("Wrote %d rows", written)
+        with connection.begin():
+            refresh_rollups(connection)
+
+    elapsed = time.perf_counter() - start
+    logger.info("Wrote %d rows in %.2fs (%.0f rows/sec)", written, elapsed, written / elapsed if elapsed else 0.0)
+    return written
+
+
+def bulk_write_to_database(
+    df: pd.DataFrame, chunk_size: int = 10000, bind: Engine = engine, cleaning: Optional[CleaningConfig] = None,
+) -> int:
+    """
+    Writes data from a DataFrame to the database in bulk, bypassing the ORM.
+
+    Rows are streamed in chunks with COPY on PostgreSQL and with a batched
+    executemany on other backends, committing after each chunk. The rollups
+    are recomputed once all the rows are written. Loading rows already in the
+    table fails on the natural key index, see incremental_write_to_database.
+
+    Args:
+        df (pandas.DataFrame): DataFrame containing the data to be written to the database.
+        chunk_size (int): Number of rows written and committed per chunk.
+        bind (sqlalchemy.engine.Engine): Engine of the target database.
+        cleaning (Optional[CleaningConfig]): Settings of the cleaning applied to the data before it is written,
+            None to write it as is, CleaningConfig.report_only() to only report its quality.
+
+    Returns:
+        int: Number of rows written.
+    """
+    chunks = [df.iloc[offset:offset + chunk_size] for offset in range(0, len(df), chunk_size)]
+    if cleaning is None:
+        return bulk_write_chunks(chunks, bind)
+    statistics = collect_statistics(chunks)
+    plan = statistics.plan(cleaning)
+    written = bulk_write_chunks(chunks, bind, plan)
+    emit_report(statistics, plan, cleaning)
+    return written
+
+
+# Insert construct of each backend supporting INSERT ... ON CONFLICT DO UPDATE
+UPSERT_INSERTS: Dict[str, Any] = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def _adopt_natural_key(connection, row_version: int) -> bool:
+    """
+    Creates the natural key index if it is missing, deleting first the duplicated rows left by
+    repeated full loads if any (the row with the lowest ID of each key is kept).
+
+    Args:
+        connection (sqlalchemy.engine.Connection): Connection with an open transaction.
+        row_version (int): Version of the tombstones of the deleted rows.
+
+    Returns:
+        bool: True if duplicated rows were deleted.
+    """
+    try:
+        with connection.begin_nested():
+            connection.execute(CreateIndex(natural_key_index, if_not_exists=True))
+        return False
+    except IntegrityError:
+        pass
+    table = ElementData.__table__
+    first_ids = select(func.min(table.c.id)).where(table.c.identifiant_element.is_not(None)).group_by(*NATURAL_KEY_ELEMENTS)
+    duplicated = and_(table.c.identifiant_element.is_not(None), table.c.id.not_in(first_ids.scalar_subquery()))
+    gas_table = ElementGas.__table__
+    connection.execute(delete(gas_table).where(gas_table.c.element_id.in_(select(table.c.id).where(duplicated))))
+    connection.execute(insert(element_tombstone).from_select(
+        ["element_id", "row_version"], select(table.c.id, literal(row_version, BigInteger)).where(duplicated),
+    ))
+    result = connection.execute(delete(table).where(duplicated))
+    connection.execute(CreateIndex(natural_key_index))
+    if result.rowcount:
+        logger.warning("Deleted %d duplicated rows before creating %s", result.rowcount, natural_key_index.name)
+    return result.rowcount > 0
+
+
+def _replace_gases(connection, frame: pd.DataFrame, keys: pd.DataFrame, chunk_size: int) -> None:
+    """
+    Replaces the supplementary gases of upserted rows, whose IDs are found back from their natural key.
+
+    Args:
+        connection (sqlalchemy.engine.Connection): Connection with an open transaction.
+        frame (pandas.DataFrame): The upserted rows, holding the GAS_FIELDS columns.
+        keys (pandas.DataFrame): The natural key of each row, as built by _natural_key_frame.
+        chunk_size (int): Number of rows looked up per statement.
+
+    Returns:
+        None
+    """
+    table = ElementData.__table__
+    gas_table = ElementGas.__table__
+    identifiants = keys["identifiant_element"].astype(np.int64).unique().tolist()
+    rows = []
+    for offset in range(0, len(identifiants), chunk_size):
+        rows += connection.execute(
+            select(table.c.id, *(table.c[name] for name in NATURAL_KEY))
+            .where(table.c.identifiant_element.in_(identifiants[offset:offset + chunk_size]))
+        ).all()
+    stored = pd.DataFrame(rows, columns=["id", *NATURAL_KEY])
+    stored_keys = _natural_key_frame(stored).assign(id=stored["id"])
+    ids = keys.reset_index(drop=True).merge(stored_keys, on=list(NATURAL_KEY), how="left")["id"].astype(np.int64).tolist()
+    for offset in range(0, len(ids), chunk_size):
+        connection.execute(delete(gas_table).where(gas_table.c.element_id.in_(ids[offset:offset + chunk_size])))
+    _insert_gases(connection, frame, ids)
+
+
+def incremental_write_to_database(
+    df: pd.DataFrame, chunk_size: int = 10000, bind: Engine = engine, cleaning: Optional[CleaningConfig] = None,
+) -> Dict[str, int]:
+    """
+    Applies a Base Carbone release to the database, writing only the rows that changed since the previous load.
+
+    Rows are matched on their natural key (identifiant_element, type_ligne, type_poste) and their
+    content hash is compared with the stored one. New and changed rows are written with
+    INSERT ... ON CONFLICT DO UPDATE and their supplementary gases replaced, the rows missing from the
+    release are soft-deleted (deleted_at is set) and unchanged rows are not touched, so that loading
+    the same release twice writes nothing.
+    The release is applied in a single transaction, along with the rollups of the touched rows, and
+    the written rows share one row version.
+
+    Args:
+        df (pandas.DataFrame): DataFrame containing the whole release, with the Base Carbone Excel headers.
+        chunk_size (int): Number of rows written per statement.
+        bind (sqlalchemy.engine.Engine): Engine of the target database.
+        cleaning (Optional[CleaningConfig]): Settings of the cleaning applied to the release before it is
+            compared with the table, None to apply it as is, CleaningConfig.report_only() to only report its
+            quality. The natural key must stay protected.
+
+    Returns:
+        Dict[str, int]: The number of "inserted", "updated", "deleted" and "unchanged" rows.
+
+    Raises:
+        NotImplementedError: If the database does not support ON CONFLICT DO UPDATE.
+    """
+    if bind.dialect.name not in UPSERT_INSERTS:
+        raise NotImplementedError(f"Incremental loads are not supported on {bind.dialect.name}")
+    table = ElementData.__table__
+
+    frame = _to_table_frame(df)
+    keys = _natural_key_frame(frame)
+    missing = keys["identifiant_element"].isna()
+    duplicated = keys.duplicated(keep="last") & ~missing
+    if missing.any() or duplicated.any():
+        logger.warning(
+            "Skipped %d rows without identifiant_element and %d rows whose key appears again later",
+            int(missing.sum()), int(duplicated.sum()),
+        )
+    frame = frame[~missing & ~duplicated].reset_index(drop=True)
+    keys = keys[~missing & ~duplicated].reset_index(drop=True)
+    if cleaning is not None:
+        frame = clean_frame(frame, cleaning)[0]
+    frame["content_hash"] = _content_hashes(frame)
+
+    start = time.perf_counter()
+    with bind.begin() as connection:
+        version = next_row_version(connection)
+        deduplicated = _adopt_natural_key(connection, version)
+
+        names = list(dict.fromkeys(("id", *NATURAL_KEY, "content_hash", "deleted_at", *ROLLUP_DIMENSIONS)))
+        rows = connection.execute(
+            select(*(table.c[name] for name in names)).where(table.c.identifiant_element.is_not(None))
+        ).all()
+        stored = pd.DataFrame(rows, columns=names)
+        # Built apart so that NULL hashes do not turn the 64-bit hashes into floats
+        stored["content_hash"] = pd.array([row.content_hash for row in rows], dtype="Int64")
+        live = stored["deleted_at"].isna().to_numpy()
+
+        merged = keys.rename_axis("position").reset_index().merge(
+            _natural_key_frame(stored).rename_axis("stored_position").reset_index(),
+            on=list(NATURAL_KEY),
+            how="outer",
+            indicator=True,
+        )
+        matched = merged[merged["_merge"] == "both"]
+        positions = matched["position"].to_numpy(dtype=np.int64)
+        stored_positions = matched["stored_position"].to_numpy(dtype=np.int64)
+        differs = stored["content_hash"].array[stored_positions] != frame["content_hash"].to_numpy()[positions]
+        changed = differs.fillna(True).to_numpy(dtype=bool) | ~live[stored_positions]
+        new_positions = merged.loc[merged["_merge"] == "left_only", "position"].to_numpy(dtype=np.int64)
+        gone = merged.loc[merged["_merge"] == "right_only", "stored_position"].to_numpy(dtype=np.int64)
+        gone = gone[live[gone]]
+
+        insert_statement = UPSERT_INSERTS[bind.dialect.name](table)
+        element_columns = [name for name in (*COLUMN_MAPPING.values(), "content_hash") if name not in GAS_FIELDS]
+        statement = insert_statement.on_conflict_do_update(
+            index_elements=NATURAL_KEY_ELEMENTS,
+            set_={name: insert_statement.excluded[name] for name in (*element_columns, "deleted_at", "row_version")},
+        )
+        change_positions = np.sort(np.concatenate([new_positions, positions[changed]]))
+        changes = frame.iloc[change_positions]
+        for offset in range(0, len(changes), chunk_size):
+            chunk = changes.iloc[offset:offset + chunk_size]
+            connection.execute(
+                statement, [{**record, "deleted_at": None, "row_version": version} for record in _records(chunk[element_columns])],
+            )
+        _replace_gases(connection, changes, keys.iloc[change_positions], chunk_size)
+
+        gone_ids = stored["id"].to_numpy()[gone].tolist()
+        for offset in range(0, len(gone_ids), chunk_size):
+            connection.execute(
+                update(table).where(table.c.id.in_(gone_ids[offset:offset + chunk_size])).values(deleted_at=func.now(), row_version=version)
+            )
+
+        if deduplicated:
+            refresh_rollups(connection)
+        else:
+            # Rollups of the previous values of the changed and deleted rows, and of the new values
+            touched = pd.concat([
+                stored.iloc[np.concatenate([stored_positions[changed], gone])][list(ROLLUP_DIMENSIONS)],
+                changes[list(ROLLUP_DIMENSIONS)],
+            ])
+            refresh_rollups(connection, touched.astype(object).where(touched.notna(), None).itertuples(index=False, name=None))
+
+    counts = {
+        "inserted": len(new_positions),
+        "updated": int(changed.sum()),
+        "deleted": len(gone_ids),
+        "unchanged": len(positions) - int(changed.sum()),
+    }
+    logger.info("Applied release in %.2fs: %s", time.perf_counter() - start, counts)
+    return counts
@@ -0,0 +1,188 @@
+import threading
+import time
+from typing import Callable, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Emission factor columns of the breakdown, total first, followed by the sum of the supplementary gases
+FACTOR_COLUMNS: Tuple[str, ...] = ("total_poste_non_decompose", "co2f", "ch4f", "ch4b", "n2o", "co2b", "autres_ges")
+SUPPLEMENTARY_GAS_COLUMNS: Tuple[str, ...] = tuple(f"valeur_gaz_supplementaire_{number}" for number in range(1, 6))
+BREAKDOWN: Tuple[str, ...] = FACTOR_COLUMNS + ("gaz_supplementaires",)
+
+# Line type holding the total of an element, preferred when looking a factor up by identifiant_element
+ELEMENT_LINE_TYPE: str = "Elément"
+
+
+class FactorSnapshot:
+    """
+    In-memory columnar copy of the emission factors, laid out for vectorized lookups.
+
+    Attributes:
+        ids (np.ndarray): Sorted element IDs.
+        factors (np.ndarray): Factor matrix, one row per ID and one column per BREAKDOWN entry
+            (missing values are 0).
+        identifiants (np.ndarray): Sorted identifiant_element values.
+        identifiant_rows (np.ndarray): Row of the factor matrix of each identifiant_element, its
+            "Elément" line if any, else its line with the lowest ID.
+    """
+
+    def __init__(self, ids: np.ndarray, factors: np.ndarray, identifiants: np.ndarray, identifiant_rows: np.ndarray) -> None:
+        self.ids = ids
+        self.factors = factors
+        self.identifiants = identifiants
+        self.identifiant_rows = identifiant_rows
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence]) -> "FactorSnapshot":
+        """
+        Build a snapshot from element rows.
+
+        Args:
+            rows (Iterable[Sequence]): Rows holding the ID, identifiant_element, type_ligne, the
+                FACTOR_COLUMNS and the SUPPLEMENTARY_GAS_COLUMNS, in this order.
+
+        Returns:
+            FactorSnapshot: The snapshot.
+        """
+        columns = list(zip(*rows)) or [()] * (3 + len(FACTOR_COLUMNS) + len(SUPPLEMENTARY_GAS_COLUMNS))
+        ids = np.array(columns[0], dtype=np.int64)
+        identifiants = np.array(columns[1], dtype=np.float64)
+        is_element = np.array(columns[2], dtype=object) == ELEMENT_LINE_TYPE
+        # None becomes NaN when converted to floats
+        values = np.array(columns[3:], dtype=np.float64).reshape(len(columns) - 3, len(ids)).T
+        values = np.nan_to_num(values, nan=0.0)
+        factors = np.column_stack([values[:, :len(FACTOR_COLUMNS)], values[:, len(FACTOR_COLUMNS):].sum(axis=1)])
+
+        order = np.argsort(ids, kind="stable")
+        ids, identifiants, is_element, factors = ids[order], identifiants[order], is_element[order], factors[order]
+
+        # Sort the rows by identifiant, "Elément" lines first, then keep the first row of each identifiant
+        known = np.flatnonzero(~np.isnan(identifiants))
+        by_identifiant = known[np.lexsort((~is_element[known], identifiants[known]))]
+        sorted_identifiants = identifiants[by_identifiant]
+        first = np.ones(len(by_identifiant), dtype=bool)
+        first[1:] = sorted_identifiants[1:] != sorted_identifiants[:-1]
+        return cls(ids, factors, sorted_identifiants[first], by_identifiant[first])
+
+    def _rows_of(self, keys: np.ndarray, sorted_keys: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """
+        Find the factor rows of lookup keys with a binary search.
+
+        Args:
+            keys (np.ndarray): The keys to look up.
+            sorted_keys (np.ndarray): The sorted keys of the snapshot.
+            rows (Optional[np.ndarray]): The factor row of each sorted key, None if it is its position.
+
+        Returns:
+            np.ndarray: The factor row of each key, -1 for unknown keys.
+        """
+        if not len(sorted_keys):
+            return np.full(len(keys), -1, dtype=np.int64)
+        positions = np.searchsorted(sorted_keys, keys).clip(max=len(sorted_keys) - 1)
+        found = sorted_keys[positions] == keys
+        matched = positions if rows is None else rows[positions]
+        return np.where(found, matched, -1)
+
+    def rows_of_ids(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Find the factor rows of element IDs.
+
+        Args:
+            ids (np.ndarray): The element IDs.
+
+        Returns:
+            np.ndarray: The factor row of each ID, -1 for unknown IDs.
+        """
+        return self._rows_of(np.asarray(ids, dtype=np.int64), self.ids, None)
+
+    def rows_of_identifiants(self, identifiants: np.ndarray) -> np.ndarray:
+        """
+        Find the factor rows of identifiant_element values.
+
+        Args:
+            identifiants (np.ndarray): The identifiant_element values.
+
+        Returns:
+            np.ndarray: The factor row of each identifiant, -1 for unknown identifiants.
+        """
+        return self._rows_of(np.asarray(identifiants, dtype=np.float64), self.identifiants, self.identifiant_rows)
+
+
+class Footprint:
+    """
+    Result of a footprint calculation.
+
+    Attributes:
+        lines (np.ndarray): Emissions of each activity line, one column per BREAKDOWN entry (0 for unknown factors).
+        totals (np.ndarray): Emissions summed over the lines, one value per BREAKDOWN entry.
+        unknown (np.ndarray): Indexes of the lines whose factor was not found.
+    """
+
+    def __init__(self, lines: np.ndarray, totals: np.ndarray, unknown: np.ndarray) -> None:
+        self.lines = lines
+        self.totals = totals
+        self.unknown = unknown
+
+
+def compute_footprint(snapshot: FactorSnapshot, rows: np.ndarray, quantities: np.ndarray) -> Footprint:
+    """
+    Multiply activity quantities by their emission factors, for all the lines at once.
+
+    Args:
+        snapshot (FactorSnapshot): The emission factors.
+        rows (np.ndarray): Factor row of each activity line, as given by FactorSnapshot.rows_of_ids
+            or FactorSnapshot.rows_of_identifiants (-1 for unknown factors).
+        quantities (np.ndarray): Quantity of each activity line, in the unit of its factor.
+
+    Returns:
+        Footprint: The emissions of each line and their totals.
+    """
+    quantities = np.asarray(quantities, dtype=np.float64)
+    found = rows >= 0
+    lines = np.zeros((len(rows), len(BREAKDOWN)), dtype=np.float64)
+    lines[found] = snapshot.factors[rows[found]] * quantities[found, None]
+    return Footprint(lines, lines.sum(axis=0), np.flatnonzero(~found))
+
+
+class SnapshotCache:
+    """
+    Lazily built, thread-safe holder of the factor snapshot.
+
+    The snapshot is built from the table on first use, dropped by the API writes
+    and rebuilt after "ttl" seconds to pick up writes made by other processes.
+
+    Attributes:
+        ttl (float): Number of seconds after which the snapshot is rebuilt from the table.
+    """
+
+    def __init__(self, ttl: float = 300.0) -> None:
+        self.ttl = ttl
+        self._snapshot: Optional[FactorSnapshot] = None
+        self._built_at: float = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, rows: Callable[[], Iterable[Sequence]]) -> FactorSnapshot:
+        """
+        Return the snapshot, building it if it is missing or expired.
+
+        Args:
+            rows (Callable[[], Iterable[Sequence]]): Callable returning the rows expected by FactorSnapshot.from_rows.
+
+        Returns:
+            FactorSnapshot: The snapshot.
+        """
+        with self._lock:
+            if self._snapshot is None or time.monotonic() - self._built_at > self.ttl:
+                self._snapshot = FactorSnapshot.from_rows(rows())
+                self._built_at = time.monotonic()
+            return self._snapshot
+
+    def invalidate(self) -> None:
+        """
+        Drop the snapshot so that it is rebuilt on next use.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._snapshot = None
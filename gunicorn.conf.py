@@ -0,0 +1,67 @@
+"""
+Gunicorn settings for serving the API in production (gunicorn -c gunicorn.conf.py wsgi:app).
+
+Every setting can be overridden through the environment (or the .env file).
+Each worker process has its own connection pool, so the database must accept
+about WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections.
+"""
+from dotenv import load_dotenv
+import multiprocessing
+import os
+
+# Load environment variables
+load_dotenv()
+
+bind: str = os.getenv("BIND", "0.0.0.0:8000")
+# Worker processes, each serving requests from a pool of threads
+workers: int = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count() * 2 + 1)))
+worker_class: str = "gthread"
+threads: int = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout: int = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+keepalive: int = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Restart workers periodically to bound the growth of their in-process caches
+max_requests: int = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter: int = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+preload_app: bool = os.getenv("GUNICORN_PRELOAD", "false").lower() in ("1", "true", "yes")
+accesslog: str = "-"
+
+
+def post_fork(server, worker) -> None:
+    """
+    Drop the connections inherited from the master process when the app is preloaded and has
+    already connected, so that workers never share a database connection, and give each worker
+    its own caches (export files are named after their cache instance).
+
+    Args:
+        server (gunicorn.arbiter.Arbiter): The gunicorn master.
+        worker (gunicorn.workers.base.Worker): The forked worker.
+
+    Returns:
+        None
+    """
+    if server.cfg.preload_app:
+        from ecoact_api import ENGINE_EXTENSION, STATE_EXTENSION, AppState
+        from wsgi import app
+
+        engine = app.extensions.get(ENGINE_EXTENSION)
+        if engine is not None:
+            engine.dispose(close=False)
+        app.extensions[STATE_EXTENSION] = AppState(app.config)
+
+
+def child_exit(server, worker) -> None:
+    """
+    Drop the live metrics of an exited worker (e.g. its in-flight requests) from /metrics
+    when the metrics of the workers are aggregated through PROMETHEUS_MULTIPROC_DIR.
+
+    Args:
+        server (gunicorn.arbiter.Arbiter): The gunicorn master.
+        worker (gunicorn.workers.base.Worker): The exited worker.
+
+    Returns:
+        None
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,320 @@
+import argparse
+import hashlib
+import logging
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import AbstractSet, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import load_workbook
+
+from cleaning import CleaningConfig, emit_report
+
+logger = logging.getLogger(__name__)
+
+# Sheet of the Base Carbone workbook holding the elements
+DEFAULT_SHEET: str = "Sheet1"
+DEFAULT_CHUNK_SIZE: int = 10000
+# Parsed copies of the workbooks are kept in PARSED_CACHE_DIR, keyed by the hash of the workbook
+PARSED_CACHE_DIR: str = os.getenv("PARSED_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "ecoact-parsed")
+# Bumped when the parsing changes, so that copies parsed by a previous version are not reused
+PARSER_VERSION: int = 1
+HASH_BLOCK_SIZE: int = 1024 * 1024
+
+
+def workbook_hash(path: str) -> str:
+    """
+    Hash the content of a workbook, reading it by blocks.
+
+    Args:
+        path (str): The path of the workbook.
+
+    Returns:
+        str: The hexadecimal BLAKE2b digest of the file.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def sheet_schema(headers: Sequence[str], numeric_headers: AbstractSet[str]) -> pa.Schema:
+    """
+    Build the Arrow schema of a sheet: numeric columns as floats and the others as strings, so that
+    every chunk of the sheet has the same schema whatever the values it holds.
+
+    Args:
+        headers (Sequence[str]): The headers of the sheet.
+        numeric_headers (AbstractSet[str]): The headers of the numeric columns.
+
+    Returns:
+        pa.Schema: The schema.
+    """
+    return pa.schema([pa.field(header, pa.float64() if header in numeric_headers else pa.string()) for header in headers])
+
+
+def _chunk_table(headers: List[str], rows: List[Tuple], schema: pa.Schema) -> pa.Table:
+    """
+    Convert rows of a sheet to an Arrow table of the sheet schema.
+
+    Args:
+        headers (List[str]): The headers of the sheet.
+        rows (List[Tuple]): The cell values of each row.
+        schema (pa.Schema): The schema of the sheet.
+
+    Returns:
+        pa.Table: The rows.
+    """
+    frame = pd.DataFrame.from_records(rows, columns=headers)
+    columns = {}
+    for field in schema:
+        values = frame[field.name]
+        if pa.types.is_floating(field.type):
+            columns[field.name] = pd.to_numeric(values, errors="coerce")
+        else:
+            columns[field.name] = values.astype("string")
+    return pa.Table.from_pandas(pd.DataFrame(columns), schema=schema, preserve_index=False)
+
+
+def iter_sheet_chunks(
+    path: str,
+    sheet: str = DEFAULT_SHEET,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    numeric_headers: AbstractSet[str] = frozenset(),
+) -> Iterator[pa.Table]:
+    """
+    Stream the rows of a sheet in read-only mode, in chunks of at most "chunk_size" rows.
+
+    The first row holds the headers. Empty rows are skipped.
+
+    Args:
+        path (str): The path of the workbook.
+        sheet (str): The name of the sheet.
+        chunk_size (int): The number of rows of each chunk.
+        numeric_headers (AbstractSet[str]): The headers of the columns converted to floats.
+
+    Yields:
+        pa.Table: The chunks of rows, all with the schema of the sheet.
+
+    Raises:
+        KeyError: If the workbook has no such sheet.
+    """
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet].iter_rows(values_only=True)
+        headers = [str(header) if header is not None else f"Unnamed: {index}" for index, header in enumerate(next(rows, ()))]
+        schema = sheet_schema(headers, numeric_headers)
+        width = len(headers)
+        batch: List[Tuple] = []
+        chunks = 0
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            # Rows of read-only sheets may be shorter or longer than the header row
+            batch.append(tuple(row[:width]) + (None,) * (width - len(row)))
+            if len(batch) == chunk_size:
+                yield _chunk_table(headers, batch, schema)
+                batch = []
+                chunks += 1
+        # A sheet without rows still yields an empty chunk holding its schema
+        if batch or not chunks:
+            yield _chunk_table(headers, batch, schema)
+    finally:
+        workbook.close()
+
+
+def parse_workbook(
+    path: str,
+    sheet: str = DEFAULT_SHEET,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    numeric_headers: AbstractSet[str] = frozenset(),
+    cache_dir: str = PARSED_CACHE_DIR,
+) -> str:
+    """
+    Parse a sheet into a Parquet copy, unless the workbook was already parsed.
+
+    The copy is keyed by the hash of the workbook, the sheet and the numeric headers, so that
+    re-importing an unchanged file skips the parsing. Run in the worker processes of ingest.
+
+    Args:
+        path (str): The path of the workbook.
+        sheet (str): The name of the sheet.
+        chunk_size (int): The number of rows parsed and written at a time.
+        numeric_headers (AbstractSet[str]): The headers of the columns converted to floats.
+        cache_dir (str): The directory of the parsed copies.
+
+    Returns:
+        str: The path of the Parquet copy.
+    """
+    key = repr((PARSER_VERSION, workbook_hash(path), sheet, sorted(numeric_headers)))
+    destination = os.path.join(cache_dir, f"{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}.parquet")
+    if os.path.exists(destination):
+        logger.info("Reusing the parsed copy of %s (%s)", path, sheet)
+        return destination
+
+    os.makedirs(cache_dir, exist_ok=True)
+    start = time.perf_counter()
+    temporary = f"{destination}.{uuid.uuid4().hex}.tmp"
+    writer: Optional[pq.ParquetWriter] = None
+    parsed = 0
+    try:
+        for table in iter_sheet_chunks(path, sheet, chunk_size, numeric_headers):
+            if writer is None:
+                writer = pq.ParquetWriter(temporary, table.schema)
+            writer.write_table(table)
+            parsed += table.num_rows
+        writer.close()
+        os.replace(temporary, destination)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    logger.info("Parsed %d rows of %s (%s) in %.2fs", parsed, path, sheet, time.perf_counter() - start)
+    return destination
+
+
+def iter_parsed_chunks(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Read a parsed copy back in chunks.
+
+    Args:
+        path (str): The path of the Parquet copy.
+        chunk_size (int): The number of rows of each chunk.
+
+    Yields:
+        pd.DataFrame: The chunks of rows, with the headers of the sheet.
+    """
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        yield batch.to_pandas()
+
+
+def _completed_chunks(futures: Iterable["Future[str]"], chunk_size: int) -> Iterator[pd.DataFrame]:
+    """
+    Read the parsed copies in the order of the sources, each as soon as it is parsed.
+
+    Args:
+        futures (Iterable[Future[str]]): The parsing of each source, returning its parsed copy.
+        chunk_size (int): The number of rows of each chunk.
+
+    Yields:
+        pd.DataFrame: The chunks of rows of all the sources.
+    """
+    for future in futures:
+        yield from iter_parsed_chunks(future.result(), chunk_size)
+
+
+def ingest(
+    sources: Sequence[Tuple[str, str]],
+    mode: str = "bulk",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: Optional[int] = None,
+    cache_dir: str = PARSED_CACHE_DIR,
+    cleaning: Optional[CleaningConfig] = None,
+) -> Dict[str, int]:
+    """
+    Load sheets of Base Carbone workbooks into the database.
+
+    The sheets are parsed in a process pool while the rows of the sheets already parsed are written,
+    one chunk at a time.
+
+    Args:
+        sources (Sequence[Tuple[str, str]]): The path of the workbook and the name of the sheet of each source.
+        mode (str): "bulk" to append the rows with bulk_write_chunks, or "incremental" to apply them as
+            a release with incremental_write_to_database, which needs all the rows in memory to find
+            the deleted ones.
+        chunk_size (int): The number of rows parsed and written at a time.
+        workers (Optional[int]): The number of parsing processes, one per CPU by default.
+        cache_dir (str): The directory of the parsed copies.
+        cleaning (Optional[CleaningConfig]): Settings of the cleaning applied to the rows before they are written,
+            None to write them as is. In bulk mode the statistics of all the sheets are collected in a first
+            pass over the parsed copies, before any row is written.
+
+    Returns:
+        Dict[str, int]: The number of "written" rows in bulk mode, the counts of
+            incremental_write_to_database in incremental mode.
+
+    Raises:
+        ValueError: If the mode is unknown.
+    """
+    if mode not in ("bulk", "incremental"):
+        raise ValueError(f"Unknown ingestion mode: {mode}")
+    from sqlalchemy import Float, Integer
+
+    from export_database import (
+        COLUMN_MAPPING, ELEMENT_FIELDS, bulk_write_chunks, collect_statistics, incremental_write_to_database,
+    )
+
+    numeric_headers = frozenset(
+        header for header, name in COLUMN_MAPPING.items() if isinstance(ELEMENT_FIELDS[name].type, (Float, Integer))
+    )
+    with ProcessPoolExecutor(max_workers=max(1, min(workers or os.cpu_count() or 1, len(sources)))) as pool:
+        futures = [
+            pool.submit(parse_workbook, path, sheet, chunk_size, numeric_headers, cache_dir) for path, sheet in sources
+        ]
+        chunks = _completed_chunks(futures, chunk_size)
+        if mode == "incremental":
+            return incremental_write_to_database(pd.concat(list(chunks), ignore_index=True), chunk_size, cleaning=cleaning)
+        if cleaning is None:
+            return {"written": bulk_write_chunks(chunks)}
+        paths = [future.result() for future in futures]
+        statistics = collect_statistics(chunk for path in paths for chunk in iter_parsed_chunks(path, chunk_size))
+        plan = statistics.plan(cleaning)
+        written = bulk_write_chunks((chunk for path in paths for chunk in iter_parsed_chunks(path, chunk_size)), cleaning=plan)
+        emit_report(statistics, plan, cleaning)
+        return {"written": written}
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    """
+    Load Base Carbone workbooks from the command line.
+
+    Args:
+        arguments (Optional[List[str]]): The command line arguments, those of the process by default.
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(description="Load Base Carbone workbooks into the database.")
+    parser.add_argument("workbooks", nargs="+", help="Paths of the xlsx files")
+    parser.add_argument(
+        "--sheet", action="append", dest="sheets",
+        help=f"Sheet to load from each workbook, repeat to load several ({DEFAULT_SHEET} by default)",
+    )
+    parser.add_argument(
+        "--mode", choices=("bulk", "incremental"), default="incremental",
+        help="Append the rows, or apply them as a release writing only the changes (default)",
+    )
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Number of rows parsed and written at a time")
+    parser.add_argument("--workers", type=int, help="Number of parsing processes, one per CPU by default")
+    parser.add_argument("--cache-dir", default=PARSED_CACHE_DIR, help="Directory of the parsed copies of the workbooks")
+    parser.add_argument(
+        "--clean", action="store_true",
+        help="Write the data-quality report of the rows, without changing them",
+    )
+    parser.add_argument(
+        "--clean-values", action="store_true",
+        help=(
+            "Also drop the mostly empty columns, impute the missing values and clip the outliers before writing; "
+            "the natural key, emissions, gases, unit and names are never changed"
+        ),
+    )
+    options = parser.parse_args(arguments)
+
+    sources = [(path, sheet) for path in options.workbooks for sheet in options.sheets or [DEFAULT_SHEET]]
+    cleaning = None
+    if options.clean_values:
+        cleaning = CleaningConfig()
+    elif options.clean:
+        cleaning = CleaningConfig.report_only()
+    counts = ingest(sources, options.mode, options.chunk_size, options.workers, options.cache_dir, cleaning)
+    logger.info("Loaded %s: %s", ", ".join(options.workbooks), counts)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
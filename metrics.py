@@ -0,0 +1,226 @@
+import logging
+import os
+import time
+from typing import Any, Optional
+
+from flask import Flask, Response, g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Statements running longer than SLOW_QUERY_MS milliseconds are logged
+SLOW_QUERY_SECONDS: float = float(os.getenv("SLOW_QUERY_MS", "500")) / 1000
+# Server-Timing is returned when the request carries this header, or always if SERVER_TIMING is set
+SERVER_TIMING_REQUEST_HEADER: str = "X-Server-Timing"
+SERVER_TIMING: bool = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+# Longest statement text written to the slow query log
+SLOW_QUERY_LOG_LENGTH: int = 1000
+
+REQUEST_SECONDS = Histogram(
+    "ecoact_http_request_duration_seconds", "Duration of the HTTP requests", ["method", "route", "status"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "ecoact_http_requests_in_flight", "Number of HTTP requests being served", ["route"], multiprocess_mode="livesum",
+)
+REQUEST_DB_QUERIES = Histogram(
+    "ecoact_http_request_db_queries", "Number of SQL statements run per HTTP request", ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 200),
+)
+REQUEST_DB_SECONDS = Histogram(
+    "ecoact_http_request_db_duration_seconds", "Time spent running SQL statements per HTTP request", ["route"],
+)
+REQUEST_SERIALIZE_SECONDS = Histogram(
+    "ecoact_http_request_serialize_duration_seconds", "Time spent encoding JSON per HTTP request", ["route"],
+)
+SLOW_QUERIES = Counter("ecoact_db_slow_queries_total", "Number of SQL statements slower than SLOW_QUERY_MS", ["route"])
+POOL_CHECKED_OUT = Gauge(
+    "ecoact_db_pool_checked_out_connections", "Number of connections checked out of the pool", multiprocess_mode="livesum",
+)
+POOL_CHECKOUTS = Counter("ecoact_db_pool_checkouts_total", "Number of connection checkouts from the pool")
+POOL_CONNECTIONS = Counter("ecoact_db_pool_connections_opened_total", "Number of database connections opened by the pool")
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider adding the time spent encoding to the serialization time of the request.
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        """
+        Serialize data as JSON, timing the encoding.
+
+        Args:
+            obj (Any): The data to serialize.
+            **kwargs (Any): Arguments of json.dumps.
+
+        Returns:
+            str: The JSON text.
+        """
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            if has_request_context():
+                g.serialize_seconds = g.get("serialize_seconds", 0.0) + time.perf_counter() - start
+
+
+def _route() -> str:
+    """
+    Name the route of the request by its URL rule, so that the metrics are not labeled per element.
+
+    Returns:
+        str: The URL rule of the request, e.g. "/elements/<int:id>", or "unmatched".
+    """
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+def _start_request() -> None:
+    """
+    Start timing a request and counting its SQL statements.
+
+    Returns:
+        None
+    """
+    g.request_start = time.perf_counter()
+    g.db_queries = 0
+    g.db_seconds = 0.0
+    g.serialize_seconds = 0.0
+    g.metrics_route = _route()
+    REQUESTS_IN_FLIGHT.labels(g.metrics_route).inc()
+
+
+def _finish_request(response: Response) -> Response:
+    """
+    Add the Server-Timing header of a request if requested, and record its metrics once the
+    response is sent.
+
+    The metrics are recorded when the server closes the response, so that streamed responses
+    (e.g. NDJSON) are measured up to their last byte, along with the statements run while
+    streaming. The Server-Timing header is sent before the body, so it covers the request up
+    to its first byte.
+
+    Args:
+        response (Response): The response of the request.
+
+    Returns:
+        Response: The response.
+    """
+    start: Optional[float] = g.get("request_start")
+    if start is None:
+        return response
+    method = request.method
+    route = g.metrics_route
+    status = str(response.status_code)
+    # The globals outlive the request context, which is popped before a plain response is closed
+    request_globals = g._get_current_object()
+
+    def record() -> None:
+        REQUEST_SECONDS.labels(method, route, status).observe(time.perf_counter() - start)
+        REQUEST_DB_QUERIES.labels(route).observe(request_globals.db_queries)
+        REQUEST_DB_SECONDS.labels(route).observe(request_globals.db_seconds)
+        REQUEST_SERIALIZE_SECONDS.labels(route).observe(request_globals.serialize_seconds)
+
+    response.call_on_close(record)
+    if SERVER_TIMING or request.headers.get(SERVER_TIMING_REQUEST_HEADER):
+        response.headers["Server-Timing"] = ", ".join([
+            f'db;dur={g.db_seconds * 1000:.1f};desc="{g.db_queries} queries"',
+            f"serialize;dur={g.serialize_seconds * 1000:.1f}",
+            f"total;dur={(time.perf_counter() - start) * 1000:.1f}",
+        ])
+    return response
+
+
+def _end_request(exception: Optional[BaseException] = None) -> None:
+    """
+    Count the request out of the in-flight requests, whether or not it failed.
+
+    Args:
+        exception (Optional[BaseException]): The exception that ended the request, if any.
+
+    Returns:
+        None
+    """
+    route = g.pop("metrics_route", None)
+    if route is not None:
+        REQUESTS_IN_FLIGHT.labels(route).dec()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Time the SQL statements and follow the connection pool through engine and pool events.
+
+    Args:
+        engine (Engine): The engine of the API, instrumented when it is created.
+
+    Returns:
+        None
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query(connection, cursor, statement, parameters, context, executemany) -> None:
+        context.query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def finish_query(connection, cursor, statement, parameters, context, executemany) -> None:
+        elapsed = time.perf_counter() - context.query_start
+        route = None
+        if has_request_context() and "db_queries" in g:
+            g.db_queries += 1
+            g.db_seconds += elapsed
+            route = g.metrics_route
+        if elapsed >= SLOW_QUERY_SECONDS:
+            SLOW_QUERIES.labels(route or "none").inc()
+            logger.warning(
+                "Slow query (%.0f ms) on %s: %s", elapsed * 1000, route or "no request", statement[:SLOW_QUERY_LOG_LENGTH],
+            )
+
+    @event.listens_for(engine.pool, "connect")
+    def count_connection(dbapi_connection, connection_record) -> None:
+        POOL_CONNECTIONS.inc()
+
+    @event.listens_for(engine.pool, "checkout")
+    def check_out(dbapi_connection, connection_record, connection_proxy) -> None:
+        POOL_CHECKOUTS.inc()
+        POOL_CHECKED_OUT.inc()
+
+    @event.listens_for(engine.pool, "checkin")
+    def check_in(dbapi_connection, connection_record) -> None:
+        POOL_CHECKED_OUT.dec()
+
+
+def metrics_response() -> Response:
+    """
+    Expose the metrics in the Prometheus text format, aggregated over the gunicorn workers
+    when PROMETHEUS_MULTIPROC_DIR is set.
+
+    Returns:
+        Response: The metrics.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+
+def init_metrics(app: Flask) -> None:
+    """
+    Collect the request metrics of the API and serve them at /metrics. The SQL and connection pool
+    metrics are collected once the engine of the application is created, see instrument_engine.
+
+    Args:
+        app (Flask): The application.
+
+    Returns:
+        None
+    """
+    app.json = TimedJSONProvider(app)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
+    app.add_url_rule("/metrics", "metrics", metrics_response)
@@ -0,0 +1,676 @@
+import datetime
+import logging
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import (
+    and_, delete, func, insert, inspect, literal_column, or_, select, text,
+    BigInteger, Column, Date, DateTime, Enum, ForeignKey, Index, Integer, SmallInteger, String, Float, Table, Text,
+)
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import relationship
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.types import TypeDecorator
+
+logger = logging.getLogger(__name__)
+
+# Define the ORM mapping
+Base = declarative_base()
+
+# Values of the enum-backed categorical columns
+TYPES_LIGNE: Tuple[str, ...] = ("Elément", "Poste")
+STATUTS_ELEMENT: Tuple[str, ...] = ("Valide générique", "Valide spécifique", "Archivé")
+# Enums are stored as strings checked by a constraint: PostgreSQL cannot index the coalesced
+# natural key of a native enum, its cast to text not being immutable
+ENUM_OPTIONS: Dict[str, Any] = {"native_enum": False, "create_constraint": True, "validate_strings": True}
+# Months of the Base Carbone dates, e.g. "Octobre 2014"
+MONTHS: Tuple[str, ...] = (
+    "Janvier", "Février", "Mars", "Avril", "Mai", "Juin",
+    "Juillet", "Août", "Septembre", "Octobre", "Novembre", "Décembre",
+)
+MONTH_NUMBERS: Dict[str, int] = {month.lower(): number for number, month in enumerate(MONTHS, start=1)}
+# Number of supplementary gases of a Base Carbone row, stored in element_gas
+SUPPLEMENTARY_GASES: int = 5
+
+
+def parse_month(value: Any) -> Optional[datetime.date]:
+    """
+    Parses a Base Carbone date, given as a month such as "Octobre 2014" or as an ISO date.
+
+    Args:
+        value (Any): The date, as a string, a date or a datetime; None, NaN or an empty string for no date.
+
+    Returns:
+        Optional[datetime.date]: The date, the first day of the month for a month.
+
+    Raises:
+        ValueError: If the value is not a date.
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    label = str(value).strip()
+    if not label:
+        return None
+    month, _, year = label.partition(" ")
+    if month.lower() in MONTH_NUMBERS and year.strip().isdigit():
+        return datetime.date(int(year), MONTH_NUMBERS[month.lower()], 1)
+    try:
+        return datetime.date.fromisoformat(label[:10])
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}") from None
+
+
+def format_month(value: Optional[datetime.date]) -> Optional[str]:
+    """
+    Formats a date as the month labels of the Base Carbone.
+
+    Args:
+        value (Optional[datetime.date]): The date.
+
+    Returns:
+        Optional[str]: The month of the date, e.g. "Octobre 2014", or None.
+    """
+    return f"{MONTHS[value.month - 1]} {value.year}" if value is not None else None
+
+
+class MonthDate(TypeDecorator):
+    """
+    DATE column read and written as the months of the Base Carbone, e.g. "Octobre 2014" for 2014-10-01,
+    so that the API keeps the labels of the release while the database compares and indexes real dates.
+    Months, ISO dates and dates are accepted as values.
+    """
+
+    impl = Date
+    cache_ok = True
+
+    def process_bind_param(self, value: Any, dialect: Any) -> Optional[datetime.date]:
+        return parse_month(value)
+
+    def process_result_value(self, value: Optional[datetime.date], dialect: Any) -> Optional[str]:
+        return format_month(value)
+
+    @property
+    def python_type(self) -> type:
+        return str
+
+
+def _gas_attribute(position: int, field: str) -> hybrid_property:
+    """
+    Builds the attribute exposing a field of a supplementary gas under its former element_data column name,
+    e.g. code_gaz_supplementaire_1: the gas row on instances and a correlated subquery on the class.
+
+    Args:
+        position (int): The number of the gas, from 1 to SUPPLEMENTARY_GASES.
+        field (str): The element_gas column, "code" or "valeur".
+
+    Returns:
+        hybrid_property: The attribute.
+    """
+    name = f"{field}_gaz_supplementaire_{position}"
+
+    def _gas(element: "ElementData") -> Optional["ElementGas"]:
+        return next((gas for gas in element.gases if gas.position == position), None)
+
+    def getter(element: "ElementData") -> Any:
+        gas = _gas(element)
+        return getattr(gas, field) if gas is not None else None
+
+    def setter(element: "ElementData", value: Any) -> None:
+        gas = _gas(element)
+        if gas is None:
+            if value is None:
+                return
+            gas = ElementGas(position=position)
+            element.gases.append(gas)
+        setattr(gas, field, value)
+        # A gas without code nor value is removed
+        if gas.code is None and gas.valeur is None:
+            element.gases.remove(gas)
+
+    def expression(cls: type) -> Any:
+        gas_table = ElementGas.__table__
+        return (
+            select(gas_table.c[field])
+            .where(gas_table.c.element_id == cls.id, gas_table.c.position == position)
+            .scalar_subquery()
+            .label(name)
+        )
+
+    return hybrid_property(getter, setter, expr=expression)
+
+
+class ElementData(Base):
+    """
+    Class SQLAlchemy ORM model for the ecoact elemenent data table.
+
+    Attributes:
+        id (Integer): Primary key, auto-incremented.
+        gases (List[ElementGas]): The supplementary gases of the element, exposed as the
+            code_gaz_supplementaire_<N> and valeur_gaz_supplementaire_<N> attributes.
+        All other fields match the columns provided.
+    """
+
+    __tablename__: str = 'element_data'
+    __table_args__ = (
+        # B-tree indexes backing the API filters. text_pattern_ops lets PostgreSQL
+        # serve prefix LIKE on code_categorie from the index whatever the collation.
+        Index("ix_element_data_code_categorie", "code_categorie", postgresql_ops={"code_categorie": "text_pattern_ops"}),
+        Index("ix_element_data_localisation_geo", "localisation_geo"),
+        Index("ix_element_data_sous_localisation_geo_francais", "sous_localisation_geo_francais"),
+        Index("ix_element_data_statut_element", "statut_element"),
+        Index("ix_element_data_type_ligne", "type_ligne"),
+        Index("ix_element_data_type_poste", "type_poste"),
+        Index("ix_element_data_unite_francais", "unite_francais"),
+        Index("ix_element_data_contributeur", "contributeur"),
+        # Date range filters
+        Index("ix_element_data_date_creation", "date_creation"),
+        Index("ix_element_data_date_modification", "date_modification"),
+        Index("ix_element_data_periode_validite", "periode_validite"),
+        # Composite index for "factors with status S in location L under category prefix C":
+        # equality columns first, then the prefix-matched category as the range column
+        Index(
+            "ix_element_data_statut_localisation_categorie",
+            "statut_element", "localisation_geo", "code_categorie",
+            postgresql_ops={"code_categorie": "text_pattern_ops"},
+        ),
+        # Keyset index of the change feed, which pages through the rows by version
+        Index("ix_element_data_row_version", "row_version", "id"),
+    )
+
+    id: int = Column(Integer, primary_key=True, autoincrement=True)
+    type_ligne: Optional[str] = Column(Enum(*TYPES_LIGNE, name="element_type_ligne", **ENUM_OPTIONS))
+    identifiant_element: Optional[int] = Column(Integer)
+    structure: Optional[str] = Column(String)
+    statut_element: Optional[str] = Column(Enum(*STATUTS_ELEMENT, name="element_statut", **ENUM_OPTIONS))
+    nom_base_francais: Optional[str] = Column(String)
+    nom_attribut_francais: Optional[str] = Column(String)
+    nom_frontiere_francais: Optional[str] = Column(String)
+    code_categorie: Optional[str] = Column(String)
+    tags_francais: Optional[str] = Column(String)
+    unite_francais: Optional[str] = Column(String)
+    contributeur: Optional[str] = Column(String)
+    programme: Optional[str] = Column(String)
+    url_programme: Optional[str] = Column(Text)
+    source: Optional[str] = Column(String)
+    localisation_geo: Optional[str] = Column(String)
+    sous_localisation_geo_francais: Optional[str] = Column(String)
+    date_creation: Optional[str] = Column(MonthDate)
+    date_modification: Optional[str] = Column(MonthDate)
+    periode_validite: Optional[str] = Column(MonthDate)
+    incertitude: Optional[str] = Column(String)
+    reglementations: Optional[str] = Column(String)
+    transparence: Optional[str] = Column(String)
+    qualite: Optional[str] = Column(String)
+    qualite_ter: Optional[int] = Column(SmallInteger)
+    qualite_gr: Optional[int] = Column(SmallInteger)
+    qualite_tir: Optional[int] = Column(SmallInteger)
+    qualite_c: Optional[int] = Column(SmallInteger)
+    qualite_p: Optional[int] = Column(SmallInteger)
+    qualite_m: Optional[int] = Column(SmallInteger)
+    commentaire_francais: Optional[str] = Column(String)
+    type_poste: Optional[str] = Column(String)
+    nom_poste_francais: Optional[str] = Column(String)
+    total_poste_non_decompose: Optional[float] = Column(Float)
+    co2f: Optional[float] = Column(Float)
+    ch4f: Optional[float] = Column(Float)
+    ch4b: Optional[float] = Column(Float)
+    n2o: Optional[float] = Column(Float)
+    code_gaz_supplementaire_1: Optional[str] = _gas_attribute(1, "code")
+    valeur_gaz_supplementaire_1: Optional[float] = _gas_attribute(1, "valeur")
+    code_gaz_supplementaire_2: Optional[str] = _gas_attribute(2, "code")
+    valeur_gaz_supplementaire_2: Optional[float] = _gas_attribute(2, "valeur")
+    code_gaz_supplementaire_3: Optional[str] = _gas_attribute(3, "code")
+    valeur_gaz_supplementaire_3: Optional[float] = _gas_attribute(3, "valeur")
+    code_gaz_supplementaire_4: Optional[str] = _gas_attribute(4, "code")
+    valeur_gaz_supplementaire_4: Optional[float] = _gas_attribute(4, "valeur")
+    code_gaz_supplementaire_5: Optional[str] = _gas_attribute(5, "code")
+    valeur_gaz_supplementaire_5: Optional[float] = _gas_attribute(5, "valeur")
+    autres_ges: Optional[float] = Column(Float)
+    co2b: Optional[float] = Column(Float)
+    # Hash of the loaded content, compared by the incremental loader to skip unchanged rows
+    content_hash: Optional[int] = Column(BigInteger)
+    # Set by the incremental loader when a row is no longer in the loaded release
+    deleted_at: Optional[datetime.datetime] = Column(DateTime)
+    # Version of the last write of the row, allocated by next_row_version, which the change feed follows
+    row_version: Optional[int] = Column(BigInteger)
+
+    gases = relationship("ElementGas", order_by="ElementGas.position", cascade="all, delete-orphan")
+
+
+class ElementGas(Base):
+    """
+    Class SQLAlchemy ORM model for the supplementary gases of the elements, one row per gas.
+
+    Attributes:
+        element_id (Integer): ID of the element, the gases being deleted along with it.
+        position (SmallInteger): Number of the gas in the Base Carbone row, from 1 to SUPPLEMENTARY_GASES.
+        code (String): Code of the gas, indexed to find the factors emitting a gas.
+        valeur (Float): Emission factor of the gas.
+    """
+
+    __tablename__: str = 'element_gas'
+
+    element_id: int = Column(Integer, ForeignKey("element_data.id", ondelete="CASCADE"), primary_key=True)
+    position: int = Column(SmallInteger, primary_key=True)
+    code: Optional[str] = Column(String, index=True)
+    valeur: Optional[float] = Column(Float)
+
+
+# API fields stored in element_gas, under the names of the former element_data columns
+GAS_FIELDS: Tuple[str, ...] = tuple(
+    f"{field}_gaz_supplementaire_{position}" for position in range(1, SUPPLEMENTARY_GASES + 1) for field in ("code", "valeur")
+)
+
+
+# Natural key of the Base Carbone rows, on which the incremental loader upserts. NULL line and post
+# types are coalesced so that they compare equal; rows without identifiant never conflict.
+NATURAL_KEY: Tuple[str, ...] = ("identifiant_element", "type_ligne", "type_poste")
+NATURAL_KEY_ELEMENTS: List[Any] = [
+    ElementData.identifiant_element,
+    func.coalesce(ElementData.type_ligne, literal_column("''")),
+    func.coalesce(ElementData.type_poste, literal_column("''")),
+]
+natural_key_index = Index("ux_element_data_natural_key", *NATURAL_KEY_ELEMENTS, unique=True)
+# Condition excluding the elements soft-deleted by the incremental loader
+LIVE_ELEMENTS: Any = ElementData.deleted_at.is_(None)
+# Columns managed by the loaders rather than by the API clients
+INTERNAL_COLUMNS: Tuple[str, ...] = ("content_hash", "deleted_at", "row_version")
+
+# Hard-deleted elements, kept so that the change feed can report their deletion
+element_tombstone = Table(
+    "element_tombstone",
+    Base.metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("element_id", Integer, nullable=False),
+    Column("row_version", BigInteger, nullable=False),
+    Column("deleted_at", DateTime, nullable=False, server_default=func.now()),
+    Index("ix_element_tombstone_row_version", "row_version", "element_id"),
+)
+
+# Single-row counter from which the row versions are allocated
+element_version = Table(
+    "element_version",
+    Base.metadata,
+    Column("id", Integer, primary_key=True, autoincrement=False),
+    Column("version", BigInteger, nullable=False),
+)
+VERSION_COUNTER_ID: int = 1
+
+
+def next_row_version(connection: Any) -> int:
+    """
+    Allocates the row version of a write transaction.
+
+    The counter row stays locked until the transaction ends, so that the transactions writing
+    versions commit in version order: a client that read every change up to version V never
+    misses a change committed later with a version lower than V. Allocate the version before
+    writing any element so that concurrent writers queue on the counter rather than deadlock.
+
+    Args:
+        connection (Any): Connection or session with an open transaction.
+
+    Returns:
+        int: The version, greater than all the versions allocated before.
+    """
+    table = element_version
+    version = connection.execute(
+        table.update().where(table.c.id == VERSION_COUNTER_ID).values(version=table.c.version + 1).returning(table.c.version)
+    ).scalar()
+    if version is None:
+        connection.execute(insert(table).values(id=VERSION_COUNTER_ID, version=1))
+        version = 1
+    return version
+
+
+def lock_row_versions(connection: Any) -> None:
+    """
+    Locks the row version counter until the transaction ends, without allocating a version,
+    so that the transaction is serialized with the writers.
+
+    Args:
+        connection (Any): Connection or session with an open transaction.
+
+    Returns:
+        None
+    """
+    table = element_version
+    locked = connection.execute(
+        table.update().where(table.c.id == VERSION_COUNTER_ID).values(version=table.c.version)
+    ).rowcount
+    if not locked:
+        next_row_version(connection)
+
+
+def current_row_version(connection: Any) -> int:
+    """
+    Reads the last allocated row version.
+
+    Args:
+        connection (Any): Connection or session.
+
+    Returns:
+        int: The version, 0 if none was allocated.
+    """
+    version = connection.execute(
+        select(element_version.c.version).where(element_version.c.id == VERSION_COUNTER_ID)
+    ).scalar()
+    return version or 0
+
+
+# Dimensions of the element_rollup table, and the emission columns it aggregates
+ROLLUP_DIMENSIONS: Tuple[str, ...] = (
+    "code_categorie", "localisation_geo", "type_poste", "contributeur", "statut_element", "type_ligne",
+)
+ROLLUP_METRICS: Tuple[str, ...] = ("total_poste_non_decompose", "co2f", "ch4f", "ch4b", "n2o", "co2b", "autres_ges")
+# Category levels stored in element_rollup: "A > B > C" is "A" at level 1 and "A > B" at level 2
+CATEGORY_SEPARATOR: str = " > "
+CATEGORY_LEVELS: int = 4
+
+# Materialized rollup of element_data: one row per combination of dimensions, with the
+# row count and the sum, non-null count, min and max of each emission column
+element_rollup = Table(
+    "element_rollup",
+    Base.metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    *(Column(name, String) for name in ROLLUP_DIMENSIONS),
+    *(Column(f"categorie_niveau_{level}", String, index=True) for level in range(1, CATEGORY_LEVELS + 1)),
+    Column("nombre", Integer, nullable=False),
+    *(
+        Column(f"{metric}_{statistic}", Integer if statistic == "nombre" else Float)
+        for metric in ROLLUP_METRICS
+        for statistic in ("somme", "nombre", "min", "max")
+    ),
+    Index("ix_element_rollup_dimensions", *ROLLUP_DIMENSIONS),
+)
+
+
+def _category_levels(code_categorie: Optional[str]) -> Dict[str, Optional[str]]:
+    """
+    Splits a category code into its levels, a category shallower than a level keeping its full code at that level.
+
+    Args:
+        code_categorie (Optional[str]): The category code, e.g. "Combustibles > Combustibles fossiles > Gaz".
+
+    Returns:
+        Dict[str, Optional[str]]: The category prefix of each "categorie_niveau_<level>" column.
+    """
+    parts = code_categorie.split(CATEGORY_SEPARATOR) if code_categorie else []
+    return {
+        f"categorie_niveau_{level}": CATEGORY_SEPARATOR.join(parts[:level]) if parts else None
+        for level in range(1, CATEGORY_LEVELS + 1)
+    }
+
+
+def _matching_keys(columns: List[Column], keys: List[Tuple]) -> Any:
+    """
+    Builds the condition matching rows on any of several dimension keys, NULL matching NULL.
+
+    Args:
+        columns (List[Column]): The dimension columns.
+        keys (List[Tuple]): The dimension values, in the order of the columns.
+
+    Returns:
+        Any: The SQL condition, written with "=" and "IS NULL" so that it can use the indexes.
+    """
+    return or_(*(
+        and_(*(column.is_(None) if value is None else column == value for column, value in zip(columns, key)))
+        for key in keys
+    ))
+
+
+def refresh_rollups(connection: Any, keys: Optional[Iterable[Tuple]] = None, chunk_size: int = 500) -> int:
+    """
+    Recomputes element_rollup from element_data, entirely or only for the given dimension keys.
+
+    The refresh runs in the transaction of the connection, so that it commits along with the write it follows.
+    It locks the row version counter first: the rollup table has no unique key, so concurrent refreshes of the
+    same dimensions must be serialized not to both insert their rows.
+
+    Args:
+        connection (Any): SQLAlchemy Connection or Session to run the refresh on.
+        keys (Optional[Iterable[Tuple]]): The dimension values (in ROLLUP_DIMENSIONS order) whose rollup
+            rows must be recomputed, e.g. those of the rows just written. Everything is recomputed if None.
+        chunk_size (int): Number of keys recomputed per statement.
+
+    Returns:
+        int: Number of rollup rows written.
+    """
+    lock_row_versions(connection)
+    table = ElementData.__table__
+    dimensions = [table.c[name] for name in ROLLUP_DIMENSIONS]
+    aggregates = [func.count().label("nombre")]
+    for metric in ROLLUP_METRICS:
+        column = table.c[metric]
+        aggregates += [
+            func.sum(column).label(f"{metric}_somme"),
+            func.count(column).label(f"{metric}_nombre"),
+            func.min(column).label(f"{metric}_min"),
+            func.max(column).label(f"{metric}_max"),
+        ]
+    statement = select(*dimensions, *aggregates).where(table.c.deleted_at.is_(None)).group_by(*dimensions)
+
+    if keys is None:
+        connection.execute(delete(element_rollup))
+        batches = [statement]
+    else:
+        keys = list(set(keys))
+        rollup_dimensions = [element_rollup.c[name] for name in ROLLUP_DIMENSIONS]
+        batches = []
+        for offset in range(0, len(keys), chunk_size):
+            chunk = keys[offset:offset + chunk_size]
+            connection.execute(delete(element_rollup).where(_matching_keys(rollup_dimensions, chunk)))
+            batches.append(statement.where(_matching_keys(dimensions, chunk)))
+
+    written = 0
+    for batch in batches:
+        rows = [{**row, **_category_levels(row["code_categorie"])} for row in connection.execute(batch).mappings()]
+        if rows:
+            connection.execute(insert(element_rollup), rows)
+        written += len(rows)
+    return written
+
+
+def add_missing_columns(bind: Engine) -> None:
+    """
+    Adds the element_data columns that are missing, e.g. on a table created before they were declared.
+
+    Args:
+        bind (sqlalchemy.engine.Engine): Engine of the target database.
+
+    Returns:
+        None
+    """
+    existing = {column["name"] for column in inspect(bind).get_columns(ElementData.__tablename__)}
+    with bind.begin() as connection:
+        for column in ElementData.__table__.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(bind.dialect)
+                connection.execute(text(f"ALTER TABLE {ElementData.__tablename__} ADD COLUMN {column.name} {column_type}"))
+
+
+def backfill_row_versions(bind: Engine) -> int:
+    """
+    Gives a row version to the element_data rows written before the change feed, all of them
+    sharing one version, so that a client syncing from version 0 receives them.
+
+    Args:
+        bind (sqlalchemy.engine.Engine): Engine of the target database.
+
+    Returns:
+        int: The number of rows given a version.
+    """
+    table = ElementData.__table__
+    with bind.begin() as connection:
+        if connection.execute(select(table.c.id).where(table.c.row_version.is_(None)).limit(1)).first() is None:
+            return 0
+        version = next_row_version(connection)
+        result = connection.execute(table.update().where(table.c.row_version.is_(None)).values(row_version=version))
+    logger.info("Gave version %d to %d rows", version, result.rowcount)
+    return result.rowcount
+
+
+def create_indexes(bind: Engine) -> None:
+    """
+    Creates the element_data indexes that are missing, e.g. on a table created before they were declared.
+
+    The natural key index cannot be created while the table holds duplicated rows, e.g. a release
+    loaded twice; it is then created by the first incremental load, which removes the duplicates.
+
+    Args:
+        bind (sqlalchemy.engine.Engine): Engine of the target database.
+
+    Returns:
+        None
+    """
+    for index in ElementData.__table__.indexes:
+        try:
+            # IF NOT EXISTS rather than reflection, which misses expression indexes on some backends
+            with bind.begin() as connection:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+        except IntegrityError as error:
+            logger.warning("Index %s not created: %s", index.name, error.orig)
+
+
+# PostgreSQL full-text search over the element names and tags: a tsvector column
+# maintained by a trigger with French stemming and accent folding, and a trigram
+# index on the same text for typo-tolerant matching. Each statement is idempotent.
+SEARCH_INDEX_DDL: List[str] = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'french_unaccent') THEN
+            CREATE TEXT SEARCH CONFIGURATION french_unaccent (COPY = french);
+            ALTER TEXT SEARCH CONFIGURATION french_unaccent
+                ALTER MAPPING FOR hword, hword_part, word WITH unaccent, french_stem;
+        END IF;
+    END $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION element_data_search_text(
+        nom_base text, nom_attribut text, nom_frontiere text, tags text
+    ) RETURNS text LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT public.unaccent('public.unaccent', lower(concat_ws(' ', nom_base, nom_attribut, nom_frontiere, tags)))
+    $$
+    """,
+    "ALTER TABLE element_data ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    """
+    CREATE OR REPLACE FUNCTION element_data_search_vector_update() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('french_unaccent', coalesce(NEW.nom_base_francais, '')), 'A')
+            || setweight(to_tsvector('french_unaccent', coalesce(NEW.nom_attribut_francais, '')), 'B')
+            || setweight(to_tsvector('french_unaccent', coalesce(NEW.nom_frontiere_francais, '')), 'B')
+            || setweight(to_tsvector('french_unaccent', coalesce(NEW.tags_francais, '')), 'C');
+        RETURN NEW;
+    END $$
+    """,
+    "DROP TRIGGER IF EXISTS element_data_search_vector ON element_data",
+    """
+    CREATE TRIGGER element_data_search_vector
+        BEFORE INSERT OR UPDATE OF nom_base_francais, nom_attribut_francais, nom_frontiere_francais, tags_francais
+        ON element_data FOR EACH ROW EXECUTE FUNCTION element_data_search_vector_update()
+    """,
+    # Backfill the rows written before the trigger existed
+    "UPDATE element_data SET nom_base_francais = nom_base_francais WHERE search_vector IS NULL",
+    "CREATE INDEX IF NOT EXISTS ix_element_data_search_vector ON element_data USING gin (search_vector)",
+    """
+    CREATE INDEX IF NOT EXISTS ix_element_data_search_text ON element_data USING gin (
+        element_data_search_text(nom_base_francais, nom_attribut_francais, nom_frontiere_francais, tags_francais) gin_trgm_ops
+    )
+    """,
+]
+
+
+def create_search_index(bind: Engine) -> bool:
+    """
+    Creates the full-text and trigram search index of element_data on PostgreSQL.
+
+    Args:
+        bind (sqlalchemy.engine.Engine): Engine of the target database.
+
+    Returns:
+        bool: True if the index exists, False if the database cannot host it (other
+            backends, or the unaccent/pg_trgm extensions are not available), in which
+            case the API falls back to an in-process index.
+    """
+    if bind.dialect.name != "postgresql":
+        return False
+    try:
+        with bind.begin() as connection:
+            for statement in SEARCH_INDEX_DDL:
+                connection.execute(text(statement))
+    except DBAPIError as error:
+        logger.warning("Full-text search index not created: %s", error.orig)
+        return False
+    return True
+
+
+# Mapping between the Base Carbone Excel headers and the element_data columns
+COLUMN_MAPPING: Dict[str, str] = {
+    "Type Ligne": "type_ligne",
+    "Identifiant de l'élément": "identifiant_element",
+    "Structure": "structure",
+    "Statut de l'élément": "statut_element",
+    "Nom base français": "nom_base_francais",
+    "Nom attribut français": "nom_attribut_francais",
+    "Nom frontière français": "nom_frontiere_francais",
+    "Code de la catégorie": "code_categorie",
+    "Tags français": "tags_francais",
+    "Unité français": "unite_francais",
+    "Contributeur": "contributeur",
+    "Programme": "programme",
+    "Url du programme": "url_programme",
+    "Source": "source",
+    "Localisation géographique": "localisation_geo",
+    "Sous-localisation géographique français": "sous_localisation_geo_francais",
+    "Date de création": "date_creation",
+    "Date de modification": "date_modification",
+    "Période de validité": "periode_validite",
+    "Incertitude": "incertitude",
+    "Réglementations": "reglementations",
+    "Transparence": "transparence",
+    "Qualité": "qualite",
+    "Qualité TeR": "qualite_ter",
+    "Qualité GR": "qualite_gr",
+    "Qualité TiR": "qualite_tir",
+    "Qualité C": "qualite_c",
+    "Qualité P": "qualite_p",
+    "Qualité M": "qualite_m",
+    "Commentaire français": "commentaire_francais",
+    "Type poste": "type_poste",
+    "Nom poste français": "nom_poste_francais",
+    "Total poste non décomposé": "total_poste_non_decompose",
+    "CO2f": "co2f",
+    "CH4f": "ch4f",
+    "CH4b": "ch4b",
+    "N2O": "n2o",
+    "Code gaz supplémentaire 1": "code_gaz_supplementaire_1",
+    "Valeur gaz supplémentaire 1": "valeur_gaz_supplementaire_1",
+    "Code gaz supplémentaire 2": "code_gaz_supplementaire_2",
+    "Valeur gaz supplémentaire 2": "valeur_gaz_supplementaire_2",
+    "Code gaz supplémentaire 3": "code_gaz_supplementaire_3",
+    "Valeur gaz supplémentaire 3": "valeur_gaz_supplementaire_3",
+    "Code gaz supplémentaire 4": "code_gaz_supplementaire_4",
+    "Valeur gaz supplémentaire 4": "valeur_gaz_supplementaire_4",
+    "Code gaz supplémentaire 5": "code_gaz_supplementaire_5",
+    "Valeur gaz supplémentaire 5": "valeur_gaz_supplementaire_5",
+    "Autres GES": "autres_ges",
+    "CO2b": "co2b",
+}
+# Columns of the API fields, in the order of the release; the supplementary gases are subqueries on element_gas
+ELEMENT_FIELDS: Dict[str, Any] = {
+    "id": ElementData.__table__.c.id,
+    **{
+        name: getattr(ElementData, name).expression if name in GAS_FIELDS else ElementData.__table__.c[name]
+        for name in COLUMN_MAPPING.values()
+    },
+}
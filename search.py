@@ -0,0 +1,282 @@
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# Searched columns and the weight of a match in each of them
+SEARCH_COLUMNS: Dict[str, float] = {
+    "nom_base_francais": 1.0,
+    "nom_attribut_francais": 0.6,
+    "nom_frontiere_francais": 0.6,
+    "tags_francais": 0.4,
+}
+
+# Frequent French words that carry no meaning for the search
+STOP_WORDS: Set[str] = {
+    "a", "au", "aux", "d", "de", "des", "du", "en", "et", "l", "la", "le", "les", "ou", "par", "pour", "sur", "un", "une",
+}
+
+# Minimum trigram similarity for a vocabulary token to match a misspelled query token
+FUZZY_THRESHOLD: float = 0.4
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def fold(text: str) -> str:
+    """
+    Lowercase a text and strip its accents, e.g. "Électricité" becomes "electricite".
+
+    Args:
+        text (str): The text to fold.
+
+    Returns:
+        str: The folded text.
+    """
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(character for character in decomposed if not unicodedata.combining(character))
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    Split a text into folded search tokens, dropping stop words and reducing plurals.
+
+    Args:
+        text (Optional[str]): The text to split.
+
+    Returns:
+        List[str]: The tokens of the text.
+    """
+    if not text:
+        return []
+    tokens = []
+    for token in TOKEN_PATTERN.findall(fold(text)):
+        if token in STOP_WORDS:
+            continue
+        # Light stemming so that "transports" matches "transport"
+        if len(token) > 3 and token[-1] in "sx":
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def trigrams(token: str) -> Set[str]:
+    """
+    Compute the trigrams of a token, padded as PostgreSQL pg_trgm does.
+
+    Args:
+        token (str): The token.
+
+    Returns:
+        Set[str]: The trigrams of the token.
+    """
+    padded = f"  {token} "
+    return {padded[position:position + 3] for position in range(len(padded) - 2)}
+
+
+class InvertedIndex:
+    """
+    In-process inverted index over the searched element columns, used when the
+    database has no full-text index.
+
+    Documents are added, replaced and removed one at a time so that the index
+    can follow the writes of the API without being rebuilt.
+
+    Attributes:
+        postings (Dict[str, Dict[int, float]]): Weighted term frequency of each token in each element.
+        documents (Dict[int, Dict[str, float]]): Weighted term frequencies of each indexed element.
+        token_trigrams (Dict[str, Set[str]]): Tokens of the vocabulary containing each trigram.
+    """
+
+    def __init__(self) -> None:
+        self.postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self.documents: Dict[int, Dict[str, float]] = {}
+        self.token_trigrams: Dict[str, Set[str]] = defaultdict(set)
+
+    def add(self, element_id: int, values: Dict[str, Optional[str]]) -> None:
+        """
+        Index an element, replacing its previous version if any.
+
+        Args:
+            element_id (int): The ID of the element.
+            values (Dict[str, Optional[str]]): The values of the searched columns.
+
+        Returns:
+            None
+        """
+        self.remove(element_id)
+        frequencies: Dict[str, float] = defaultdict(float)
+        for column, weight in SEARCH_COLUMNS.items():
+            for token in tokenize(values.get(column)):
+                frequencies[token] += weight
+        if not frequencies:
+            return
+        self.documents[element_id] = dict(frequencies)
+        for token, frequency in frequencies.items():
+            if token not in self.postings:
+                for trigram in trigrams(token):
+                    self.token_trigrams[trigram].add(token)
+            self.postings[token][element_id] = frequency
+
+    def remove(self, element_id: int) -> None:
+        """
+        Remove an element from the index.
+
+        Args:
+            element_id (int): The ID of the element.
+
+        Returns:
+            None
+        """
+        for token in self.documents.pop(element_id, {}):
+            postings = self.postings[token]
+            postings.pop(element_id, None)
+            if not postings:
+                del self.postings[token]
+                for trigram in trigrams(token):
+                    self.token_trigrams[trigram].discard(token)
+
+    def _expand(self, token: str, fuzzy: bool) -> List[Tuple[str, float]]:
+        """
+        Find the vocabulary tokens matching a query token.
+
+        Args:
+            token (str): The query token.
+            fuzzy (bool): Whether to look for close spellings when the token is not in the vocabulary.
+
+        Returns:
+            List[Tuple[str, float]]: The matching tokens with their similarity to the query token.
+        """
+        if token in self.postings:
+            return [(token, 1.0)]
+        if not fuzzy:
+            return []
+        query_trigrams = trigrams(token)
+        shared: Dict[str, int] = defaultdict(int)
+        for trigram in query_trigrams:
+            for candidate in self.token_trigrams.get(trigram, ()):
+                shared[candidate] += 1
+        matches = []
+        for candidate, count in shared.items():
+            similarity = count / len(query_trigrams | trigrams(candidate))
+            if similarity >= FUZZY_THRESHOLD:
+                matches.append((candidate, similarity))
+        return matches
+
+    def search(self, query: str, fuzzy: bool = True) -> List[Tuple[int, float]]:
+        """
+        Rank the elements matching a free-text query with TF-IDF.
+
+        Args:
+            query (str): The free-text query.
+            fuzzy (bool): Whether misspelled query tokens may match close tokens of the vocabulary.
+
+        Returns:
+            List[Tuple[int, float]]: The IDs of the matching elements with their score, best first.
+        """
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+        if not query_tokens:
+            return []
+        scores: Dict[int, float] = defaultdict(float)
+        matched_tokens: Dict[int, int] = defaultdict(int)
+        for token in query_tokens:
+            matched: Set[int] = set()
+            for candidate, similarity in self._expand(token, fuzzy):
+                postings = self.postings[candidate]
+                idf = math.log(1 + len(self.documents) / len(postings))
+                for element_id, frequency in postings.items():
+                    scores[element_id] += similarity * idf * frequency
+                    matched.add(element_id)
+            for element_id in matched:
+                matched_tokens[element_id] += 1
+        # Favour the elements matching the most query tokens
+        ranked = [
+            (element_id, score * matched_tokens[element_id] / len(query_tokens))
+            for element_id, score in scores.items()
+        ]
+        ranked.sort(key=lambda item: (-item[1], item[0]))
+        return ranked
+
+
+class SearchIndexCache:
+    """
+    Lazily built, thread-safe holder of the in-process inverted index.
+
+    The index is built from the table on first use, kept up to date by the API
+    writes and rebuilt after "ttl" seconds to pick up writes made by other processes.
+    Searches run under the lock of the writes, so that they never see a half-applied
+    update; the index itself is never handed out.
+
+    Attributes:
+        ttl (float): Number of seconds after which the index is rebuilt from the table.
+    """
+
+    def __init__(self, ttl: float = 300.0) -> None:
+        self.ttl = ttl
+        self._index: Optional[InvertedIndex] = None
+        self._built_at: float = 0.0
+        self._lock = threading.Lock()
+
+    def search(
+        self, rows: Callable[[], Iterable[Tuple]], query: str, fuzzy: bool = True
+    ) -> List[Tuple[int, float]]:
+        """
+        Rank the elements matching a free-text query, building the index if it is missing or expired.
+
+        Args:
+            rows (Callable[[], Iterable[Tuple]]): Callable returning (id, *searched columns) rows of the table.
+            query (str): The free-text query.
+            fuzzy (bool): Whether misspelled query tokens may match close tokens of the vocabulary.
+
+        Returns:
+            List[Tuple[int, float]]: The IDs of the matching elements with their score, best first.
+        """
+        with self._lock:
+            if self._index is None or time.monotonic() - self._built_at > self.ttl:
+                index = InvertedIndex()
+                for element_id, *values in rows():
+                    index.add(element_id, dict(zip(SEARCH_COLUMNS, values)))
+                self._index = index
+                self._built_at = time.monotonic()
+            return self._index.search(query, fuzzy=fuzzy)
+
+    def update(self, element_id: int, values: Dict[str, Optional[str]]) -> None:
+        """
+        Reindex an element after it was created or updated.
+
+        Args:
+            element_id (int): The ID of the element.
+            values (Dict[str, Optional[str]]): The values of the searched columns.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._index is not None:
+                self._index.add(element_id, values)
+
+    def remove(self, element_id: int) -> None:
+        """
+        Remove an element from the index after it was deleted.
+
+        Args:
+            element_id (int): The ID of the element.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._index is not None:
+                self._index.remove(element_id)
+
+    def invalidate(self) -> None:
+        """
+        Drop the index so that it is rebuilt on next use.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._index = None
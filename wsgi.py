@@ -0,0 +1,14 @@
+"""
+Production entry point of the API, served by a multi-worker WSGI server:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The database schema is created or upgraded by the migrate command:
+
+    flask --app wsgi migrate
+"""
+from ecoact_api import create_app
+
+app = create_app()
+
+__all__ = ["app"]